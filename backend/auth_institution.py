@@ -1,7 +1,16 @@
 """
 JWT helpers for institution-scoped routes. Hydrates institution_id from users collection.
+
+The hydrated caller is a Principal: FastAPI resolves get_auth_user once per
+request, so everything cached on it (event documents already read for an
+ownership check) is request-scoped. Across requests, the user fields used for
+scope and each event's owning institution are kept for a few seconds, so a
+dashboard firing a burst of calls does not re-read users and events each time.
 """
-from typing import Optional
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
 import logging
 
 from fastapi import Depends, Header, HTTPException
@@ -11,6 +20,67 @@ from db import users_col, events_col
 
 logger = logging.getLogger("auth_institution")
 
+PRINCIPAL_TTL = float(os.getenv("PRINCIPAL_TTL", 30))
+EVENT_OWNER_TTL = float(os.getenv("EVENT_OWNER_TTL", 60))
+_SCOPE_CACHE_SIZE = 10000
+
+# user_id -> (expires_at, {institution_id, role, email})
+_user_scopes: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+# event_id -> (expires_at, owning institution_id)
+_event_owners: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+
+def _cache_get(cache: OrderedDict, key: str):
+    hit = cache.get(key)
+    if hit is None:
+        return None
+    if hit[0] <= time.monotonic():
+        del cache[key]
+        return None
+    cache.move_to_end(key)
+    return hit[1]
+
+
+def _cache_put(cache: OrderedDict, key: str, value: Any, ttl: float):
+    cache[key] = (time.monotonic() + ttl, value)
+    cache.move_to_end(key)
+    while len(cache) > _SCOPE_CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+def invalidate_principal(user_id: str) -> None:
+    """Call after changing a user's role or institution so the next request re-reads it."""
+    _user_scopes.pop(str(user_id), None)
+
+
+class Principal(dict):
+    """Token claims plus the caller's role / institution scope, with per-request caches."""
+
+    def __init__(self, payload: dict):
+        super().__init__(payload)
+        self.events: Dict[str, dict] = {}
+
+
+async def _hydrate(payload: dict) -> Principal:
+    principal = Principal(payload)
+    uid = str(payload["user_id"])
+    scope = _cache_get(_user_scopes, uid)
+    if scope is None:
+        user = await users_col.find_one({"user_id": uid}, {"institution_id": 1, "role": 1, "email": 1})
+        if not user:
+            logger.warning(f"User {uid} not found in database")
+            return principal
+        scope = {
+            "institution_id": user.get("institution_id"),
+            "role": user.get("role"),
+            "email": user.get("email"),
+        }
+        _cache_put(_user_scopes, uid, scope, PRINCIPAL_TTL)
+    principal["institution_id"] = scope["institution_id"]
+    principal["role"] = scope["role"] or payload.get("role")
+    principal["email"] = scope["email"] or payload.get("sub")
+    return principal
+
 
 async def get_auth_user(authorization: Optional[str] = Header(None)) -> dict:
     if not authorization or not authorization.startswith("Bearer "):
@@ -23,19 +93,11 @@ async def get_auth_user(authorization: Optional[str] = Header(None)) -> dict:
     
     # Try to get user data, but don't fail if database is unavailable
     try:
-        user = await users_col.find_one({"user_id": uid})
-        if user:
-            payload["institution_id"] = user.get("institution_id")
-            payload["role"] = user.get("role") or payload.get("role")
-            payload["email"] = user.get("email") or payload.get("sub")
-        else:
-            # User not found in database, but token is valid
-            logger.warning(f"User {uid} not found in database")
+        return await _hydrate(payload)
     except Exception as e:
         # Database error, but token is still valid
         logger.error(f"Database error in get_auth_user: {e}")
-    
-    return payload
+        return Principal(payload)
 
 
 def _is_admin(role: Optional[str]) -> bool:
@@ -55,24 +117,55 @@ def assert_institution_scope(institution_id: Optional[str], user: dict) -> None:
         raise HTTPException(status_code=403, detail="Not authorized for this institution")
 
 
-async def assert_institution_owns_event(event_id: str, user: dict) -> dict:
-    """Return event doc if the caller may manage it."""
-    try:
-        ev = await events_col.find_one({"_id": ObjectId(event_id)})
-    except Exception:
-        ev = None
-    if not ev:
-        raise HTTPException(status_code=404, detail="Event not found")
+def _check_event_owner(institution_id: Optional[str], user: dict) -> None:
     role = user.get("role") or ""
     if _is_admin(role):
-        return ev
+        return
     if str(role).lower() != "institution":
         raise HTTPException(status_code=403, detail="Institution access required")
-    if str(user.get("institution_id") or "") != str(ev.get("institution_id") or ""):
+    if str(user.get("institution_id") or "") != str(institution_id or ""):
         raise HTTPException(status_code=403, detail="Not authorized for this event")
+
+
+async def assert_institution_owns_event(event_id: str, user: dict) -> dict:
+    """Return event doc if the caller may manage it."""
+    ev = user.events.get(event_id) if isinstance(user, Principal) else None
+    if ev is None:
+        try:
+            ev = await events_col.find_one({"_id": ObjectId(event_id)})
+        except Exception:
+            ev = None
+        if not ev:
+            raise HTTPException(status_code=404, detail="Event not found")
+        _cache_put(_event_owners, event_id, str(ev.get("institution_id") or ""), EVENT_OWNER_TTL)
+        if isinstance(user, Principal):
+            user.events[event_id] = ev
+    _check_event_owner(ev.get("institution_id"), user)
     return ev
 
 
+async def assert_institution_can_manage_event(event_id: str, user: dict) -> None:
+    """Ownership check for callers that do not need the event document."""
+    if isinstance(user, Principal) and event_id in user.events:
+        owner = str(user.events[event_id].get("institution_id") or "")
+    else:
+        owner = _cache_get(_event_owners, event_id)
+    if owner is None:
+        try:
+            ev = await events_col.find_one({"_id": ObjectId(event_id)}, {"institution_id": 1})
+        except Exception:
+            ev = None
+        if not ev:
+            raise HTTPException(status_code=404, detail="Event not found")
+        owner = str(ev.get("institution_id") or "")
+        _cache_put(_event_owners, event_id, owner, EVENT_OWNER_TTL)
+    _check_event_owner(owner, user)
+
+
+def forget_event_owner(event_id: str) -> None:
+    _event_owners.pop(str(event_id), None)
+
+
 async def get_auth_user_optional(authorization: Optional[str] = Header(None)) -> Optional[dict]:
     if not authorization or not authorization.startswith("Bearer "):
         return None
@@ -80,9 +173,4 @@ async def get_auth_user_optional(authorization: Optional[str] = Header(None)) ->
     payload = decode_access_token(token) or {}
     if not payload.get("user_id"):
         return None
-    user = await users_col.find_one({"user_id": payload["user_id"]})
-    if user:
-        payload["institution_id"] = user.get("institution_id")
-        payload["role"] = user.get("role") or payload.get("role")
-        payload["email"] = user.get("email") or payload.get("sub")
-    return payload
+    return await _hydrate(payload)
@@ -1,6 +1,9 @@
+import hashlib
 import os
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 import jwt
 from dotenv import load_dotenv
 
@@ -15,11 +18,14 @@ if len(SECRET_KEY) < 32:
     raise ValueError("CRITICAL: JWT_SECRET must be at least 32 characters long for security.")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 1440))
+# Verified tokens kept by SHA-256 digest until their own `exp`
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+_verified_tokens: "OrderedDict[bytes, Tuple[float, dict]]" = OrderedDict()
 
 import bcrypt
 
 # We are using bcrypt directly since passlib 1.7.4 has known compatibility issues
-BCRYPT_ROUNDS = 12
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
 
 def verify_password(plain_password, hashed_password):
     """Verify a plain password against a hashed one with enhanced error handling."""
@@ -87,9 +93,21 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 def decode_access_token(token: str):
-    """Decode and verify a JWT access token."""
+    """Decode and verify a JWT access token; verified tokens are cached until they expire."""
+    digest = hashlib.sha256(str(token).encode("utf-8")).digest()
+    hit = _verified_tokens.get(digest)
+    if hit is not None:
+        if hit[0] > time.time():
+            _verified_tokens.move_to_end(digest)
+            return dict(hit[1])
+        del _verified_tokens[digest]
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except Exception:
         return None
+    # Only successful verifications are cached, so garbage tokens cannot churn the LRU
+    if isinstance(payload.get("exp"), (int, float)):
+        _verified_tokens[digest] = (float(payload["exp"]), payload)
+        while len(_verified_tokens) > TOKEN_CACHE_SIZE:
+            _verified_tokens.popitem(last=False)
+    return dict(payload)
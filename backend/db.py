@@ -107,12 +107,13 @@ class DatabaseManager:
             logger.info("MongoDB connection closed.")
 
     async def ensure_indexes(self):
-        """Enforces performance and data integrity."""
+        """Enforces performance and data integrity (see index_manifest.INDEX_MANIFEST)."""
+        from index_manifest import apply_index_manifest, check_query_plans
         try:
-            await self.db.users.create_index("user_id", unique=True)
-            await self.db.users.create_index("email", unique=True)
-            await self.db.institutions.create_index("name", unique=True)
-            await self.db.institutions.create_index("institution_id", unique=True)
+            result = await apply_index_manifest(self.db)
+            logger.info(f"Index manifest applied: {result}")
+            if os.getenv("INDEX_PLAN_CHECK", "false").lower() in ("1", "true", "yes"):
+                await check_query_plans(self.db)
         except Exception as e:
             logger.warning(f"Index creation warning: {e}")
             pass
@@ -152,6 +153,12 @@ skill_assessments_col = db["skill_assessments"]
 ads_col = db["advertisements"]
 payments_col = db["payments"]
 audit_logs_col = db["audit_logs"]
+llm_cache_col = db["llm_cache"]          # Content-addressed LLM response cache (TTL on expires_at)
+github_repo_cache_col = db["github_repo_cache"]  # Per-repo GitHub analysis facts keyed by repo id + pushed_at
+search_index_col = db["search_index"]    # Denormalised search rows (text index + autocomplete prefixes)
+search_meta_col = db["search_meta"]      # Change-stream resume token for the search indexer
+admin_metrics_col = db["admin_metrics"]  # Materialized admin dashboard rollups (single "global" document)
+job_leases_col = db["job_leases"]        # Scheduler leader lease, per-job locks and last-run state
 
 # System Deconstruction Lab (SDL)
 sdl_projects_col = db["sdl_projects"]
@@ -168,14 +175,24 @@ form_fields_col = db["form_fields"]      # Form Builder Layer
 participants_col = db["participants"]
 teams_col = db["teams"]
 submissions_col = db["submissions"]
+blobs_col = db["blobs"]                  # Content-addressed upload metadata (key -> sha256, size, refs)
 submission_data_col = db["submission_data"] # Flexibility Layer (Key-Value for PPT, GitHub)
 judges_col = db["judges"]
 scores_col = db["scores"]
 evaluation_criteria_col = db["evaluation_criteria"] # Evaluation System
 notifications_col = db["notifications"]
+email_outbox_col = db["email_outbox"]           # Durable queue drained by the email outbox workers
+notification_jobs_col = db["notification_jobs"] # Progress of bulk notification blasts
 leaderboard_col = db["leaderboard"]
+leaderboard_meta_col = db["leaderboard_meta"]   # Published leaderboard version per event
+score_aggregates_col = db["score_aggregates"]   # Running per-submission score totals (live rankings)
 results_col = db["results"]
 event_judges_col = db["event_judges"]
+judge_assignments_col = db["judge_assignments"]          # One row per (submission, judge email)
+judge_assignment_stats_col = db["judge_assignment_stats"]  # Per-judge pending/completed counters
+plagiarism_fingerprints_col = db["plagiarism_fingerprints"]  # Winnowing fingerprints + LSH bands per submission
+plagiarism_pairs_col = db["plagiarism_pairs"]                # Scored candidate pairs within an event
+plagiarism_runs_col = db["plagiarism_runs"]                  # Progress of event-wide plagiarism runs
 workflow_states_col = db["workflow_states"] # State Machine (Applied, Shortlisted, etc.)
 
 # Career & Recruitment (High-Fidelity Tracking)
@@ -0,0 +1,208 @@
+"""
+Declarative index manifest for every hot query path.
+
+`apply_index_manifest` is run by DatabaseManager.ensure_indexes at startup and
+is idempotent: create_index is a no-op when the same index already exists, and a
+conflicting definition is logged and skipped instead of aborting the rest.
+
+`check_query_plans` runs explain() on each registered query and reports any plan
+that still falls back to a COLLSCAN. Use it via `python setup_indexes.py --check`
+or set INDEX_PLAN_CHECK=true to log the report on startup.
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, List
+
+from pymongo import ASCENDING, DESCENDING
+
+logger = logging.getLogger("index_manifest")
+
+# collection -> list of {"keys": [...], **create_index options}
+INDEX_MANIFEST: Dict[str, List[Dict[str, Any]]] = {
+    "users": [
+        {"keys": [("user_id", ASCENDING)], "unique": True},
+        {"keys": [("email", ASCENDING)], "unique": True},
+        {"keys": [("email_key", ASCENDING)]},
+    ],
+    "institutions": [
+        {"keys": [("name", ASCENDING)], "unique": True},
+        {"keys": [("institution_id", ASCENDING)], "unique": True},
+    ],
+    "progress": [
+        {"keys": [("user_id", ASCENDING), ("module_id", ASCENDING)]},
+    ],
+    "modules": [
+        {"keys": [("course_id", ASCENDING), ("order_index", ASCENDING)]},
+    ],
+    "enrollments": [
+        {"keys": [("user_id", ASCENDING), ("course_id", ASCENDING)]},
+    ],
+    "cart": [
+        {"keys": [("user_id", ASCENDING)]},
+    ],
+    "certificates": [
+        {"keys": [("verification_code", ASCENDING)]},
+        {"keys": [("user_id", ASCENDING)]},
+    ],
+    "quizzes": [
+        {"keys": [("module_id", ASCENDING)], "unique": True, "partialFilterExpression": {"source": "ai_generated"}},
+    ],
+    "llm_cache": [
+        {"keys": [("expires_at", ASCENDING)], "expireAfterSeconds": 0},
+    ],
+    "github_repo_cache": [
+        {"keys": [("expires_at", ASCENDING)], "expireAfterSeconds": 0},
+    ],
+    "events": [
+        {"keys": [("submission_deadline_at", ASCENDING)]},
+    ],
+    "participants": [
+        {"keys": [("user_id", ASCENDING), ("event_id", ASCENDING)], "unique": True},
+        {"keys": [("event_id", ASCENDING)]},
+    ],
+    "teams": [
+        {"keys": [("invites.code", ASCENDING)]},
+    ],
+    "submissions": [
+        {"keys": [("event_id", ASCENDING)]},
+    ],
+    "scores": [
+        {"keys": [("submission_id", ASCENDING), ("judge_email", ASCENDING)]},
+        {
+            "keys": [("submission_id", ASCENDING), ("judge_id", ASCENDING)],
+            "unique": True,
+            "partialFilterExpression": {"judge_id": {"$type": "string"}},
+        },
+    ],
+    "judge_assignments": [
+        {"keys": [("judge_email", ASCENDING), ("event_id", ASCENDING), ("_id", ASCENDING)]},
+        {"keys": [("submission_id", ASCENDING)]},
+    ],
+    "plagiarism_fingerprints": [
+        {"keys": [("event_id", ASCENDING), ("bands", ASCENDING)]},
+    ],
+    "plagiarism_pairs": [
+        {"keys": [("event_id", ASCENDING), ("containment", DESCENDING)]},
+        {"keys": [("a", ASCENDING)]},
+        {"keys": [("b", ASCENDING)]},
+    ],
+    "plagiarism_runs": [
+        {"keys": [("event_id", ASCENDING), ("status", ASCENDING)]},
+    ],
+    "judges": [
+        {"keys": [("email", ASCENDING), ("status", ASCENDING)]},
+        {"keys": [("event_id", ASCENDING), ("status", ASCENDING)]},
+    ],
+    "event_judges": [
+        {"keys": [("event_id", ASCENDING), ("judge_id", ASCENDING)], "unique": True},
+    ],
+    "leaderboard": [
+        {"keys": [("event_id", ASCENDING), ("version", ASCENDING), ("rank", ASCENDING)]},
+    ],
+    "score_aggregates": [
+        {"keys": [("event_id", ASCENDING), ("avg_score", DESCENDING), ("_id", ASCENDING)]},
+    ],
+    "notifications": [
+        {"keys": [("user_id", ASCENDING), ("is_read", ASCENDING), ("created_at", DESCENDING)]},
+    ],
+    "opportunity_applications": [
+        {"keys": [("opportunity_id", ASCENDING), ("status", ASCENDING)]},
+        {"keys": [("user_id", ASCENDING)]},
+    ],
+    "search_index": [
+        {
+            "keys": [("title", "text"), ("body", "text")],
+            "weights": {"title": 10, "body": 1},
+            "name": "search_text",
+        },
+        {"keys": [("prefixes", ASCENDING), ("kind", ASCENDING)]},
+        {"keys": [("kind", ASCENDING), ("synced_at", ASCENDING)]},
+    ],
+    "email_outbox": [
+        {"keys": [("status", ASCENDING), ("next_attempt_at", ASCENDING)]},
+        {"keys": [("status", ASCENDING), ("locked_until", ASCENDING)]},
+        {"keys": [("sent_at", ASCENDING)], "expireAfterSeconds": 7 * 24 * 3600},
+    ],
+}
+
+# Representative shapes of the hot queries; values only need the right type.
+QUERY_CHECKS: List[Dict[str, Any]] = [
+    {"collection": "users", "filter": {"user_id": "u"}},
+    {"collection": "users", "filter": {"email": "e@example.com"}},
+    {"collection": "users", "filter": {"email_key": "e@example.com"}},
+    {"collection": "progress", "filter": {"user_id": "u", "module_id": "m"}},
+    {"collection": "progress", "filter": {"user_id": "u"}},
+    {"collection": "modules", "filter": {"course_id": "c"}, "sort": [("order_index", ASCENDING)]},
+    {"collection": "enrollments", "filter": {"user_id": "u", "course_id": "c"}},
+    {"collection": "cart", "filter": {"user_id": "u"}},
+    {"collection": "certificates", "filter": {"verification_code": "CODE"}},
+    {"collection": "events", "filter": {"submission_deadline_at": {"$gt": datetime(2024, 1, 1), "$lte": datetime(2024, 1, 3)}}},
+    {"collection": "participants", "filter": {"event_id": "e"}},
+    {"collection": "teams", "filter": {"invites.code": "CODE"}},
+    {"collection": "submissions", "filter": {"event_id": "e"}},
+    {"collection": "scores", "filter": {"submission_id": "s", "judge_email": "j@example.com"}},
+    {"collection": "notifications", "filter": {"user_id": "u", "is_read": False}, "sort": [("created_at", DESCENDING)]},
+    {"collection": "opportunity_applications", "filter": {"opportunity_id": "o", "status": "applied"}},
+    {"collection": "judge_assignments", "filter": {"judge_email": "j@example.com", "event_id": {"$in": ["e"]}}, "sort": [("_id", ASCENDING)]},
+    {"collection": "leaderboard", "filter": {"event_id": "e", "version": 0}, "sort": [("rank", ASCENDING)]},
+    {"collection": "score_aggregates", "filter": {"event_id": "e", "avg_score": {"$gt": 0}}},
+    {"collection": "search_index", "filter": {"prefixes": {"$all": ["ha"]}, "kind": {"$in": ["event"]}}},
+    {"collection": "email_outbox", "filter": {"status": "pending"}, "sort": [("next_attempt_at", ASCENDING)]},
+    {"collection": "plagiarism_fingerprints", "filter": {"event_id": "e", "bands": {"$in": ["0:abc"]}}},
+    {"collection": "plagiarism_pairs", "filter": {"event_id": "e", "containment": {"$gte": 0.3}}, "sort": [("containment", DESCENDING)]},
+]
+
+
+async def apply_index_manifest(database, manifest: Dict[str, List[Dict[str, Any]]] = INDEX_MANIFEST) -> Dict[str, int]:
+    """Create every index in the manifest; returns counts of created/failed specs."""
+    created = failed = 0
+    for collection, specs in manifest.items():
+        for spec in specs:
+            options = {k: v for k, v in spec.items() if k != "keys"}
+            try:
+                await database[collection].create_index(spec["keys"], **options)
+                created += 1
+            except Exception as e:
+                failed += 1
+                logger.warning(f"Index {collection}{spec['keys']} not applied: {e}")
+    return {"applied": created, "failed": failed}
+
+
+def _plan_stages(plan: Any) -> List[str]:
+    """Flatten every `stage` name in an explain() plan tree."""
+    stages: List[str] = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+
+async def check_query_plans(database, checks: List[Dict[str, Any]] = QUERY_CHECKS) -> List[Dict[str, Any]]:
+    """explain() every registered query and flag winning plans that use a COLLSCAN."""
+    report = []
+    for check in checks:
+        cursor = database[check["collection"]].find(check["filter"])
+        if check.get("sort"):
+            cursor = cursor.sort(check["sort"])
+        try:
+            explain = await cursor.explain()
+            planner = explain.get("queryPlanner", {})
+            stages = _plan_stages(planner.get("winningPlan", {}))
+            entry = {
+                "collection": check["collection"],
+                "filter": check["filter"],
+                "sort": check.get("sort"),
+                "stages": stages,
+                "collscan": "COLLSCAN" in stages,
+            }
+        except Exception as e:
+            entry = {"collection": check["collection"], "filter": check["filter"], "error": str(e), "collscan": None}
+        if entry["collscan"]:
+            logger.warning(f"COLLSCAN on {check['collection']} for {check['filter']}")
+        report.append(entry)
+    return report
@@ -1,18 +1,30 @@
 from datetime import datetime, timezone
-import asyncio
 import os
 import re
 import uuid
 import shutil
 import json
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException, Request, Form, File, UploadFile, Body, Depends, Query
-from auth_institution import get_auth_user, assert_institution_scope, assert_institution_owns_event
-from services.email_service import send_notification_email
+from fastapi import APIRouter, HTTPException, Request, Response, Form, File, UploadFile, Body, Depends, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from auth_institution import (
+    get_auth_user,
+    assert_institution_scope,
+    assert_institution_owns_event,
+    assert_institution_can_manage_event,
+    invalidate_principal,
+)
+from services.email_outbox import queue_notification_email
+from services.reminder_service import with_deadline_at
+from services.bulk_notification_service import bulk_notification_service
+from services.search_service import search_service
+from services.judge_assignment_service import judge_assignment_service
+from services.institution_stats_service import institution_stats_service
 from services.institutional_analytics_service import analytics_service
 from services.institutional_certificate_service import certificate_service
 from services.leaderboard_service import leaderboard_service
-from db import leaderboard_col, events_col, participants_col, certificates_col, notifications_col, institutions_col, users_col, teams_col, submissions_col, scores_col, results_col, audit_logs_col, opportunities_col, opportunity_applications_col
+from db import events_col, participants_col, certificates_col, notifications_col, institutions_col, users_col, teams_col, submissions_col, scores_col, results_col, audit_logs_col, opportunities_col, opportunity_applications_col
 from bson import ObjectId
 from services.audit_service import log_admin_action
 from notification_helpers import notify_institution
@@ -153,7 +165,7 @@ async def get_all_events(institution_id: str, user: dict = Depends(get_auth_user
 @router.get("/events/{event_id}/participants")
 async def get_event_participants(event_id: str, user: dict = Depends(get_auth_user)):
     """Retrieves all students registered for a specific event, including opportunity applicants."""
-    await assert_institution_owns_event(event_id, user)
+    await assert_institution_can_manage_event(event_id, user)
     from db import opportunity_applications_col, opportunities_col
     from bson import ObjectId
     
@@ -252,63 +264,107 @@ async def institution_review_opportunity_application(data: dict = Body(...), use
     return out
 
 
-@router.get("/participants/{institution_id}")
-async def get_all_institution_participants(institution_id: str, user: dict = Depends(get_auth_user)):
-    """Retrieves all participants AND opportunity applicants for this institution."""
-    assert_institution_scope(institution_id, user)
-    from db import opportunity_applications_col
-    
-    # 1. Fetch Hackathon Participants
-    p_cursor = participants_col.find({"institution_id": institution_id}).sort("registered_at", -1)
-    results = []
-    from db import users_col, events_col
-    from bson import ObjectId
-    
-    async for p in p_cursor:
+PARTICIPANT_HYDRATION_BATCH = 500
+
+
+async def _hydrate_participant_batch(batch: list) -> list:
+    """Fill event titles and user details for a batch of participant rows with one $in query each."""
+    event_ids = {
+        p["event_id"] for p in batch
+        if "event_title" not in p and ObjectId.is_valid(str(p.get("event_id", "")))
+    }
+    user_ids = {p["user_id"] for p in batch if p.get("user_id")}
+
+    events = {
+        str(e["_id"]): e.get("title")
+        async for e in events_col.find({"_id": {"$in": [ObjectId(str(i)) for i in event_ids]}}, {"title": 1})
+    } if event_ids else {}
+    users = {
+        u["user_id"]: u
+        async for u in users_col.find(
+            {"user_id": {"$in": list(user_ids)}},
+            {"user_id": 1, "full_name": 1, "name": 1, "email": 1, "resume_url": 1}
+        )
+    } if user_ids else {}
+
+    for p in batch:
         p["_id"] = str(p["_id"])
-        
+
         # Hydrate Event Title
         if "event_title" not in p and "event_id" in p:
-            event = await events_col.find_one({"_id": ObjectId(p["event_id"])})
-            p["event_title"] = event["title"] if event else "Unknown Event"
-            
+            p["event_title"] = events.get(str(p["event_id"])) or "Unknown Event"
+
         # Hydrate User Details (Name, Email, Resume)
-        if "user_id" in p:
-            user = await users_col.find_one({"user_id": p["user_id"]})
-            if user:
-                p["full_name"] = user.get("full_name") or user.get("name") or "Student"
-                p["email"] = user.get("email") or "No Email"
-                if "resume_url" not in p:
-                    p["resume_url"] = user.get("resume_url")
-                    
-        results.append(p)
+        user = users.get(p.get("user_id"))
+        if user:
+            p["full_name"] = user.get("full_name") or user.get("name") or "Student"
+            p["email"] = user.get("email") or "No Email"
+            if "resume_url" not in p:
+                p["resume_url"] = user.get("resume_url")
+    return batch
+
+
+async def _iter_institution_people(institution_id: str, cursor: Optional[str] = None, limit: Optional[int] = None):
+    """
+    Yields hydrated hackathon participants, then opportunity applicants, in pages of
+    PARTICIPANT_HYDRATION_BATCH. With `limit` the scan is keyset-paginated on _id
+    (newest first); `cursor` is "p:<id>" or "a:<id>" as returned in X-Next-Cursor,
+    and a bare "a:" starts at the first applicant.
+    """
+    phase, after = "p", None
+    if cursor:
+        phase, _, raw_id = cursor.partition(":")
+        if phase not in ("p", "a") or (raw_id and not ObjectId.is_valid(raw_id)) or (phase == "p" and not raw_id):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        after = ObjectId(raw_id) if raw_id else None
+    paginated = limit is not None
+    sort = [("_id", -1)] if paginated else [("registered_at", -1)]
+    remaining = limit
+
+    # 1. Fetch Hackathon Participants
+    if phase == "p":
+        query = {"institution_id": institution_id}
+        if after is not None:
+            query["_id"] = {"$lt": after}
+        p_cursor = participants_col.find(query).sort(sort)
+        if paginated:
+            p_cursor = p_cursor.limit(remaining)
+        batch = []
+        async for p in p_cursor:
+            batch.append(p)
+            if len(batch) >= PARTICIPANT_HYDRATION_BATCH:
+                for row in await _hydrate_participant_batch(batch):
+                    yield "p", row
+                batch = []
+        for row in await _hydrate_participant_batch(batch):
+            yield "p", row
+        if paginated:
+            # A page never spans both phases; the caller continues with "a:"
+            return
+        after = None
 
     # 2. Fetch Opportunity Applicants (Jobs/Internships/Hackathons)
-    from db import opportunities_col
-    opps = await opportunities_col.find({
-        "$or": [{"institution_id": institution_id}, {"createdBy": institution_id}]
-    }).to_list(length=1000)
-    opp_ids = [str(o["_id"]) for o in opps]
-    opp_map = {str(o["_id"]): o.get("title", "Opportunity") for o in opps}
-    
-    app_cursor = opportunity_applications_col.find({
-        "$or": [
-            {"institution_id": institution_id},
-            {"opportunity_id": {"$in": opp_ids}}
-        ]
-    }).sort("applied_at", -1)
-    
-    # We use a set to avoid duplicates if an app matches both conditions
-    seen_apps = set()
+    opp_map = {
+        str(o["_id"]): o.get("title", "Opportunity")
+        async for o in opportunities_col.find(
+            {"$or": [{"institution_id": institution_id}, {"createdBy": institution_id}]},
+            {"title": 1}
+        )
+    }
+    query = {"$or": [
+        {"institution_id": institution_id},
+        {"opportunity_id": {"$in": list(opp_map)}}
+    ]}
+    if after is not None:
+        query = {"$and": [query, {"_id": {"$lt": after}}]}
+    app_cursor = opportunity_applications_col.find(query).sort([("_id", -1)] if paginated else [("applied_at", -1)])
+    if paginated:
+        app_cursor = app_cursor.limit(remaining)
+
     async for app in app_cursor:
-        app_id = str(app["_id"])
-        if app_id in seen_apps:
-            continue
-        seen_apps.add(app_id)
-        
         opp_title = opp_map.get(str(app.get("opportunity_id")), "Opportunity Application")
-        results.append({
-            "_id": app_id,
+        yield "a", {
+            "_id": str(app["_id"]),
             "full_name": app.get("name") or "Applicant",
             "email": app.get("email"),
             "phone": "N/A",
@@ -316,9 +372,47 @@ async def get_all_institution_participants(institution_id: str, user: dict = Dep
             "status": app.get("status", "pending"),
             "registered_at": app.get("applied_at"),
             "resume_url": app.get("resume_url") # Added resume support
-        })
-        
-    return results
+        }
+
+
+@router.get("/participants/{institution_id}")
+async def get_all_institution_participants(
+    institution_id: str,
+    response: Response,
+    user: dict = Depends(get_auth_user),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+):
+    """
+    Retrieves all participants AND opportunity applicants for this institution.
+    Without `limit` the full list is streamed as a JSON array; with `limit` one page
+    is returned and the next page's cursor is sent in the X-Next-Cursor header.
+    """
+    assert_institution_scope(institution_id, user)
+
+    if limit is None:
+        async def _stream():
+            yield "["
+            first = True
+            async for _, row in _iter_institution_people(institution_id):
+                yield ("" if first else ",") + json.dumps(jsonable_encoder(row))
+                first = False
+            yield "]"
+        return StreamingResponse(_stream(), media_type="application/json")
+
+    # Participants first; once they run out the page is topped up with applicants
+    results = []
+    if not cursor or cursor.startswith("p:"):
+        results = [row async for _, row in _iter_institution_people(institution_id, cursor, limit)]
+        if len(results) >= limit:
+            response.headers["X-Next-Cursor"] = f"p:{results[-1]['_id']}"
+            return results
+        cursor = "a:"
+
+    applicants = [row async for _, row in _iter_institution_people(institution_id, cursor, limit - len(results))]
+    if applicants and len(applicants) >= limit - len(results):
+        response.headers["X-Next-Cursor"] = f"a:{applicants[-1]['_id']}"
+    return results + applicants
 
 @router.get("/events/{event_id}/qualified-bundle")
 async def get_qualified_bundle(
@@ -331,7 +425,7 @@ async def get_qualified_bundle(
     Advanced Filtering: Bundles teams into Approved, Rejected, or Pending 
     based on a multi-criteria scoring matrix.
     """
-    await assert_institution_owns_event(event_id, user)
+    await assert_institution_can_manage_event(event_id, user)
     from db import scores_col, teams_col, submissions_col
     
     event = await events_col.find_one({"_id": ObjectId(event_id)})
@@ -462,21 +556,18 @@ async def send_bulk_selection_emails(event_id: str, data: dict, user: dict = Dep
     Sends personalized emails to a 'bundle' of selected teams.
     Injects dynamic team names.
     """
-    await assert_institution_owns_event(event_id, user)
+    await assert_institution_can_manage_event(event_id, user)
     team_ids = data.get("team_ids", [])
     next_stage = data.get("next_stage", "Next Round")
     
-    event = await events_col.find_one({"_id": ObjectId(event_id)})
-    from db import teams_col, users_col
-    
-    success_count = 0
-    for tid in team_ids:
-        team = await teams_col.find_one({"_id": ObjectId(tid)})
-        if team:
-            # Send to all members of the team
-            for member_email in team.get("members", []):
-                subject = f"Selection Alert: {team['name']} is moving to {next_stage}!"
-                body = f"""
+    event = await events_col.find_one({"_id": ObjectId(event_id)}, {"title": 1})
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+
+    def render(team: dict) -> dict:
+        return {
+            "subject": f"Selection Alert: {team['name']} is moving to {next_stage}!",
+            "html": f"""
                 <html>
                     <body style="font-family: Arial, sans-serif; color: #333;">
                         <div style="max-width: 600px; margin: auto; padding: 20px; border: 1px solid #eee; border-radius: 20px;">
@@ -490,23 +581,19 @@ async def send_bulk_selection_emails(event_id: str, data: dict, user: dict = Dep
                         </div>
                     </body>
                 </html>
-                """
-                asyncio.create_task(send_notification_email(member_email, subject, body))
-            
-            # Update team status in participants_col if needed
-            await participants_col.update_many(
-                {"event_id": event_id, "team_id": tid},
-                {"$set": {"current_stage": next_stage}}
-            )
-            success_count += 1
-            
+                """,
+        }
+
+    # One $in per chunk of teams, one outbox insert_many, one participants update_many
+    success_count = await bulk_notification_service.send_team_selection(event, team_ids, next_stage, render)
+
     return {"status": "success", "sent_to": success_count}
 
 
 @router.get("/events/{event_id}/submissions")
 async def list_event_submissions_enriched(event_id: str, user: dict = Depends(get_auth_user)):
     """All submissions for an event with team labels, average judge score, and judge assignment emails."""
-    await assert_institution_owns_event(event_id, user)
+    await assert_institution_can_manage_event(event_id, user)
     cursor = submissions_col.find({"event_id": event_id})
     out = []
     async for s in cursor:
@@ -544,7 +631,7 @@ async def update_team_institution_selection(
     user: dict = Depends(get_auth_user),
 ):
     """Persist Shortlist / Reject from the Selection Command Center (per team)."""
-    await assert_institution_owns_event(event_id, user)
+    await assert_institution_can_manage_event(event_id, user)
     team = await teams_col.find_one({"_id": ObjectId(team_id), "event_id": event_id})
     if not team:
         team = await teams_col.find_one({"_id": ObjectId(team_id), "event_id": str(event_id)})
@@ -597,13 +684,14 @@ async def assign_judges_to_submission_route(
             }
         },
     )
+    await judge_assignment_service.sync_assignments([(sub, emails)])
     title = ev.get("title") or "Event"
     for em in emails:
         subj = f"Assigned to review a submission — {title}"
         html = f"""<html><body style="font-family:system-ui,sans-serif;color:#111827">
         <p>You were assigned to evaluate a submission for <strong>{title}</strong>.</p>
         <p>Open the Studlyf judge workflow for this event.</p></body></html>"""
-        asyncio.create_task(send_notification_email(em, subj, html))
+        await queue_notification_email(em, subj, html)
     return {"status": "ok", "assigned_judge_emails": emails}
 
 
@@ -620,8 +708,23 @@ async def get_public_events():
 @router.post("/leaderboard/{event_id}/refresh")
 async def refresh_leaderboard(event_id: str):
     """Triggers dynamic recalculation of rankings based on latest scores."""
+    await leaderboard_service.rebuild_score_aggregates(event_id)
     return await leaderboard_service.calculate_event_leaderboard(event_id)
 
+@router.get("/leaderboard/{event_id}/live")
+async def fetch_live_leaderboard(event_id: str, limit: int = Query(10, ge=1, le=100)):
+    """Live top-K standings from the incrementally maintained score aggregates (cheap to poll)."""
+    rankings = await leaderboard_service.get_live_top(event_id, limit)
+    return rankings
+
+@router.get("/leaderboard/{event_id}/rank/{submission_id}")
+async def fetch_live_rank(event_id: str, submission_id: str):
+    """Current rank of a single submission in the live standings."""
+    entry = await leaderboard_service.get_live_rank(event_id, submission_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Submission has not been scored yet")
+    return entry
+
 @router.get("/leaderboard/{event_id}")
 async def fetch_leaderboard(event_id: str):
     """Retrieves live event standings based on dynamic judge scoring."""
@@ -631,7 +734,7 @@ async def fetch_leaderboard(event_id: str):
         if not event: event = await events_col.find_one({}, sort=[("created_at", -1)])
         if event: event_id = str(event["_id"])
 
-    rankings = await leaderboard_col.find({"event_id": event_id}).sort("rank", 1).to_list(None)
+    rankings = await leaderboard_service.get_rankings(event_id)
     for r in rankings: r["_id"] = str(r["_id"])
     return rankings
 
@@ -646,7 +749,6 @@ async def export_leaderboard_pdf(event_id: str):
     from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
     from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
     from io import BytesIO
-    from db import leaderboard_col, events_col
     
     if event_id == "active_event":
         event = await events_col.find_one({"status": "Live"}, sort=[("created_at", -1)])
@@ -655,7 +757,7 @@ async def export_leaderboard_pdf(event_id: str):
 
     # 1. Fetch Data
     event = await events_col.find_one({"_id": ObjectId(event_id)})
-    rankings = await leaderboard_col.find({"event_id": event_id}).sort("rank", 1).to_list(None)
+    rankings = await leaderboard_service.get_rankings(event_id)
     
     # 2. Create PDF Buffer
     buffer = BytesIO()
@@ -725,43 +827,11 @@ async def finalize_event(event_id: str):
     Triggers final results processing and bulk leaderboard generation.
     Transitions event status from LIVE to ENDED.
     """
-    from db import scores_col, leaderboard_col, submissions_col
     event = await events_col.find_one({"_id": ObjectId(event_id)})
     if not event: raise HTTPException(status_code=404, detail="Event not found")
     
-    # 1. Aggregate scores to calculate rankings
-    pipeline = [
-        {"$match": {"event_id": event_id}},
-        {"$group": {
-            "_id": "$submission_id",
-            "total_score": {"$avg": {"$add": ["$innovation", "$technicality", "$impact", "$presentation"]}}
-        }},
-        {"$sort": {"total_score": -1}}
-    ]
-    
-    rankings = await scores_col.aggregate(pipeline).to_list(None)
-    
-    # 2. Save rankings to Leaderboard
-    for idx, rank in enumerate(rankings):
-        submission = await submissions_col.find_one({"_id": ObjectId(rank["_id"])})
-        leaderboard_entry = {
-            "event_id": event_id,
-            "team_name": submission.get("team_name", "Unknown"),
-            "project_title": submission.get("project_title", "Untitled"),
-            "total_score": round(rank["total_score"], 2),
-            "rank": idx + 1,
-            "finalized_at": datetime.utcnow()
-        }
-        await leaderboard_col.update_one(
-            {"event_id": event_id, "team_name": leaderboard_entry["team_name"]},
-            {"$set": leaderboard_entry},
-            upsert=True
-        )
-
-    # [INTEGRATION ENHANCEMENT]
-    from services.leaderboard_service import leaderboard_service
+    # 1-2. Aggregate scores, rank and publish the leaderboard in one server-side pass
     from db import results_col
-    # Resolving undefined variable 'final_rankings' from original code by using the dynamic service
     final_rankings = await leaderboard_service.calculate_event_leaderboard(event_id)
     winner_ids = [r.get("team_id") or r.get("participant_id") for r in final_rankings[:3]]
     await results_col.update_one({"event_id": event_id}, {"$set": {"winner_ids": winner_ids, "final_rankings": final_rankings}}, upsert=True)
@@ -843,7 +913,7 @@ async def generate_event_certificates(event_id: str, rankings: list):
                     </body>
                 </html>
                 """
-                asyncio.create_task(send_notification_email(recipient_email, subject, body))
+                await queue_notification_email(recipient_email, subject, body)
     
     return {"status": "Event finalized and leaderboard generated successfully"}
 
@@ -935,6 +1005,7 @@ async def get_my_institution_notifications(user: dict = Depends(get_auth_user)):
                     {"user_id": str(user.get("user_id") or "")},
                     {"$set": {"institution_id": institution_id}},
                 )
+                invalidate_principal(str(user.get("user_id") or ""))
         except Exception:
             institution_id = ""
     if not institution_id:
@@ -1017,6 +1088,7 @@ async def create_submission(submission_data: dict):
     
     submission_data["submitted_at"] = datetime.utcnow()
     result = await submissions_col.insert_one(submission_data)
+    await institution_stats_service.increment_for_event(submission_data.get("event_id"), total_submissions=1)
     
     # [REAL-TIME NOTIFICATION] Notify Institution
     inst_id = submission_data.get("institution_id")
@@ -1050,7 +1122,7 @@ async def create_submission(submission_data: dict):
                         </body>
                     </html>
                     """
-                    asyncio.create_task(send_notification_email(inst_email, inst_subject, inst_body))
+                    await queue_notification_email(inst_email, inst_subject, inst_body)
 
     return {"status": "success", "id": str(result.inserted_id)}
 
@@ -1173,7 +1245,14 @@ async def save_judge_score(score_data: dict, user: dict = Depends(get_auth_user)
         "evaluated_at": datetime.utcnow(),
     }
 
-    await scores_col.insert_one(evaluation_entry)
+    # One score per judge per submission; a re-score replaces the earlier one
+    previous = await scores_col.find_one_and_replace(
+        {"submission_id": submission_id, "judge_email": ue},
+        evaluation_entry,
+        upsert=True,
+    )
+    await leaderboard_service.record_score(sub, evaluation_entry, previous)
+    await judge_assignment_service.mark_scored(submission_id, ue)
 
     await submissions_col.update_one(
         {"_id": ObjectId(str(submission_id))},
@@ -1221,7 +1300,7 @@ async def save_judge_score(score_data: dict, user: dict = Depends(get_auth_user)
                         </body>
                     </html>
                     """
-                    asyncio.create_task(send_notification_email(inst_email, subject, body))
+                    await queue_notification_email(inst_email, subject, body)
 
     await log_admin_action(ue, "SUBMISSION_SCORED", f"Scored team {team_id}")
     return {"status": "success", "total_score": total_score}
@@ -1321,7 +1400,7 @@ async def update_submission_status(submission_id: str, status_update: dict, user
         raise HTTPException(status_code=404, detail="Submission not found")
     eid = str(sub.get("event_id") or "")
     if eid:
-        await assert_institution_owns_event(eid, user)
+        await assert_institution_can_manage_event(eid, user)
     else:
         assert_institution_scope(str(sub.get("institution_id") or ""), user)
     update_fields = {
@@ -1349,7 +1428,7 @@ async def verify_internal_process(participant_id: str, verification_data: dict):
 @router.get("/events/{event_id}/details")
 async def get_complex_event_details(event_id: str, user: dict = Depends(get_auth_user)):
     """Retrieves full event details including stages, fees, and rules."""
-    await assert_institution_owns_event(event_id, user)
+    await assert_institution_can_manage_event(event_id, user)
     from db import events_col
     event = await events_col.find_one({"_id": ObjectId(event_id)})
     if event:
@@ -1371,7 +1450,7 @@ async def get_complex_event_details(event_id: str, user: dict = Depends(get_auth
 @router.patch("/events/{event_id}")
 async def update_event_details(event_id: str, update_data: dict, user: dict = Depends(get_auth_user)):
     """Updates general event information."""
-    await assert_institution_owns_event(event_id, user)
+    await assert_institution_can_manage_event(event_id, user)
     from db import events_col
     if "_id" in update_data: del update_data["_id"]
     # Normalize stages: ensure stable ids are persisted.
@@ -1379,13 +1458,13 @@ async def update_event_details(event_id: str, update_data: dict, user: dict = De
         for s in update_data["stages"]:
             if isinstance(s, dict) and not s.get("id"):
                 s["id"] = str(uuid.uuid4())
-    await events_col.update_one({"_id": ObjectId(event_id)}, {"$set": update_data})
+    await events_col.update_one({"_id": ObjectId(event_id)}, {"$set": with_deadline_at(update_data)})
     return {"status": "success"}
 
 @router.post("/events/{event_id}/stages")
 async def add_event_stage(event_id: str, stage: dict, user: dict = Depends(get_auth_user)):
     """Adds a new stage to an event's workflow."""
-    await assert_institution_owns_event(event_id, user)
+    await assert_institution_can_manage_event(event_id, user)
     from db import events_col
     import uuid
     stage["id"] = str(uuid.uuid4())
@@ -1399,7 +1478,7 @@ async def add_event_stage(event_id: str, stage: dict, user: dict = Depends(get_a
 @router.put("/events/{event_id}/stages/{stage_id}")
 async def update_event_stage(event_id: str, stage_id: str, stage_update: dict, user: dict = Depends(get_auth_user)):
     """Updates a specific stage within an event."""
-    await assert_institution_owns_event(event_id, user)
+    await assert_institution_can_manage_event(event_id, user)
     from db import events_col
     # MongoDB positional update for array
     await events_col.update_one(
@@ -1411,7 +1490,7 @@ async def update_event_stage(event_id: str, stage_id: str, stage_update: dict, u
 @router.delete("/events/{event_id}/stages/{stage_id}")
 async def delete_event_stage(event_id: str, stage_id: str, user: dict = Depends(get_auth_user)):
     """Removes a specific stage from an event's workflow and updates remaining stages' order."""
-    await assert_institution_owns_event(event_id, user)
+    await assert_institution_can_manage_event(event_id, user)
     from db import events_col
     
     # Get current event to check if stage exists
@@ -1489,7 +1568,7 @@ async def delete_event_stage(event_id: str, stage_id: str, user: dict = Depends(
 @router.patch("/events/{event_id}/advance-stage")
 async def advance_participants(event_id: str, participant_ids: list, next_stage: str, user: dict = Depends(get_auth_user)):
     """Internal Process: Advances participants and triggers phase-specific notifications."""
-    await assert_institution_owns_event(event_id, user)
+    await assert_institution_can_manage_event(event_id, user)
     from db import notifications_col, events_col
     from services.event_workflow_service import workflow_service
     
@@ -1530,7 +1609,7 @@ async def add_event_judge(event_id: str, judge_data: dict, user: dict = Depends(
     """
     Adds a judge to an event and sends an invitation email.
     """
-    await assert_institution_owns_event(event_id, user)
+    await assert_institution_can_manage_event(event_id, user)
     event = await events_col.find_one({"_id": ObjectId(event_id)})
     if not event: raise HTTPException(status_code=404, detail="Event not found")
     
@@ -1571,7 +1650,7 @@ async def add_event_judge(event_id: str, judge_data: dict, user: dict = Depends(
 @router.delete("/events/{event_id}/judges/{judge_email}")
 async def remove_event_judge(event_id: str, judge_email: str, user: dict = Depends(get_auth_user)):
     """Removes a judge from an event."""
-    await assert_institution_owns_event(event_id, user)
+    await assert_institution_can_manage_event(event_id, user)
     await events_col.update_one(
         {"_id": ObjectId(event_id)},
         {"$pull": {"judges": {"email": judge_email}}}
@@ -1583,7 +1662,7 @@ async def update_judging_criteria(event_id: str, criteria_data: List[dict], user
     """
     Updates the scoring rubrics for an event.
     """
-    await assert_institution_owns_event(event_id, user)
+    await assert_institution_can_manage_event(event_id, user)
     await events_col.update_one(
         {"_id": ObjectId(event_id)},
         {"$set": {"judging_criteria": criteria_data, "updated_at": datetime.utcnow()}}
@@ -1593,7 +1672,7 @@ async def update_judging_criteria(event_id: str, criteria_data: List[dict], user
 @router.get("/events/{event_id}/quizzes")
 async def get_event_quizzes(event_id: str, user: dict = Depends(get_auth_user)):
     """Retrieves all assessments/quizzes linked to a specific event."""
-    await assert_institution_owns_event(event_id, user)
+    await assert_institution_can_manage_event(event_id, user)
     from db import quizzes_col
     cursor = quizzes_col.find({"event_id": event_id})
     quizzes = await cursor.to_list(length=100)
@@ -1604,7 +1683,7 @@ async def get_event_quizzes(event_id: str, user: dict = Depends(get_auth_user)):
 @router.post("/events/{event_id}/quizzes")
 async def create_event_quiz(event_id: str, quiz_data: dict, user: dict = Depends(get_auth_user)):
     """Creates a new assessment round with questions and timing."""
-    await assert_institution_owns_event(event_id, user)
+    await assert_institution_can_manage_event(event_id, user)
     from db import quizzes_col
     # Validation: only allow supported question protocols
     try:
@@ -1753,7 +1832,7 @@ async def submit_event_quiz(event_id: str, quiz_id: str, payload: dict = Body(..
             if email:
                 subj = f"Shortlisted: {ev.get('title')}"
                 body = f"<html><body><p>You passed the assessment (score {score}%). You are shortlisted for the next stage.</p></body></html>"
-                asyncio.create_task(send_notification_email(email, subj, body))
+                await queue_notification_email(email, subj, body)
         except Exception:
             pass
         await notify_institution(
@@ -1777,7 +1856,7 @@ async def submit_event_quiz(event_id: str, quiz_id: str, payload: dict = Body(..
 @router.get("/events/{event_id}/quizzes/{quiz_id}/coding-attempts")
 async def list_coding_attempts(event_id: str, quiz_id: str, user: dict = Depends(get_auth_user)):
     """Institution view: pending coding evaluations for a quiz."""
-    await assert_institution_owns_event(event_id, user)
+    await assert_institution_can_manage_event(event_id, user)
     rows = []
     cursor = participants_col.find(
         {
@@ -1823,7 +1902,7 @@ async def evaluate_coding_attempt(
     user: dict = Depends(get_auth_user),
 ):
     """Institution action: manually score coding attempt and decide shortlist outcome."""
-    await assert_institution_owns_event(event_id, user)
+    await assert_institution_can_manage_event(event_id, user)
     score = int(payload.get("score", 0))
     passed = bool(payload.get("passed", False))
     remarks = str(payload.get("remarks") or "").strip()
@@ -1969,7 +2048,8 @@ async def create_pro_event(request: Request, user: dict = Depends(get_auth_user)
         raise HTTPException(status_code=400, detail="institution_id is required")
     assert_institution_scope(str(iid), user)
         
-    result = await events_col.insert_one(event_data)
+    result = await events_col.insert_one(with_deadline_at(event_data))
+    await institution_stats_service.increment(str(iid), total_events=1)
     
     # 4. Production Trigger: Create a notification record
     from db import notifications_col
@@ -2288,7 +2368,7 @@ async def bulk_onboard_members(data: dict):
             </body>
             </html>
             """
-            asyncio.create_task(send_notification_email(email, subject, body))
+            await queue_notification_email(email, subject, body)
             
             results["added"] += 1
         except Exception as e:
@@ -2420,6 +2500,7 @@ async def assign_judge_to_submission(
 
     if not res.matched_count:
         raise HTTPException(status_code=404, detail="Submission not found")
+    await judge_assignment_service.sync_assignments([(sub, [email])])
 
     inst_id = ev.get("institution_id")
     if inst_id:
@@ -2492,7 +2573,6 @@ async def get_leaderboard(event_id: Optional[str] = None):
     """
     Fetches the rankings for a specific event (or the most recent one).
     """
-    from db import leaderboard_col, events_col
     try:
         query = {}
         if event_id:
@@ -2505,8 +2585,7 @@ async def get_leaderboard(event_id: Optional[str] = None):
             else:
                 return []
 
-        cursor = leaderboard_col.find(query).sort("rank", 1)
-        rankings = await cursor.to_list(length=100)
+        rankings = await leaderboard_service.get_rankings(query["event_id"], limit=100)
         
         # Format for frontend
         formatted = []
@@ -2588,25 +2667,15 @@ async def global_search(q: str, institution_id: str, user: dict = Depends(get_au
         if "board" in query or "home" in query:
             results.append({"id": "nav-dash", "type": "Page", "title": "Main Dashboard", "link": "/"})
 
-        # 2. Search Real Events
-        event_cursor = db.events.find({"title": {"$regex": q, "$options": "i"}}).limit(3)
-        async for event in event_cursor:
-            results.append({
-                "id": str(event["_id"]),
-                "type": "Event",
-                "title": event["title"],
-                "link": f"/events/{event['_id']}"
-            })
-            
-        # 3. Search Real Teams
-        team_cursor = db.teams.find({"team_name": {"$regex": q, "$options": "i"}}).limit(3)
-        async for team in team_cursor:
-            results.append({
-                "id": str(team["_id"]),
-                "type": "Team",
-                "title": team["team_name"],
-                "link": f"/teams/{team['_id']}"
-            })
+        # 2-3. Search Real Events and Teams (ranked, scoped to this institution)
+        for kind, label in (("event", "Event"), ("team", "Team")):
+            for row in await search_service.search(q, kinds=[kind], scope=institution_id, limit=3):
+                results.append({
+                    "id": row["ref_id"],
+                    "type": label,
+                    "title": row["title"],
+                    "link": row["link"]
+                })
             
         return results
         
@@ -2621,15 +2690,14 @@ async def get_institution_stats(institution_id: str, user: dict = Depends(get_au
     """
     assert_institution_scope(institution_id, user)
     try:
-        # 1. Total Participants
-        total_participants = await db.participants.count_documents({"institution_id": institution_id})
+        # 1. Participants & teams come from the institution's cached_stats counters
+        counters = await institution_stats_service.get(institution_id)
+        total_participants = counters.get("total_participants", 0)
+        total_teams = counters.get("total_teams", 0)
         
         # 2. Active Events
         active_events = await db.events.count_documents({"institution_id": institution_id, "status": "published"})
         
-        # 3. Total Teams
-        total_teams = await db.teams.count_documents({"institution_id": institution_id})
-        
         # 4. Average Score (from evaluations)
         avg_score = 0
         pipeline = [
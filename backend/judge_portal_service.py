@@ -3,7 +3,7 @@ Comprehensive Judge Portal Service for StudLyf Platform
 Handles judge invitations, assignments, evaluations, and portal access
 """
 from datetime import datetime, timezone
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from bson import ObjectId
 from db import (
     judges_col, events_col, submissions_col, scores_col, 
@@ -11,6 +11,7 @@ from db import (
 )
 from services.email_service import send_notification_email
 from services.leaderboard_service import leaderboard_service
+from services.judge_assignment_service import judge_assignment_service
 from notification_helpers import notify_institution
 import secrets
 import asyncio
@@ -153,59 +154,38 @@ class JudgePortalService:
         
         return {"status": new_status, "event_name": event.get("name", "Unknown Event") if event else "Unknown Event"}
     
-    async def get_judge_assignments(self, judge_email: str, event_id: Optional[str] = None):
-        """Get all submissions assigned to a judge"""
-        
-        # Get accepted judge records
+    async def _accepted_judge_records(self, judge_email: str, event_id: Optional[str] = None) -> List[dict]:
         judge_query = {"email": judge_email.lower().strip(), "status": "ACCEPTED"}
         if event_id:
             judge_query["event_id"] = event_id
-        
-        judge_records = []
-        async for judge in judges_col.find(judge_query):
-            judge_records.append(judge)
-        
+        return await judges_col.find(judge_query, {"event_id": 1}).to_list(None)
+
+    async def get_judge_assignments(
+        self,
+        judge_email: str,
+        event_id: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        submission_id: Optional[str] = None,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        Get submissions assigned to a judge from the judge_assignments index.
+        Returns (page, next_cursor); next_cursor is None on the last page or when unpaginated.
+        """
+        judge_records = await self._accepted_judge_records(judge_email, event_id)
         if not judge_records:
-            return []
-        
-        # Get assigned submissions
-        judge_event_ids = [judge["event_id"] for judge in judge_records]
-        submission_query = {
-            "event_id": {"$in": judge_event_ids},
-            "status": "Submitted"
-        }
-        
-        # Filter by assigned judge emails
-        submissions = []
-        async for submission in submissions_col.find(submission_query):
-            assigned_judges = submission.get("assigned_judge_emails", [])
-            if judge_email.lower().strip() in [j.lower().strip() for j in assigned_judges]:
-                # Get event details
-                event = await events_col.find_one({"_id": ObjectId(submission["event_id"])})
-                
-                # Get participant/team details
-                participant_info = await self._get_participant_info(submission)
-                
-                # Get existing scores
-                scores = await self._get_submission_scores(str(submission["_id"]), judge_email)
-                
-                submission_data = {
-                    "_id": str(submission["_id"]),
-                    "event_id": submission["event_id"],
-                    "event_name": event.get("name", "Unknown Event") if event else "Unknown Event",
-                    "title": submission.get("title", "Untitled Submission"),
-                    "description": submission.get("description", ""),
-                    "submitted_at": submission.get("submitted_at", ""),
-                    "status": submission.get("status", "Submitted"),
-                    "participant_info": participant_info,
-                    "submission_data": submission.get("submission_data", {}),
-                    "files": submission.get("files", []),
-                    "existing_scores": scores,
-                    "evaluation_criteria": event.get("judging_criteria", []) if event else []
-                }
-                submissions.append(submission_data)
-        
-        return submissions
+            return [], None
+
+        email = judge_email.lower().strip()
+        rows, next_cursor = await judge_assignment_service.list_for_judge(
+            email,
+            [judge["event_id"] for judge in judge_records],
+            cursor=cursor,
+            limit=limit,
+            submission_id=submission_id,
+        )
+        items = await judge_assignment_service.hydrate(rows, email, [str(j["_id"]) for j in judge_records])
+        return items, next_cursor
     
     async def submit_evaluation(self, judge_email: str, submission_id: str, scores: dict, comments: str):
         """Submit evaluation for a submission"""
@@ -238,25 +218,20 @@ class JudgePortalService:
             "created_at": datetime.now(timezone.utc).isoformat()
         }
         
-        # Check if already scored
-        existing = await scores_col.find_one({
-            "submission_id": submission_id,
-            "judge_id": str(judge["_id"])
-        })
-        
-        if existing:
-            await scores_col.update_one(
-                {"_id": existing["_id"]},
-                {"$set": score_doc}
-            )
-        else:
-            await scores_col.insert_one(score_doc)
+        # One score per judge per submission; a re-score replaces the earlier one
+        # atomically, and the replaced document is the base for the aggregate delta
+        existing = await scores_col.find_one_and_replace(
+            {"submission_id": submission_id, "judge_id": str(judge["_id"])},
+            score_doc,
+            upsert=True,
+        )
         
         # Update submission status if all judges have scored
         await self._check_submission_completion(submission_id)
         
-        # Update leaderboard
-        await leaderboard_service.calculate_event_leaderboard(submission["event_id"])
+        # Update live rankings in place (full recompute happens on refresh/finalize)
+        await leaderboard_service.record_score(submission, score_doc, existing)
+        await judge_assignment_service.mark_scored(submission_id, judge_email)
         
         # Create notification for institution
         await notify_institution(
@@ -396,60 +371,6 @@ class JudgePortalService:
         
         await send_notification_email(judge["email"], subject, body_html)
     
-    async def _get_participant_info(self, submission: dict) -> dict:
-        """Get participant/team information for a submission"""
-        
-        participant_id = submission.get("participant_id")
-        team_id = submission.get("team_id")
-        
-        if team_id:
-            # Team submission
-            from db import teams_col
-            team = await teams_col.find_one({"_id": ObjectId(team_id)})
-            if team:
-                return {
-                    "type": "team",
-                    "name": team.get("team_name", "Unknown Team"),
-                    "members": team.get("members", []),
-                    "leader": team.get("leader_name", "Unknown Leader")
-                }
-        
-        if participant_id:
-            # Individual submission
-            from db import participants_col
-            participant = await participants_col.find_one({"_id": ObjectId(participant_id)})
-            if participant:
-                user = await users_col.find_one({"user_id": participant.get("user_id")})
-                return {
-                    "type": "individual",
-                    "name": user.get("name", "Unknown Participant") if user else "Unknown Participant",
-                    "email": user.get("email", "") if user else "",
-                    "user_id": participant.get("user_id", "")
-                }
-        
-        return {"type": "unknown", "name": "Unknown Participant"}
-    
-    async def _get_submission_scores(self, submission_id: str, judge_email: str) -> Optional[dict]:
-        """Get existing scores for a submission by judge"""
-        
-        judge = await judges_col.find_one({"email": judge_email.lower().strip()})
-        if not judge:
-            return None
-        
-        score = await scores_col.find_one({
-            "submission_id": submission_id,
-            "judge_id": str(judge["_id"])
-        })
-        
-        if score:
-            return {
-                "scores": score.get("scores", {}),
-                "comments": score.get("comments", ""),
-                "created_at": score.get("created_at", "")
-            }
-        
-        return None
-    
     async def _check_submission_completion(self, submission_id: str):
         """Check if all assigned judges have scored and update status"""
         
@@ -1,6 +1,7 @@
 import os
+import asyncio
+import json
 import subprocess
-import inspect
 from dotenv import load_dotenv
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends, Header, Request, status, Query, Body
 from fastapi.middleware.cors import CORSMiddleware
@@ -15,6 +16,9 @@ import traceback
 from groq import Groq
 import requests
 from services.ai_tools_scraper import fetch_ai_tools
+from services.llm_gateway import llm_gateway
+from services.llm_cache import llm_cache, cached_completion
+from services.quiz_generation_service import quiz_generation_service
 from jinja2 import Environment, FileSystemLoader, Template
 from datetime import datetime, timezone
 import secrets
@@ -57,12 +61,18 @@ if os.getenv("ENVIRONMENT", "development").lower() == "development":
 # Remove duplicates
 origins = list(set(origins))
 
+# Cap multipart bodies while they stream (added first so CORS still wraps the 413)
+from services.upload_service import UploadSizeLimitMiddleware
+app.add_middleware(UploadSizeLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    # Keyset cursor of paginated listings (/api/v1/institution/participants)
+    expose_headers=["X-Next-Cursor"],
 )
 
 @app.on_event("startup")
@@ -72,19 +82,45 @@ async def startup_event():
         # Attempt database connection
         await db.connect()
         logger.info("Application startup completed successfully")
-        
-        # Start background scheduler for reminders
-        from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+        # Drain the durable email outbox
+        await email_outbox.start()
+
+        # One-time backfill of the judge assignment index
+        from services.judge_assignment_service import judge_assignment_service
+        app.state.judge_assignment_backfill = asyncio.create_task(judge_assignment_service.backfill_if_empty())
+
+        # Login lookups go through the indexed email_key field
+        app.state.email_key_backfill = asyncio.create_task(credential_service.backfill_email_keys())
+
+        # Judge reminders range-scan the indexed submission_deadline_at
         from services.reminder_service import reminder_service
+        app.state.deadline_backfill = asyncio.create_task(reminder_service.backfill_deadlines())
         
-        scheduler = AsyncIOScheduler()
-        scheduler.add_job(reminder_service.send_judge_reminders, 'interval', hours=12)
-        scheduler.start()
-        logger.info("Background reminder scheduler started")
+        # Periodic jobs (reminders, stats reconciliation, leaderboards, cleanup, quiz
+        # pre-generation); every worker joins, only the lease holder runs them
+        from services.job_scheduler import job_scheduler, Follower
+        from services.search_service import search_service
+        from services.admin_metrics_service import admin_metrics_service
+        # The search index and the admin dashboard rollups follow their source collections on the lease holder only
+        job_scheduler.register_follower(Follower("search_index", search_service.start, search_service.stop))
+        job_scheduler.register_follower(Follower("admin_metrics", admin_metrics_service.start, admin_metrics_service.stop))
+        await job_scheduler.start()
         
     except Exception as e:
         logger.error(f"Startup error: {e}")
 
+@app.get("/api/files/{key:path}")
+async def download_file(key: str, request: Request):
+    """Serve an uploaded blob; supports Range requests for partial/resumable downloads."""
+    from services.blob_store import normalize_key
+    from services.upload_service import BLOB_PUBLIC_PREFIX, range_response
+    try:
+        key = normalize_key(key, under=BLOB_PUBLIC_PREFIX)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="File not found")
+    return await range_response(key, request.headers.get("range"))
+
 @app.get("/")
 async def root():
     return {"message": "Studlyf API is operational", "docs": "/docs"}
@@ -135,7 +171,7 @@ async def get_current_user(authorization: Optional[str] = Header(None)):
         raise HTTPException(status_code=401, detail="Missing or invalid token")
     
     token = authorization.split(" ")[1]
-    from auth_utils import decode_access_token
+    # Verified tokens are served from decode_access_token's cache until they expire
     payload = decode_access_token(token)
     if not payload:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
@@ -167,7 +203,7 @@ async def admin_required(x_admin_email: str = Header(None)):
             detail="Forbidden: invalid super-admin header (configure SUPER_ADMIN_EMAILS).",
         )
     return x_admin_email
-from db import db, courses_col, modules_col, theories_col, videos_col, quizzes_col, projects_col, progress_col, cart_col, enrollments_col, interviews_col, certificates_col, sdl_projects_col, sdl_members_col, sdl_tasks_col, sdl_comments_col, sdl_join_requests_col, users_col, ads_col, mentors_col, companies_col, payments_col, audit_logs_col, resumes_col, institutions_col, events_col, participants_col, teams_col, submissions_col, judges_col, scores_col, notifications_col, leaderboard_col
+from db import db, courses_col, modules_col, theories_col, videos_col, quizzes_col, projects_col, progress_col, cart_col, enrollments_col, interviews_col, certificates_col, sdl_projects_col, sdl_members_col, sdl_tasks_col, sdl_comments_col, sdl_join_requests_col, users_col, ads_col, mentors_col, companies_col, payments_col, audit_logs_col, resumes_col, institutions_col, events_col, participants_col, teams_col, submissions_col, judges_col, scores_col, leaderboard_col
 
 @app.post("/api/v1/auth/promote-to-institution")
 async def promote_to_institution(data: dict):
@@ -179,11 +215,19 @@ async def promote_to_institution(data: dict):
         {"user_id": user_id},
         {"$set": {"role": "institution"}}
     )
+    invalidate_principal(user_id)
     return {"status": "success"}
 
 from models import Institution, Event, Participant, Team, Submission, Judge, Score, Notification, LeaderboardEntry, Certificate
-from services.email_service import send_notification_email, get_registration_template
-from auth_utils import get_password_hash, verify_password, create_access_token, decode_access_token
+from services.email_service import get_registration_template
+from services.email_outbox import email_outbox, queue_notification_email
+from services.matchmaking_service import matchmaking_service
+from services.institution_stats_service import institution_stats_service
+from services.badge_service import badge_service
+from services.progress_service import progress_service
+from services.credential_service import credential_service, PasswordPoolBusy, shutdown_pool as shutdown_password_pool
+from auth_utils import create_access_token, decode_access_token
+from auth_institution import invalidate_principal
 import upgrade_routes
 import integration_routes
 from slowapi import Limiter, _rate_limit_exceeded_handler
@@ -212,85 +256,9 @@ async def log_admin_action(admin_email: str, action: str, details: str = ""):
 
 # --- Badge Helper Functions (No app dependency) ---
 
-async def award_badge(user_id: str, badge_id: str, name: str, description: str, icon: str, level: str):
-    """Utility to award a badge to a user in mongo if not already awarded."""
-    # Find user profile
-    user_profile = await users_col.find_one({"user_id": user_id})
-    if not user_profile:
-        # Create profile in mongo
-        user_profile = {
-            "user_id": user_id,
-            "badges": [],
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }
-        await users_col.insert_one(user_profile)
-    
-    # Check if badge already exists
-    current_badges = user_profile.get("badges", [])
-    if any(b.get("badge_id") == badge_id for b in current_badges):
-        return False
-    
-    # Add new badge
-    new_badge = {
-        "badge_id": badge_id,
-        "name": name,
-        "description": description,
-        "icon": icon,
-        "level": level,
-        "awarded_at": datetime.now(timezone.utc).isoformat()
-    }
-    
-    await users_col.update_one(
-        {"user_id": user_id},
-        {"$push": {"badges": new_badge}}
-    )
-    return new_badge
-
 async def check_user_badges(user_id: str):
-    """Comprehensive check of user stats to award progress-based badges."""
-    newly_earned = []
-    
-    # 1. 🚀 Beginner Explorer (First Course Started/Enrolled)
-    count_enrollments = await enrollments_col.count_documents({"user_id": user_id})
-    if count_enrollments >= 1:
-        res = await award_badge(user_id, "beginner_explorer", "Beginner Explorer", 
-                          "Embark on your journey by starting your very first course.", "🚀", "Level 1")
-        if res: newly_earned.append(res)
-
-    # 2. ⚡ Knowledge Seeker (1 module completed)
-    count_completed_modules = await progress_col.count_documents({"user_id": user_id, "status": "completed"})
-    if count_completed_modules >= 1:
-        res = await award_badge(user_id, "knowledge_seeker", "Knowledge Seeker", 
-                          "Outstanding work! You've successfully completed your first learning module.", "⚡", "Level 2")
-        if res: newly_earned.append(res)
-
-    # 3. 👑 Course Master (Completed a full course)
-    count_certs = await certificates_col.count_documents({"user_id": user_id})
-    if count_certs >= 1:
-        res = await award_badge(user_id, "course_master", "Course Master", 
-                          "Demonstrate mastery by completing an entire course and passing the final quiz.", "👑", "Level 3")
-        if res: newly_earned.append(res)
-
-    # 4. 🧠 Subject Expert (3 courses in same domain)
-    user_certs = []
-    async for cert in certificates_col.find({"user_id": user_id}):
-        user_certs.append(cert)
-    
-    if len(user_certs) >= 3:
-        domain_counts = {}
-        for cert in user_certs:
-            course = await courses_col.find_one({"_id": cert["course_id"]})
-            if course and "role_tag" in course:
-                domain = course["role_tag"]
-                domain_counts[domain] = domain_counts.get(domain, 0) + 1
-        
-        for domain, count in domain_counts.items():
-            if count >= 3:
-                res = await award_badge(user_id, f"expert_{domain.lower()}", f"{domain} Subject Expert", 
-                                  f"Become an authority by mastering 3 courses in the {domain} domain.", "🧠", "Level 4")
-                if res: newly_earned.append(res)
-    
-    return newly_earned
+    """Evaluate every badge rule against the user's current stats; returns newly awarded badges."""
+    return await badge_service.evaluate(user_id)
 
 class AddToCartRequest(BaseModel):
     course_id: str
@@ -344,7 +312,7 @@ def fix_progress(prog, default_status="locked"):
 
 from routes import submission_routes, judge_routes, event_routes, dashboard_routes, opportunity_routes, team_routes
 from routes import judge_portal_routes, evaluation_criteria_routes, quiz_visibility_routes, notification_routes
-from rate_limiter import rate_limit, check_rate_limit
+from rate_limiter import rate_limit, check_rate_limit, rate_limiter
 
 
 @app.on_event("startup")
@@ -357,6 +325,50 @@ async def shutdown_db_client():
     from db import db
     await db.disconnect()
 
+@app.on_event("shutdown")
+async def shutdown_llm_gateway():
+    await llm_gateway.aclose()
+
+@app.on_event("shutdown")
+async def shutdown_github_client():
+    from services.github_service import github_client
+    await github_client.aclose()
+
+@app.on_event("shutdown")
+async def shutdown_email_outbox():
+    await email_outbox.stop()
+
+@app.on_event("shutdown")
+async def shutdown_blob_store():
+    from services.blob_store import blob_store
+    await blob_store.aclose()
+
+@app.on_event("shutdown")
+async def shutdown_plagiarism_pool():
+    from services.plagiarism_service import shutdown_pool
+    shutdown_pool()
+
+@app.on_event("shutdown")
+async def shutdown_institution_stats():
+    await institution_stats_service.stop()
+
+@app.on_event("shutdown")
+async def shutdown_badge_service():
+    await badge_service.stop()
+
+@app.on_event("shutdown")
+async def shutdown_rate_limiter():
+    await rate_limiter.aclose()
+
+@app.on_event("shutdown")
+async def shutdown_password_hashing():
+    shutdown_password_pool()
+
+@app.on_event("shutdown")
+async def shutdown_job_scheduler():
+    from services.job_scheduler import job_scheduler
+    await job_scheduler.stop()
+
 # --- Activate Rate Limiting ---
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
@@ -703,195 +715,28 @@ GROK_MODEL = os.getenv("GROK_MODEL", "grok-3-mini")
 GROQ_INTERVIEW_MODEL = os.getenv("GROQ_INTERVIEW_MODEL", "llama-3.3-70b-versatile")
 
 
-def get_github_data(token: str, endpoint: str, session=None):
-    # Try both 'Bearer' and 'token' formats as GitHub can be picky depending on token type
-    url = f"https://api.github.com{endpoint}"
-    formats = [f"Bearer {token}", f"token {token}"]
-    
-    for auth_header in formats:
-        headers = {
-            "Authorization": auth_header,
-            "Accept": "application/vnd.github.v3+json",
-            "User-Agent": "Studlyf-Analysis-Agent"
-        }
-        try:
-            r = session or requests
-            response = r.get(url, headers=headers, timeout=10)
-            if response.status_code == 200:
-                return response.json()
-            else:
-                print(f"GitHub API {endpoint} failed with {response.status_code} using {auth_header.split()[0]}")
-        except Exception as e:
-            print(f"GitHub API Error for {endpoint}: {e}")
-            
-    return None
-
-def analyze_readme(readme_content):
-    if not readme_content:
-        return 0
-    # Simple heuristic: length and presence of headers/sections
-    score = min(20, len(readme_content) / 100)
-    if "#" in readme_content:
-        score += 5
-    if "```" in readme_content:
-        score += 5
-    return score
-
 @app.post("/api/analyze-github")
 async def analyze_github(request: GithubAnalysisRequest):
-    token = request.token
-    user_data = get_github_data(token, "/user")
-    if not user_data:
+    import httpx
+    from services.github_service import github_analysis_service, GitHubAuthError, GitHubRateLimited, GitHubUpstreamError
+    try:
+        result = await github_analysis_service.analyze(request.token)
+    except GitHubAuthError:
         raise HTTPException(status_code=401, detail="Invalid GitHub token")
-    
-    repos = get_github_data(token, "/user/repos?per_page=100&sort=updated&type=owner")
-    if not repos:
+    except GitHubRateLimited as e:
+        raise HTTPException(
+            status_code=429,
+            detail="GitHub rate limit reached, try again later",
+            headers={"Retry-After": str(e.retry_after or 60)},
+        )
+    except GitHubUpstreamError:
+        raise HTTPException(status_code=502, detail="GitHub is unavailable, try again later")
+    except (httpx.HTTPError, RuntimeError) as e:
+        logger.warning(f"GitHub analysis failed: {e}")
+        raise HTTPException(status_code=502, detail="Could not reach GitHub to analyze this account")
+    if not result:
         return {"error": "No repositories found"}
-
-    # Signal -> Skill mapping counters 
-    skills_raw = {
-        "Backend": 0.0,
-        "Frontend": 0.0,
-        "DevOps": 0.0,
-        "Data": 0.0,
-        "GenAI": 0.0
-    }
-    
-    language_stats = {}
-    total_loc = 0
-    repo_count = len(repos)
-    signals_found = []
-
-    # Map signals to skills as requested
-    framework_map = {
-        "Backend": ["fastapi", "flask", "django", "express", "spring", "laravel"],
-        "Frontend": ["react", "next", "vue", "angular", "tailwind", "vite"],
-        "DevOps": ["docker", "kubernetes", "jenkins", "action", "terraform", "ansible"],
-        "Data": ["pandas", "numpy", "matplotlib", "scikit", "sql", "spark"],
-        "GenAI": ["openai", "langchain", "llama", "transformers", "pytorch", "tensorflow"]
-    }
-
-    # Optimized parallel fetching
-
-
-    def fetch_repo_details(repo):
-        owner = repo['owner']['login']
-        name = repo['name']
-        desc = (repo.get('description') or "").lower()
-        repo_iden = (name + " " + desc).lower()
-        is_fork = repo.get('fork', False)
-        base_weight = 0.2 if is_fork else 1.0
-
-        # Use session for efficiency
-        session = requests.Session()
-        langs = get_github_data(token, f"/repos/{owner}/{name}/languages", session)
-        contents = get_github_data(token, f"/repos/{owner}/{name}/contents", session)
-        readme_data = get_github_data(token, f"/repos/{owner}/{name}/readme", session)
-        session.close()
-
-        repo_results = {
-            "skills": {k: 0.0 for k in skills_raw},
-            "langs": {},
-            "loc": 0,
-            "signals": []
-        }
-
-        # 1. Language Analysis
-        if langs:
-            for lang, loc in langs.items():
-                repo_results["langs"][lang] = loc
-                repo_results["loc"] += loc
-                if lang in ['Python', 'Go', 'Rust', 'Java', 'PHP']: 
-                    repo_results["skills"]["Backend"] += (loc * 0.01) * base_weight
-                elif lang in ['JavaScript', 'TypeScript', 'HTML', 'CSS']:
-                    repo_results["skills"]["Frontend"] += (loc * 0.01) * base_weight
-                elif lang in ['Jupyter Notebook']:
-                    repo_results["skills"]["Data"] += (loc * 0.01) * base_weight
-
-        # 2. File & Framework Analysis
-        if contents:
-            filenames = [f['name'].lower() for f in contents]
-            if any(f in ['dockerfile', 'docker-compose.yml', 'kubernetes.yaml'] or f.endswith('.yaml') for f in filenames):
-                repo_results["skills"]["DevOps"] += 2000 * base_weight
-                repo_results["signals"].append(f"Infrastructure: {name}")
-
-            for skill, keywords in framework_map.items():
-                for kw in keywords:
-                    if kw in repo_iden:
-                        repo_results["skills"][skill] += 3000 * base_weight
-                        repo_results["signals"].append(f"{kw.capitalize()} in {name}")
-                        break
-
-        # 3. Quality & Recency
-        if readme_data and 'content' in readme_data:
-            import base64
-            try:
-                readme_text = base64.b64decode(readme_data['content']).decode('utf-8')
-                q_score = analyze_readme(readme_text)
-                for skill in repo_results["skills"]:
-                    if skill in repo_iden:
-                        repo_results["skills"][skill] += q_score * 100
-            except Exception:
-                pass
-
-        if "2025" in repo.get('updated_at', '') or "2026" in repo.get('updated_at', ''):
-            for skill in repo_results["skills"]:
-                if any(kw in repo_iden for kw in framework_map.get(skill, [])):
-                    repo_results["skills"][skill] += 500 * base_weight
-        
-        return repo_results
-
-    # Execute top 10 repos in parallel with a conservative worker count
-    from concurrent.futures import ThreadPoolExecutor
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        results = list(executor.map(fetch_repo_details, repos[:10]))
-
-    # Aggregate Results
-    for res in results:
-        for skill, val in res["skills"].items():
-            skills_raw[skill] += val
-        for lang, loc in res["langs"].items():
-            language_stats[lang] = language_stats.get(lang, 0) + loc
-            total_loc += loc
-        signals_found.extend(res["signals"])
-
-    # 4. Normalize to 0-100
-    normalization_factor = {
-        "Backend": 50000, # Slightly lowered to compensate for fewer repos
-        "Frontend": 40000,
-        "DevOps": 10000,
-        "Data": 25000,
-        "GenAI": 15000
-    }
-    
-    normalized_skills = {}
-    for skill, raw in skills_raw.items():
-        limit = normalization_factor.get(skill, 20000)
-        score = min(100, int((raw / limit) * 100))
-        if raw > 500:
-            score = max(score, 12)
-        normalized_skills[skill] = score
-
-    # Readiness Score = Weighted average of active skills
-    active_skills = [v for v in normalized_skills.values() if v > 0]
-    readiness_score = int(sum(active_skills) / len(active_skills)) if active_skills else 0
-
-    # Calculate percentages for top 5 languages
-    top_langs_list = sorted(language_stats.items(), key=lambda x: x[1], reverse=True)[:5]
-    lang_percentages = {}
-    if total_loc > 0:
-        lang_percentages = {lang: round((count / total_loc) * 100, 1) for lang, count in top_langs_list}
-
-    return {
-        "username": user_data['login'],
-        "avatar_url": user_data['avatar_url'],
-        "skills": normalized_skills,
-        "languages": lang_percentages,
-        "total_loc": total_loc,
-        "repo_count": repo_count,
-        "signals": sorted(list(set(signals_found)))[:12],
-        "readiness_score": readiness_score
-    }
+    return result
 
 # --- COURSE SYSTEM ENDPOINTS ---
 
@@ -953,46 +798,6 @@ async def get_course_modules(course_id: str, user_id: Optional[str] = None):
             
     return modules
 
-async def generate_ai_quiz(module_id: str, theory_content: str):
-    prompt = f"""
-    Create a high-quality 5-question multiple choice quiz based on this technical content.
-    
-    Content:
-    {theory_content}
-    
-    JSON Output Format:
-    {{
-        "questions": [
-            {{
-                "question": "Clear technical question?",
-                "options": ["Option A", "Option B", "Option C", "Option D"],
-                "correct_answers": [0],
-                "explanation": "Why the answer is correct."
-            }}
-        ]
-    }}
-    
-    Rules:
-    - 4 options per question.
-    - Exactly one correct answer (index 0-3).
-    - Provide a technical explanation.
-    - Return ONLY the JSON.
-    """
-    try:
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"}
-        )
-        quiz_data = json.loads(response.choices[0].message.content)
-        quiz_data["module_id"] = module_id
-        await quizzes_col.insert_one(quiz_data)
-        return fix_id(quiz_data)
-    except Exception as e:
-        print(f"Error generating AI Quiz: {e}")
-        return None
-
-
 @app.get("/api/modules/{module_id}")
 async def get_module_details(module_id: str):
     # Fetch in parallel
@@ -1005,9 +810,10 @@ async def get_module_details(module_id: str):
         theory_task, video_task, quiz_task, project_task
     )
     
-    # AI Generation if Quiz is missing
+    # AI Generation if Quiz is missing (normally pre-generated in the background;
+    # concurrent misses for the same module share a single LLM call)
     if not quiz and theory:
-        quiz = await generate_ai_quiz(module_id, theory["markdown_content"])
+        quiz = await quiz_generation_service.get_or_generate(module_id, theory["markdown_content"])
     
     return {
         "theory": fix_id(theory),
@@ -1037,63 +843,7 @@ async def update_progress(data: dict):
             return {"status": "final_step_updated"}
         raise HTTPException(status_code=400, detail="Missing module_id or course_id")
 
-    # 1. Update/Upsert module progress
-    await progress_col.update_one(
-        {"user_id": user_id, "module_id": module_id},
-        {"$set": {**updates, "course_id": course_id, "updated_at": datetime.utcnow().isoformat()}},
-        upsert=True
-    )
-    
-    # 2. Get current state & module definition to check requirements
-    prog = await progress_col.find_one({"user_id": user_id, "module_id": module_id})
-    module_def = await modules_col.find_one({"_id": module_id})
-    
-    if not module_def:
-         return {"status": "updated", "info": "Module definition missing, progress saved"}
-
-    lessons = module_def.get("lessons", [])
-    has_video = any(l.get("type") == "video" for l in lessons)
-    has_theory = any(l.get("type") in ["text", "theory"] for l in lessons)
-    has_quiz = any(l.get("type") == "quiz" for l in lessons)
-
-    # If no lessons array, fallback to legacy check
-    if not lessons:
-        has_video = has_theory = has_quiz = True
-
-    # 3. Validation logic
-    video_ok = not has_video or prog.get("video_completed")
-    theory_ok = not has_theory or prog.get("theory_completed")
-    quiz_ok = not has_quiz or prog.get("quiz_score", 0) >= 60
-
-    if video_ok and theory_ok and quiz_ok:
-        await progress_col.update_one(
-            {"user_id": user_id, "module_id": module_id},
-            {"$set": {"status": "completed"}}
-        )
-        
-        # 4. Find next module
-        order = module_def.get("order_index", 1)
-        next_mod = await modules_col.find_one({
-            "course_id": course_id, 
-            "order_index": order + 1
-        })
-        
-        if next_mod:
-            await progress_col.update_one(
-                {"user_id": user_id, "module_id": next_mod["_id"]},
-                {"$set": {"status": "unlocked", "course_id": course_id}},
-                upsert=True
-            )
-            nb = await check_user_badges(user_id)
-            return {"status": "module_completed", "unlocked_next": True, "next_id": next_mod["_id"], "new_badges": nb}
-        else:
-            nb = await check_user_badges(user_id)
-            return {"status": "course_completed", "info": "All modules finished", "new_badges": nb}
-    
-    nb = await check_user_badges(user_id)
-    return {"status": "updated", "requirements_met": False, "new_badges": nb}
-
-    return {"status": "updated"}
+    return await progress_service.update_module(user_id, module_id, course_id, updates)
 
 @app.post("/api/quiz/submit")
 async def submit_quiz(data: dict):
@@ -1150,45 +900,38 @@ async def submit_project(
 
     if file:
         # Import security utilities
-        from security_utils import validate_file_upload, generate_secure_filename, create_secure_upload_directory
+        from security_utils import validate_file_upload, MAX_FILE_SIZE
+        from services.upload_service import store_upload
         
         # Validate file for security threats
         file_info = validate_file_upload(file)
         
-        # Create secure upload directory
-        upload_dir = create_secure_upload_directory("uploads")
-        
-        # Generate secure filename
-        secure_filename = generate_secure_filename(file.filename)
-        file_path = os.path.join(upload_dir, secure_filename)
-        
-        # Save file with size limit check
+        # Stream to the blob store in chunks (size limit enforced mid-stream)
         try:
-            file_content = await file.read()
-            # Double-check file size
-            if len(file_content) > 10 * 1024 * 1024:  # 10MB limit
-                raise HTTPException(status_code=413, detail="File too large")
-            
-            with open(file_path, "wb") as f:
-                f.write(file_content)
-            update_fields["file_url"] = f"/{file_path}"
-            update_fields["file_info"] = {
-                "original_name": file.filename,
-                "secure_name": secure_filename,
-                "size": len(file_content),
-                "mime_type": file_info["mime_type"]
-            }
+            stored = await store_upload(file, MAX_FILE_SIZE, content_type=file_info["mime_type"])
+        except HTTPException:
+            raise
         except Exception as e:
-            # Clean up partial file if upload failed
-            if os.path.exists(file_path):
-                os.remove(file_path)
             raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
+        update_fields["file_url"] = stored["url"]
+        update_fields["file_info"] = {
+            "original_name": file.filename,
+            "secure_name": stored["key"],
+            "size": stored["size"],
+            "sha256": stored["sha256"],
+            "mime_type": file_info["mime_type"]
+        }
 
-    await progress_col.update_one(
+    previous = await progress_col.find_one_and_update(
         {"user_id": user_id, "module_id": module_id},
         {"$set": update_fields},
+        projection={"file_url": 1},
         upsert=True
     )
+    if file and previous:
+        # The replaced file loses its reference (store_upload took a new one, even for the same blob)
+        from services.upload_service import key_from_url, release_upload
+        await release_upload(key_from_url(previous.get("file_url")))
     return {"status": "submitted", "review": "pending_review"}
 
 # (Moved to Admin Section)
@@ -1231,7 +974,7 @@ def clean_json_string(json_str):
         json_str = json_str.split("```")[1].split("```")[0]
     return json_str.strip()
 
-def parse_with_groq(text):
+async def parse_with_groq(text):
     prompt = f"""
     You are an expert Resume Parser. Your job is to extract structured data from the provided resume text.
     
@@ -1261,13 +1004,13 @@ def parse_with_groq(text):
     """
     
     try:
-        response = client.chat.completions.create(
+        raw = await cached_completion(
+            [{"role": "user", "content": prompt}],
             model="llama-3.3-70b-versatile",
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"}
+            response_format={"type": "json_object"},
+            validate=lambda content: json.loads(clean_json_string(content))
         )
-        json_str = clean_json_string(response.choices[0].message.content)
-        return json.loads(json_str)
+        return json.loads(clean_json_string(raw))
     except Exception as e:
         print(f"AI Parse Error: {e}")
         return parse_resume_text(text)
@@ -1310,7 +1053,7 @@ async def generate_portfolio(
         # Try Groq AI First
         try:
             print("Attempting Groq Parsing...")
-            data = parse_with_groq(extracted_text)
+            data = await parse_with_groq(extracted_text)
             # Validate essential fields
             if not data.get("name") and not data.get("email"):
                  raise Exception("AI returned empty data")
@@ -1693,11 +1436,10 @@ async def generate_summary(data: ResumeData):
         Do not use placeholders. Write only the summary text.
         """
         
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[{"role": "user", "content": prompt}]
+        summary = await cached_completion(
+            [{"role": "user", "content": prompt}],
+            model="llama-3.3-70b-versatile"
         )
-        summary = response.choices[0].message.content.strip()
         
         return {"summary": summary}
     except Exception as e:
@@ -1732,11 +1474,10 @@ async def generate_resume(data: ResumeData):
                 The summary should be impactful, focus on key strengths, and use professional language. 
                 Do not use placeholders. Write only the summary text.
                 """
-                response = client.chat.completions.create(
-                    model="llama-3.3-70b-versatile",
-                    messages=[{"role": "user", "content": prompt}]
+                current_data["summary"] = await cached_completion(
+                    [{"role": "user", "content": prompt}],
+                    model="llama-3.3-70b-versatile"
                 )
-                current_data["summary"] = response.choices[0].message.content.strip()
             except Exception as e:
                 print(f"Auto Gen Summary Error: {e}")
 
@@ -2016,7 +1757,7 @@ async def checkout(user_id: str):
             "enrolled_at": course["enrolled_at"].isoformat() if isinstance(course["enrolled_at"], datetime) else str(course["enrolled_at"])
         })
     
-    await check_user_badges(user_id)
+    badge_service.schedule(user_id)
     
     return {
         "status": "checkout_successful",
@@ -2179,82 +1920,12 @@ def extract_json_object(raw_text: str) -> Dict[str, Any]:
     return json.loads(text[start:end + 1])
 
 
-def grok_model_candidates() -> List[str]:
-    candidates = [
-        GROK_MODEL,
-        os.getenv("GROK_FALLBACK_MODEL"),
-        "grok-2-latest",
-        "grok-beta",
-    ]
-    deduped: List[str] = []
-    for candidate in candidates:
-        if candidate and candidate not in deduped:
-            deduped.append(candidate)
-    return deduped
+async def grok_chat(messages: List[Dict[str, str]], temperature: float = 0.4, max_tokens: int = 900, api_key: Optional[str] = None) -> str:
+    return await llm_gateway.chat(messages, temperature=temperature, max_tokens=max_tokens, api_key=api_key)
 
 
-def grok_chat(messages: List[Dict[str, str]], temperature: float = 0.4, max_tokens: int = 900, api_key: Optional[str] = None) -> str:
-    errors: List[str] = []
-
-    # Use user provided Groq key if available
-    if api_key:
-        try:
-            temp_client = Groq(api_key=api_key)
-            response = temp_client.chat.completions.create(
-                model=GROQ_INTERVIEW_MODEL,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            errors.append(f"Groq User Key Error: {e}")
-
-    if XAI_API_KEY:
-        headers = {
-            "Authorization": f"Bearer {XAI_API_KEY}",
-            "Content-Type": "application/json",
-        }
-
-        for model in grok_model_candidates():
-            try:
-                response = requests.post(
-                    f"{XAI_API_BASE}/chat/completions",
-                    headers=headers,
-                    json={
-                        "model": model,
-                        "messages": messages,
-                        "temperature": temperature,
-                        "max_tokens": max_tokens,
-                    },
-                    timeout=45,
-                )
-                if response.status_code >= 400:
-                    errors.append(f"{model}: {response.status_code} {response.text[:180]}")
-                    continue
-
-                payload = response.json()
-                return payload["choices"][0]["message"]["content"].strip()
-            except Exception as exc:
-                errors.append(f"{model}: {exc}")
-
-    if GROQ_API_KEY and GROQ_API_KEY != "YOUR-GROQ-API-KEY":
-        try:
-            response = client.chat.completions.create(
-                model=GROQ_INTERVIEW_MODEL,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-            )
-            return response.choices[0].message.content.strip()
-        except Exception as exc:
-            errors.append(f"groq:{GROQ_INTERVIEW_MODEL}: {exc}")
-
-    raise RuntimeError(" | ".join(errors[:3]) or "Missing xAI/Grok and Groq credentials for interview generation")
-
-
-def grok_json(messages: List[Dict[str, str]], temperature: float = 0.3, max_tokens: int = 900, api_key: Optional[str] = None) -> Dict[str, Any]:
-    return extract_json_object(grok_chat(messages, temperature=temperature, max_tokens=max_tokens, api_key=api_key))
+async def grok_json(messages: List[Dict[str, str]], temperature: float = 0.3, max_tokens: int = 900, api_key: Optional[str] = None) -> Dict[str, Any]:
+    return extract_json_object(await grok_chat(messages, temperature=temperature, max_tokens=max_tokens, api_key=api_key))
 
 
 def build_round_topics(role: str, round_type: str) -> str:
@@ -2340,11 +2011,20 @@ async def generate_interviewer_persona(company: str, round_type: str, experience
       "follow_up_style": "probing|direct|supportive|aggressive"
     }}
     """
+    messages = [
+        {"role": "system", "content": "You create realistic interviewer personas for mock interview simulations. Return valid JSON only."},
+        {"role": "user", "content": prompt},
+    ]
     try:
-        return grok_json([
-            {"role": "system", "content": "You create realistic interviewer personas for mock interview simulations. Return valid JSON only."},
-            {"role": "user", "content": prompt},
-        ], temperature=0.6, max_tokens=400)
+        # Personas only depend on company/round/role/experience, so repeat setups reuse the cached one
+        raw = await llm_cache.cached(
+            "grok_chat",
+            messages,
+            lambda: grok_chat(messages, temperature=0.6, max_tokens=400),
+            params={"temperature": 0.6, "max_tokens": 400},
+            validate=extract_json_object
+        )
+        return extract_json_object(raw)
     except Exception as e:
         print(f"Error generating Grok persona: {e}")
         return fallback_persona(company, round_type)
@@ -2387,7 +2067,7 @@ def sanitize_answer_analysis(payload: Dict[str, Any], question: str, answer: str
     }
 
 
-def analyze_candidate_answer(session: Dict[str, Any], current_round: Dict[str, Any], question: str, answer: str) -> Dict[str, Any]:
+async def analyze_candidate_answer(session: Dict[str, Any], current_round: Dict[str, Any], question: str, answer: str) -> Dict[str, Any]:
     round_type = current_round.get("round_type", "technical")
     prompt = f"""
     Evaluate this interview answer for a mock interview.
@@ -2411,7 +2091,7 @@ def analyze_candidate_answer(session: Dict[str, Any], current_round: Dict[str, A
     }}
     """
     try:
-        raw = grok_json([
+        raw = await grok_json([
             {"role": "system", "content": "You are an expert interviewer coach. Return valid JSON only and keep it concise."},
             {"role": "user", "content": prompt},
         ], temperature=0.2, max_tokens=450)
@@ -2421,11 +2101,13 @@ def analyze_candidate_answer(session: Dict[str, Any], current_round: Dict[str, A
         return fallback_answer_analysis(question, answer, round_type)
 
 
-def generate_next_interview_message(
+async def generate_next_interview_message(
     session: Dict[str, Any],
     current_round: Dict[str, Any],
     round_index: int,
     round_history: List[Dict[str, Any]],
+    question_count: int,
+    recent_analysis: Optional[Dict[str, Any]],
     is_round_start: bool,
     is_skip: bool = False,
     api_key: Optional[str] = None,
@@ -2477,7 +2159,7 @@ def generate_next_interview_message(
     }}
     """
 
-    raw = grok_json([
+    raw = await grok_json([
         {"role": "system", "content": "You simulate interviewers in live mock interviews. Return valid JSON only."},
         {"role": "user", "content": prompt},
     ], temperature=0.5, max_tokens=350, api_key=api_key)
@@ -2496,9 +2178,11 @@ async def setup_interview(req: InterviewSetupRequest, x_groq_api_key: Optional[s
     experience_level = get_experience_level(req)
 
     # 1. Generate Personas for 3 rounds
-    tech_persona = await generate_interviewer_persona(req.company, "technical", experience_level, req.role)
-    behavioral_persona = await generate_interviewer_persona(req.company, "behavioural", experience_level, req.role)
-    hr_persona = await generate_interviewer_persona(req.company, "hr_voice", experience_level, req.role)
+    tech_persona, behavioral_persona, hr_persona = await asyncio.gather(
+        generate_interviewer_persona(req.company, "technical", experience_level, req.role),
+        generate_interviewer_persona(req.company, "behavioural", experience_level, req.role),
+        generate_interviewer_persona(req.company, "hr_voice", experience_level, req.role),
+    )
     
     # 2. Create Rounds with topics
     rounds = [
@@ -2512,7 +2196,7 @@ async def setup_interview(req: InterviewSetupRequest, x_groq_api_key: Optional[s
     
     # Generate First Question dynamically with Grok
     try:
-        first_q_data = generate_next_interview_message(
+        first_q_data = await generate_next_interview_message(
             {
                 "company": req.company,
                 "role": req.role,
@@ -2584,7 +2268,7 @@ async def interview_chat(req: InterviewInteractionRequest, x_groq_api_key: Optio
             (m.get("content", "") for m in reversed(round_messages) if m.get("role") == "interviewer"),
             "",
         )
-        recent_analysis = analyze_candidate_answer(session, current_round, last_question, req.user_response)
+        recent_analysis = await analyze_candidate_answer(session, current_round, last_question, req.user_response)
         answer_analyses.append({
             "round_index": req.round_index,
             "round_type": round_type,
@@ -2631,7 +2315,7 @@ async def interview_chat(req: InterviewInteractionRequest, x_groq_api_key: Optio
     is_skip = any(s in str(req.user_response).lower() for s in skips) if req.user_response else False
 
     try:
-        data = generate_next_interview_message(
+        data = await generate_next_interview_message(
             session,
             current_round,
             req.round_index,
@@ -2738,13 +2422,12 @@ async def voice_analysis(req: InterviewInteractionRequest, x_groq_api_key: Optio
     messages[-1]["content"] += prompt_instruction
 
     try:
-        current_client = Groq(api_key=x_groq_api_key) if x_groq_api_key else client
-        response = current_client.chat.completions.create(
+        raw_response = await llm_gateway.complete(
+            messages,
             model=GROQ_INTERVIEW_MODEL,
-            messages=messages,
+            api_key=x_groq_api_key,
             response_format={"type": "json_object"}
         )
-        raw_response = response.choices[0].message.content
         data = json.loads(raw_response)
         
         interviewer_text = data.get("interviewer_response") or data.get("interviewer_text", "Thank you for sharing that.")
@@ -2851,7 +2534,7 @@ async def get_interview_report(session_id: str):
     }
 
     try:
-        grok_report = grok_json([
+        grok_report = await grok_json([
             {"role": "system", "content": "You are an expert interview evaluator. Return valid JSON only."},
             {"role": "user", "content": report_prompt},
         ], temperature=0.2, max_tokens=700)
@@ -2888,41 +2571,26 @@ async def get_interview_report(session_id: str):
 
 @app.get("/api/admin/stats", dependencies=[Depends(admin_required)])
 async def get_admin_stats():
-    """Aggregate real-time stats for the admin dashboard using MongoDB"""
+    """Admin dashboard stats, served from the materialized admin_metrics rollups (one read)."""
+    from services.admin_metrics_service import admin_metrics_service, ADMIN_HIRING_GOAL
     try:
-        student_count = await users_col.count_documents({"role": "student"})
-        hired_count = await users_col.count_documents({"status": "Placed"})
-        # 2. Active Courses (from MongoDB)
-        course_count = await courses_col.count_documents({})
-        
-        # 3. Completed Assessments
-        assessment_count = await interviews_col.count_documents({"status": "completed"})
-        
-        # 4. Interview Success & Placement Rate
-        success_rate = 0
-        interviews = await interviews_col.find({"status": "completed"}).to_list(100)
-        if interviews:
-            scores = [i.get("report", {}).get("communication_confidence", 0) for i in interviews if "report" in i]
-            if scores:
-                success_rate = sum(scores) / len(scores)
-        else:
+        m = await admin_metrics_service.get()
+        student_count = m.get("students", 0)
+        course_count = m.get("courses", 0)
+        hired = m.get("placed", 0)
+        monthly = m.get("monthly") or []
+
+        def growth(key: str) -> str:
+            if len(monthly) < 2 or not monthly[-2].get(key):
+                return "+0.0%"
+            change = (monthly[-1].get(key, 0) - monthly[-2][key]) / monthly[-2][key] * 100
+            return f"{change:+.1f}%"
+
+        success_rate = m.get("interview_score_avg")
+        if success_rate is None:
             success_rate = 72 # Believable baseline for demo if empty
 
-        # 10. Track Distribution (Real from Progress / Enrollments)
-        track_dist = {}
-        try:
-            cursor = progress_col.aggregate([
-                {"$group": {"_id": "$course_id", "count": {"$sum": 1}}}
-            ])
-            tracks = await cursor.to_list(10)
-            for t in tracks:
-                # Resolve course name if possible
-                cid = t["_id"]
-                c_doc = await courses_col.find_one({"_id": cid})
-                name = c_doc.get("title", cid) if c_doc else cid
-                track_dist[name] = t["count"]
-        except: pass
-        
+        track_dist = {t["name"]: t["count"] for t in m.get("tracks") or []}
         # Fallback for display if empty
         if not track_dist:
             track_dist = {"Frontend Engineering": 42, "Data Science": 28, "DevOps": 15, "UI/UX": 15}
@@ -2930,26 +2598,27 @@ async def get_admin_stats():
         return {
             "totalStudents": student_count,
             "activeCourses": course_count,
-            "completedAssessments": assessment_count,
+            "completedAssessments": m.get("interviews_completed", 0),
             "interviewSuccess": f"{int(success_rate)}%",
             "hiringConversions": hired,
-            "courseCompletion": f"{completion_avg}%",
-            "revenue": f"${revenue_val:,}",
-            "studentGrowth": "+14.2%", 
+            "courseCompletion": f"{m.get('completion_pct', 0)}%",
+            "revenue": f"${int(m.get('revenue', 0)):,}",
+            "studentGrowth": growth("students"),
             "courseGrowth": f"+{max(0, course_count-1)}",
-            "assessmentGrowth": "+12.1%",
+            "assessmentGrowth": growth("assessments"),
             "interviewGrowth": "+8.4%",
             "hiringGrowth": "+22.5%",
-            "goalAchievement": f"{achievement}%",
-            "monthlyData": monthly_data,
+            "goalAchievement": f"{int(hired / ADMIN_HIRING_GOAL * 100) if ADMIN_HIRING_GOAL else 0}%",
+            "monthlyData": monthly,
             "trackDistribution": track_dist,
             "funnel": [
                 {"label": "Total Candidates", "value": student_count},
-                {"label": "Ready for Hiring", "value": ready},
-                {"label": "Interviewed", "value": interviewed},
-                {"label": "Offer Received", "value": offers},
+                {"label": "Ready for Hiring", "value": m.get("ready", 0)},
+                {"label": "Interviewed", "value": m.get("interviewed", 0)},
+                {"label": "Offer Received", "value": m.get("offers", 0)},
                 {"label": "Hired", "value": hired}
-            ]
+            ],
+            "updatedAt": m.get("updated_at"),
         }
     except Exception as e:
         print(f"Stats Error: {e}")
@@ -3121,6 +2790,7 @@ async def create_admin_course(data: dict):
         # 1. Clean up existing modules if it's an update to prevent duplicates
         if is_update:
             await modules_col.delete_many({"course_id": course_id})
+        progress_service.invalidate_course(course_id)
 
         # 2. Insert new modules
         for idx, mod in enumerate(modules_data):
@@ -3183,6 +2853,7 @@ async def update_admin_course(course_id: str, data: dict):
 
     # Sync modules
     await modules_col.delete_many({"course_id": course_id})
+    progress_service.invalidate_course(course_id)
     for idx, mod in enumerate(modules_data):
         mod_id = mod.get("_id") or mod.get("id")
         if not mod_id or str(mod_id).isdigit():
@@ -3227,6 +2898,7 @@ async def delete_admin_course(course_id: str):
         if result.deleted_count > 0:
             # Clean up associated modules
             await modules_col.delete_many({"course_id": course_id})
+            progress_service.invalidate_course(course_id)
             
             # Clean up associated quizzes (including module quizzes and final assessments)
             await quizzes_col.delete_many({"course_id": course_id})
@@ -3393,10 +3065,9 @@ async def review_submission(data: dict, x_admin_email: str = Header(...)):
             "issue_date": datetime.utcnow().isoformat()
         }
         await certificates_col.insert_one(cert)
-        await check_user_badges(user_id)
+        badge_service.schedule(user_id)
         return {"status": "approved", "certificate": fix_id(cert)}
     
-    await check_user_badges(user_id)
     return {"status": "rejected"}
 
 @app.get("/api/admin/insights", dependencies=[Depends(admin_required)])
@@ -3458,6 +3129,16 @@ async def get_admin_insights():
         print(f"Insights Error: {e}")
         return []
 
+@app.get("/api/admin/llm-cache/stats", dependencies=[Depends(admin_required)])
+async def get_llm_cache_stats():
+    """Hit/miss counters for the LLM response cache (in-process tier since worker start)."""
+    return llm_cache.stats()
+
+@app.get("/api/admin/email-outbox/stats", dependencies=[Depends(admin_required)])
+async def get_email_outbox_stats():
+    """Queue depth, delivery counters and latency percentiles for the email outbox."""
+    return await email_outbox.stats()
+
 # --- RESUME BUILDER ENDPOINTS ---
 
 @app.get("/api/resume/{user_id}")
@@ -3629,17 +3310,26 @@ async def get_sdl_projects(
         query["project_type"] = project_type
     if featured:
         query["featured"] = True
+    ranked = None
     if search:
-        query["$or"] = [
-            {"title": {"$regex": search, "$options": "i"}},
-            {"problem_statement": {"$regex": search, "$options": "i"}}
-        ]
-    
-    cursor = sdl_projects_col.find(query).sort("created_at", -1).limit(limit)
+        from bson import ObjectId
+        from services.search_service import search_service
+        ranked = await search_service.ranked_ids("sdl_project", search)
+        if not ranked:
+            return []
+        query["_id"] = {"$in": [ObjectId(i) if ObjectId.is_valid(i) else i for i in ranked]}
+    
+    cursor = sdl_projects_col.find(query)
+    if ranked is None:
+        cursor = cursor.sort("created_at", -1).limit(limit)
     projects = []
     async for doc in cursor:
         doc["_id"] = str(doc["_id"])
         projects.append(doc)
+    if ranked is not None:
+        # Keep search relevance order
+        order = {i: n for n, i in enumerate(ranked)}
+        projects = sorted(projects, key=lambda d: order.get(d["_id"], len(order)))[:limit]
     return projects
 
 
@@ -4558,8 +4248,10 @@ async def reset_password(data: dict = Body(...)):
     email = token_data["email"]
     
     # Update password in MongoDB
-    from auth_utils import get_password_hash
-    hashed_password = get_password_hash(new_password)
+    try:
+        hashed_password = await credential_service.hash(new_password)
+    except PasswordPoolBusy:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
     
     await users_col.update_one(
         {"email": email},
@@ -4575,7 +4267,7 @@ async def reset_password(data: dict = Body(...)):
 @app.post("/api/auth/signup")
 async def signup(user_data: UserSignup, request: Request):
     # Apply rate limiting for signup attempts
-    check_rate_limit(request, "register", "auth")
+    await check_rate_limit(request, "register", "auth")
     """
     JWT SIGNUP: Creates a new user with a hashed password and logs the action.
     """
@@ -4611,7 +4303,9 @@ async def signup(user_data: UserSignup, request: Request):
         raise HTTPException(status_code=400, detail="Password is too long (maximum 50 characters).")
     
     try:
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await credential_service.hash(user_data.password)
+    except PasswordPoolBusy:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
     except Exception as e:
         logger.error(f"Hashing failed: {e}")
         raise HTTPException(status_code=400, detail=f"Hashing error: {str(e)}")
@@ -4647,6 +4341,7 @@ async def signup(user_data: UserSignup, request: Request):
         user_doc = {
             "user_id": user_id,
             "email": email_clean,
+            "email_key": email_clean,
             "password": hashed_password,
             "full_name": user_data.full_name,
             "role": user_data.role,
@@ -4658,6 +4353,7 @@ async def signup(user_data: UserSignup, request: Request):
         user_doc = {
             "user_id": user_id,
             "email": email_clean,
+            "email_key": email_clean,
             "password": hashed_password,
             "full_name": user_data.full_name,
             "role": user_data.role,
@@ -4673,7 +4369,7 @@ async def signup(user_data: UserSignup, request: Request):
 @app.post("/api/auth/login")
 async def login(credentials: UserLogin, request: Request):
     # Apply rate limiting for login attempts
-    check_rate_limit(request, "login", "auth")
+    await check_rate_limit(request, "login", "auth")
     """
     JWT LOGIN: Verifies credentials, returns a JWT token, and records the login timestamp.
     """
@@ -4687,100 +4383,18 @@ async def login(credentials: UserLogin, request: Request):
     if not password_clean:
         raise HTTPException(status_code=400, detail="Password is required")
     
-    # Find user by exact email first, then case/whitespace tolerant fallback for legacy rows.
-    logger.info(f"Attempting to find user with email: {email_clean}")
-
-    async def _safe_find_candidates_by_email(email_value: str) -> list:
-        """
-        Supports both real Motor cursor behavior and mocked collections
-        where find(...) may return an awaitable/list-like object.
-        """
-        email_pattern = f"^\\s*{re.escape(email_value)}\\s*$"
-        find_result = users_col.find({"email": {"$regex": email_pattern, "$options": "i"}})
-        if inspect.isawaitable(find_result):
-            find_result = await find_result
-        if hasattr(find_result, "to_list"):
-            return await find_result.to_list(length=50)
-        if isinstance(find_result, list):
-            return find_result[:50]
-        return []
-
+    # Exact email and legacy case/whitespace variants share the indexed email_key;
+    # bcrypt runs in the hashing pool and old rows are re-hashed after login.
     try:
-        user = await users_col.find_one({"email": email_clean})
-        if not user:
-            candidates = await _safe_find_candidates_by_email(email_clean)
-
-            # Try matching against all candidate rows (supports duplicate legacy rows).
-            for c in candidates:
-                cpass = str(c.get("password") or "")
-                if not cpass:
-                    continue
-                cand_valid = verify_password(password_clean, cpass) or cpass == password_clean
-                if cand_valid:
-                    user = c
-                    # Normalize legacy email formatting on successful auth.
-                    cemail = str(c.get("email") or "")
-                    if cemail != email_clean:
-                        try:
-                            await users_col.update_one(
-                                {"_id": c["_id"]},
-                                {"$set": {"email": email_clean}},
-                            )
-                        except Exception:
-                            pass
-                    break
-
-        if not user:
-            logger.warning(f"Login attempt with non-existent email: {email_clean}")
-            raise HTTPException(status_code=401, detail="Invalid email or password")
-    except HTTPException:
-        raise
+        user = await credential_service.authenticate(email_clean, password_clean)
+    except PasswordPoolBusy:
+        logger.warning("Password hashing pool saturated; shedding login")
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
     except Exception as e:
         logger.error(f"Database error during user lookup: {e}")
         raise HTTPException(status_code=500, detail="Database error during login")
-    
-    # Check if user has password field
-    if "password" not in user or not user["password"]:
-        logger.error(f"User {email_clean} missing password field")
-        raise HTTPException(status_code=401, detail="Invalid email or password")
-    
-    # Verify password with enhanced error handling
-    password_valid = verify_password(password_clean, user["password"])
-    # Backward-compatible fallback for legacy plaintext records; auto-migrate on success.
-    if not password_valid and str(user.get("password") or "") == password_clean:
-        password_valid = True
-        try:
-            await users_col.update_one(
-                {"_id": user["_id"]},
-                {"$set": {"password": get_password_hash(password_clean)}},
-            )
-        except Exception:
-            pass
-    if not password_valid:
-        # Duplicate/legacy rows fallback: try any matching email variant record.
-        candidates = await _safe_find_candidates_by_email(email_clean)
-        for c in candidates:
-            if str(c.get("_id")) == str(user.get("_id")):
-                continue
-            cpass = str(c.get("password") or "")
-            if not cpass:
-                continue
-            cand_valid = verify_password(password_clean, cpass) or cpass == password_clean
-            if cand_valid:
-                user = c
-                password_valid = True
-                # Normalize canonical email
-                if str(c.get("email") or "") != email_clean:
-                    try:
-                        await users_col.update_one(
-                            {"_id": c["_id"]},
-                            {"$set": {"email": email_clean}},
-                        )
-                    except Exception:
-                        pass
-                break
-    if not password_valid:
-        logger.warning(f"Invalid password attempt for user: {email_clean}")
+    if not user:
+        logger.warning(f"Invalid login attempt for: {email_clean}")
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     # Record Login Timestamp (Required by Spec)
@@ -4807,6 +4421,7 @@ async def login(credentials: UserLogin, request: Request):
                     {"_id": user["_id"]},
                     {"$set": {"institution_id": resolved_institution_id}},
                 )
+                invalidate_principal(user["user_id"])
             except Exception:
                 pass
 
@@ -4848,30 +4463,15 @@ class UserRoleUpdate(BaseModel):
 @app.get("/api/institution/{inst_id}/stats")
 async def get_institution_stats(inst_id: str):
     """
-    DYNAMIC STATS: Aggregates real-time data from MongoDB for the dashboard.
+    DYNAMIC STATS: Served from the institution's incrementally maintained cached_stats counters.
     """
     try:
-        # 1. Total Events for this institution
-        total_events = await events_col.count_documents({"institution_id": inst_id})
-        
-        # 2. Total Participants registered in any event of this institution
-        total_participants = await participants_col.count_documents({"institution_id": inst_id})
-        
-        # 3. Total Active Teams
-        total_teams = await teams_col.count_documents({"status": "Approved"})
-        
-        # 4. Total Submissions
-        # We need event IDs first to filter submissions
-        from bson import ObjectId
-        event_cursor = events_col.find({"institution_id": inst_id}, {"_id": 1})
-        event_ids = [str(doc["_id"]) async for doc in event_cursor]
-        total_submissions = await submissions_col.count_documents({"event_id": {"$in": event_ids}})
-
+        stats = await institution_stats_service.get(inst_id)
         return {
-            "total_events": total_events,
-            "total_participants": total_participants,
-            "total_teams": total_teams,
-            "total_submissions": total_submissions
+            "total_events": stats.get("total_events", 0),
+            "total_participants": stats.get("total_participants", 0),
+            "total_teams": stats.get("total_teams", 0),
+            "total_submissions": stats.get("total_submissions", 0)
         }
     except Exception as e:
         print(f"Stats Error: {e}")
@@ -4891,6 +4491,7 @@ async def update_user_role(user_id: str, req: UserRoleUpdate):
         {"user_id": user_id},
         {"$set": {"role": req.role, "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
+    invalidate_principal(user_id)
     if result.modified_count == 0:
         user = await users_col.find_one({"user_id": user_id})
         if not user:
@@ -4906,52 +4507,27 @@ async def update_user_role(user_id: str, req: UserRoleUpdate):
 async def recalculate_institution_stats(inst_id: str):
     """
     SMART ANALYTICS AGGREGATOR: 
-    Recalculates metrics and updates the cached_stats in the Institution document.
+    Recounts metrics from the raw collections and overwrites cached_stats in the Institution document.
+    Day-to-day the counters are maintained incrementally; this repairs drift.
     """
-    try:
-        total_events = await events_col.count_documents({"institution_id": inst_id})
-        
-        # Get all event IDs for this institution
-        inst_events = await events_col.find({"institution_id": inst_id}, {"_id": 1}).to_list(None)
-        event_ids = [str(e["_id"]) for e in inst_events]
-        
-        total_participants = await participants_col.count_documents({"event_id": {"$in": event_ids}})
-        total_teams = await teams_col.count_documents({"event_id": {"$in": event_ids}})
-        total_submissions = await submissions_col.count_documents({"event_id": {"$in": event_ids}})
-        
-        new_stats = {
-            "total_events": total_events,
-            "total_participants": total_participants,
-            "total_teams": total_teams,
-            "total_submissions": total_submissions,
-            "last_updated": datetime.utcnow().isoformat()
-        }
-        
-        from bson import ObjectId
-        await institutions_col.update_one(
-            {"_id": ObjectId(inst_id)},
-            {"$set": {"cached_stats": new_stats, "updated_at": datetime.utcnow()}}
-        )
-        return new_stats
-    except Exception as e:
-        print(f"Stats Aggregator Error: {e}")
-        return None
+    return await institution_stats_service.reconcile(inst_id)
 
 @app.get("/api/search")
-@limiter.limit("50/minute")
 async def global_search(q: str, request: Request):
     """
     GLOBAL SEARCH API: Searches events across the entire institution.
+    Ranked by the search index (title/category/description), best match first.
     """
+    await check_rate_limit(request, "search", "api")
+    from bson import ObjectId
+    from services.search_service import search_service
     try:
-        query = {
-            "$or": [
-                {"title": {"$regex": q, "$options": "i"}},
-                {"category": {"$regex": q, "$options": "i"}},
-                {"description": {"$regex": q, "$options": "i"}}
-            ]
-        }
-        results = await events_col.find(query).to_list(20)
+        ids = await search_service.ranked_ids("event", q, limit=20)
+        if not ids:
+            return []
+        docs = await events_col.find({"_id": {"$in": [ObjectId(i) for i in ids if ObjectId.is_valid(i)]}}).to_list(20)
+        order = {i: n for n, i in enumerate(ids)}
+        results = sorted(docs, key=lambda d: order.get(str(d["_id"]), len(order)))
         # Convert ObjectId to string for JSON serialization
         for r in results:
             r["_id"] = str(r["_id"])
@@ -4959,6 +4535,14 @@ async def global_search(q: str, request: Request):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/search/suggest")
+async def search_suggest(q: str, request: Request, kind: Optional[str] = None, limit: int = 8):
+    """Prefix autocomplete over events, teams, SDL projects, courses and opportunities."""
+    await check_rate_limit(request, "suggest", "api")
+    from services.search_service import search_service
+    rows = await search_service.suggest(q, kinds=[kind] if kind else None, limit=min(max(limit, 1), 20))
+    return [{"id": r["ref_id"], "type": r["kind"], "title": r["title"], "link": r["link"]} for r in rows]
+
 @app.post("/api/events/{event_id}/finalize", dependencies=[Depends(require_role(["Admin"]))])
 async def finalize_event_results(event_id: str, current_user: dict = Depends(get_current_user)):
     """
@@ -4966,28 +4550,14 @@ async def finalize_event_results(event_id: str, current_user: dict = Depends(get
     """
     from bson import ObjectId
     try:
-        # 1. Get all submissions for this event
-        subs = await submissions_col.find({"event_id": event_id}).sort("average_score", -1).to_list(None)
-        
-        # 2. Generate/Update Leaderboard Entries
-        rank = 1
-        for s in subs:
-            entry = {
-                "event_id": event_id,
-                "team_id": s.get("team_id"),
-                "participant_id": s.get("participant_id"),
-                "total_score": s.get("average_score", 0),
-                "rank": rank,
-                "final_status": "Winner" if rank <= 3 else "Participant",
-                "created_at": datetime.utcnow()
-            }
-            # Upsert leaderboard entry
-            await leaderboard_col.update_one(
-                {"event_id": event_id, "team_id": s.get("team_id"), "participant_id": s.get("participant_id")},
-                {"$set": entry},
-                upsert=True
-            )
-            rank += 1
+        # 1-2. Rank all submissions from judge scores and publish the leaderboard
+        from services.leaderboard_service import leaderboard_service
+        subs = await leaderboard_service.calculate_event_leaderboard(event_id)
+        version = await leaderboard_service.current_version(event_id)
+        await leaderboard_col.update_many(
+            {"event_id": event_id, "version": version},
+            [{"$set": {"final_status": {"$cond": [{"$lte": ["$rank", 3]}, "Winner", "Participant"]}}}]
+        )
             
         # 3. Update Event Status
         await events_col.update_one({"_id": ObjectId(event_id)}, {"$set": {"status": "ENDED", "updated_at": datetime.utcnow()}})
@@ -5061,21 +4631,13 @@ async def parse_resume(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/events/{event_id}/matchmaking")
-async def teammate_matchmaking(event_id: str, skills: str):
+async def teammate_matchmaking(event_id: str, skills: Optional[str] = None, user_id: Optional[str] = None, limit: int = 10):
     """
-    MATCHMAKING API: Suggests participants for a team based on skills.
+    MATCHMAKING API: Suggests unteamed participants ranked by how well they fill the
+    requester's team gaps (requested skills, or every skill the team lacks) and complement it.
     """
     try:
-        skill_list = [s.strip() for s in skills.split(",")]
-        query = {
-            "event_id": event_id,
-            "skills": {"$in": skill_list},
-            "team_id": None # Only suggest those without a team
-        }
-        suggestions = await participants_col.find(query).to_list(10)
-        for s in suggestions:
-            s["_id"] = str(s["_id"])
-        return suggestions
+        return await matchmaking_service.suggest(event_id, skills=skills, user_id=user_id, limit=min(max(limit, 1), 50))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -5161,23 +4723,43 @@ async def get_judge_submissions_view(event_id: str, current_user: dict = Depends
 @app.post("/api/submissions/{sub_id}/check-plagiarism", dependencies=[Depends(require_role(["Admin", "Judge"]))])
 async def check_submission_plagiarism(sub_id: str):
     """
-    PLAGIARISM CHECK: Simulates a code similarity check and updates the score.
+    PLAGIARISM CHECK: Fingerprints the submission (text, zipped stage uploads, quiz code)
+    and compares it with similar submissions in the same event via the LSH index.
     """
     from bson import ObjectId
+    from services.plagiarism_service import plagiarism_service
+    if not ObjectId.is_valid(sub_id):
+        raise HTTPException(status_code=400, detail="Invalid submission id")
     try:
-        # Simulate AI check logic
-        import random
-        sim_score = round(random.uniform(0, 30), 2) # Random 0-30% similarity
-        report = "Analysis complete. No significant matches found in external databases." if sim_score < 20 else "High similarity detected in common code blocks."
-        
-        await submissions_col.update_one(
-            {"_id": ObjectId(sub_id)},
-            {"$set": {"plagiarism_score": sim_score, "plagiarism_report": report, "updated_at": datetime.utcnow()}}
-        )
-        return {"status": "success", "score": sim_score, "report": report}
+        result = await plagiarism_service.check_submission(sub_id)
+        return {"status": "success", **result}
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Submission not found")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/events/{event_id}/plagiarism/run", dependencies=[Depends(require_role(["Admin"]))])
+async def run_event_plagiarism(event_id: str, current_user: dict = Depends(get_current_user)):
+    """Checks every submission of an event in the background; poll the returned run_id."""
+    from services.plagiarism_service import plagiarism_service
+    run = await plagiarism_service.start_event_run(event_id, current_user.get("email") or current_user.get("user_id") or "")
+    return {"status": "accepted", "run_id": run["_id"], "total": run["total"]}
+
+@app.get("/api/events/{event_id}/plagiarism/run/{run_id}", dependencies=[Depends(require_role(["Admin"]))])
+async def get_event_plagiarism_run(event_id: str, run_id: str):
+    from services.plagiarism_service import plagiarism_service
+    run = await plagiarism_service.get_run(run_id)
+    if not run or run.get("event_id") != event_id:
+        raise HTTPException(status_code=404, detail="Plagiarism run not found")
+    return run
+
+@app.get("/api/events/{event_id}/plagiarism", dependencies=[Depends(require_role(["Admin", "Judge"]))])
+async def get_event_plagiarism_report(event_id: str, min_similarity: float = 0.3, limit: int = 100):
+    """Most similar submission pairs of an event, highest overlap first."""
+    from services.plagiarism_service import plagiarism_service
+    pairs = await plagiarism_service.event_report(event_id, min_similarity, min(max(limit, 1), 500))
+    return {"event_id": event_id, "pairs": pairs}
+
 @app.post("/api/institution")
 async def create_or_update_institution(inst: Institution):
     """
@@ -5235,6 +4817,7 @@ async def register_for_event(event_id: str, participant: Participant):
         p_doc["event_title"] = event.get("title")
         p_doc["registered_at"] = datetime.utcnow()
         result = await participants_col.insert_one(p_doc)
+        matchmaking_service.on_registered(p_doc)
         
         # 6. TRIGGER EMAIL
         inst_id = event.get("institution_id")
@@ -5252,7 +4835,7 @@ async def register_for_event(event_id: str, participant: Participant):
         user_record = await users_col.find_one({"user_id": participant.user_id})
         target_email = user_record["email"] if user_record and "email" in user_record else participant.user_id
 
-        asyncio.create_task(send_notification_email(target_email, subject, body))
+        await queue_notification_email(target_email, subject, body)
 
         # 7. DASHBOARD UPDATE (Implicit via real-time fetch)
         # Note: We removed admin email notifications for registrations as per 'Dashboard-First' policy.
@@ -5260,9 +4843,8 @@ async def register_for_event(event_id: str, participant: Participant):
         # Audit Log
         await log_admin_action(target_email, "EVENT_REGISTRATION", f"Registered for event: {event_id}")
 
-        # Update Institution Stats in Background
-        if inst_id:
-            asyncio.create_task(recalculate_institution_stats(inst_id))
+        # Bump the institution's cached counters (reconciled later in one recount)
+        await institution_stats_service.increment(inst_id, total_participants=1)
 
         return {"status": "success", "registration_id": str(result.inserted_id)}
     except Exception as e:
@@ -5313,50 +4895,38 @@ async def update_team_status(team_id: str, status: str = Body(embed=True), curre
 async def notify_event_participants(event_id: str, message: str, current_user: dict = Depends(get_current_user)):
     """
     BULK NOTIFICATION: Notifies all participants of an event via Email and In-App notification.
+    Runs as a background job; poll the returned job_id for progress.
     """
     from bson import ObjectId
+    from services.bulk_notification_service import bulk_notification_service
     try:
         # 1. Find the event
-        event = await events_col.find_one({"_id": ObjectId(event_id)})
+        event = await events_col.find_one({"_id": ObjectId(event_id)}, {"title": 1})
         if not event:
             raise HTTPException(status_code=404, detail="Event not found")
 
-        # 2. Find all participants
-        participants = await participants_col.find({"event_id": event_id}).to_list(None)
-        if not participants:
-            return {"status": "success", "message": "No participants to notify."}
-
-        count = 0
-        for p in participants:
-            user_id = p["user_id"]
-            
-            # Create In-App Notification
-            notif_doc = {
-                "user_id": user_id,
-                "event_id": event_id,
-                "message": message,
-                "type": "update",
-                "trigger_type": "manual",
-                "is_read": False,
-                "delivery_status": "sent",
-                "created_at": datetime.utcnow()
-            }
-            await notifications_col.insert_one(notif_doc)
-
-            # Trigger Email (Background)
-            user_record = await users_col.find_one({"user_id": user_id})
-            if user_record and "email" in user_record:
-                subject = f"Important Update: {event['title']}"
-                body = f"Hello,\n\nThere is an update regarding '{event['title']}':\n\n{message}\n\nBest regards,\nInstitution Team"
-                asyncio.create_task(send_notification_email(user_record["email"], subject, body))
-                count += 1
+        # 2. Fan out in chunks (notifications insert_many + email outbox)
+        job = await bulk_notification_service.start_event_blast(event, message, current_user["email"])
+        if not job["total"]:
+            return {"status": "success", "message": "No participants to notify.", "job_id": job["_id"]}
 
         # Audit Log
-        await log_admin_action(current_user["email"], "BULK_NOTIFICATION", f"Notified {count} participants for event: {event_id}")
+        await log_admin_action(current_user["email"], "BULK_NOTIFICATION", f"Queued notification for {job['total']} participants of event: {event_id} (job {job['_id']})")
 
-        return {"status": "success", "notified_count": count}
+        return {"status": "accepted", "job_id": job["_id"], "total": job["total"]}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/events/{event_id}/notify/{job_id}", dependencies=[Depends(require_role(["Admin"]))])
+async def get_notify_progress(event_id: str, job_id: str):
+    """Progress of a bulk notification job started by notify_event_participants."""
+    from services.bulk_notification_service import bulk_notification_service
+    job = await bulk_notification_service.get_job(job_id)
+    if not job or job.get("event_id") != event_id:
+        raise HTTPException(status_code=404, detail="Notification job not found")
+    return job
+
 # ─── END INSTITUTION DASHBOARD SYSTEM ─────────────────────────────────────────
 # ─── End AI Tools API ────────────────────────────────────────────────────────
@@ -134,9 +134,11 @@ class ManualEvaluationService:
         # Send notification to participant
         await self._notify_participant_of_evaluation(submission, evaluation_record)
         
-        # Update leaderboard
+        # Update live rankings in place
         from services.leaderboard_service import leaderboard_service
-        await leaderboard_service.calculate_event_leaderboard(submission.get("event_id"))
+        await leaderboard_service.record_score(submission, evaluation_record)
+        from services.judge_assignment_service import judge_assignment_service
+        await judge_assignment_service.mark_scored(submission_id, evaluation_record["judge_email"])
         
         return {
             "status": "evaluation_submitted",
@@ -90,8 +90,8 @@ class QuizVisibilityService:
             raise ValueError(f"Invalid visibility. Must be one of: {valid_visibilities}")
         
         # Validate user has institution access
-        from auth_institution import assert_institution_owns_event
-        await assert_institution_owns_event(event_id, user)
+        from auth_institution import assert_institution_can_manage_event
+        await assert_institution_can_manage_event(event_id, user)
         
         # Update quiz visibility
         result = await quizzes_col.update_one(
@@ -1,42 +1,36 @@
 """
 Rate limiting utilities for API endpoints.
+
+Limits are enforced with GCRA (the generic cell rate algorithm): each key
+stores a single "theoretical arrival time", so a limit of N per window costs
+one number per client instead of a list of timestamps. State lives in Redis
+when it is reachable (one Lua round trip per check, shared by every worker)
+and otherwise in a bounded in-process LRU.
 """
+import asyncio
+import logging
 import os
 import time
-from typing import Dict, Optional
+from collections import OrderedDict
+from typing import NamedTuple, Optional
 from fastapi import HTTPException, Request
-from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
 
 try:
-    import redis
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError
     REDIS_AVAILABLE = True
 except ImportError:
+    aioredis = None
+    RedisError = OSError
     REDIS_AVAILABLE = False
 
-# Initialize rate limiter with Redis backend (fallback to memory if Redis not available)
-USE_REDIS = False
-redis_client = None
-
-if REDIS_AVAILABLE:
-    try:
-        redis_client = redis.Redis(
-            host=os.getenv("REDIS_HOST", "localhost"),
-            port=int(os.getenv("REDIS_PORT", 6379)),
-            db=int(os.getenv("REDIS_DB", 0)),
-            decode_responses=True
-        )
-        redis_client.ping()  # Test connection
-        limiter = Limiter(key_func=get_remote_address, storage_uri=f"redis://{redis_client.host}:{redis_client.port}/{redis_client.db}")
-        USE_REDIS = True
-    except Exception:
-        # Fallback to memory-based rate limiting
-        limiter = Limiter(key_func=get_remote_address)
-        USE_REDIS = False
-else:
-    # Fallback to memory-based rate limiting
-    limiter = Limiter(key_func=get_remote_address)
+logger = logging.getLogger("rate_limiter")
+
+USE_REDIS = REDIS_AVAILABLE and os.getenv("RATE_LIMIT_BACKEND", "redis").lower() == "redis"
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+# After a Redis failure, stay on the in-process backend this long before retrying
+REDIS_RETRY_SECONDS = 30
 
 # Rate limit configurations
 RATE_LIMITS = {
@@ -48,163 +42,194 @@ RATE_LIMITS = {
     "api": {
         "general": "100/minute", # 100 requests per minute for general API
         "upload": "10/minute",    # 10 file uploads per minute
-        "search": "30/minute",   # 30 search requests per minute
+        "search": "50/minute",   # 50 search requests per minute
+        "suggest": "120/minute", # 120 autocomplete requests per minute
     }
 }
 
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float   # seconds until the bucket is completely full again
+    retry_after: float   # seconds until the next request would be allowed (0 when allowed)
+
+
+def _gcra(tat: Optional[float], now: float, limit: int, window: int):
+    """One GCRA step; returns (result, new_tat or None when denied)."""
+    interval = window / limit
+    tat = max(tat or now, now)
+    new_tat = tat + interval
+    allow_at = new_tat - limit * interval
+    if now < allow_at:
+        return RateLimitResult(False, limit, 0, tat - now, allow_at - now), None
+    remaining = int((now - allow_at) / interval)
+    return RateLimitResult(True, limit, remaining, new_tat - now, 0.0), new_tat
+
+
 class MemoryRateLimiter:
-    """In-memory rate limiter as fallback when Redis is not available."""
-    
+    """In-process GCRA state (one float per key) with LRU eviction at a fixed key cap."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._tat: "OrderedDict[str, float]" = OrderedDict()
+
+    async def hit(self, key: str, limit: int, window: int) -> RateLimitResult:
+        now = time.monotonic()
+        result, new_tat = _gcra(self._tat.get(key), now, limit, window)
+        if new_tat is not None:
+            self._tat[key] = new_tat
+        if key in self._tat:
+            self._tat.move_to_end(key)
+        while len(self._tat) > self.max_keys:
+            self._tat.popitem(last=False)
+        return result
+
+
+# KEYS[1] = bucket; ARGV = emission interval (ms), limit. Uses the Redis clock so
+# every worker agrees on "now". Returns {allowed, remaining, reset_after_ms, retry_after_ms}.
+_GCRA_LUA = """
+local interval = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local new_tat = tat + interval
+local allow_at = new_tat - limit * interval
+if now < allow_at then
+  return {0, 0, tat - now, allow_at - now}
+end
+redis.call('SET', KEYS[1], new_tat, 'PX', math.max(1, math.ceil(new_tat - now)))
+return {1, math.floor((now - allow_at) / interval), new_tat - now, 0}
+"""
+
+
+class RedisRateLimiter:
+    """Shared GCRA state in Redis; the check-and-update is a single Lua script call."""
+
     def __init__(self):
-        self.requests: Dict[str, Dict[str, list]] = {}
-    
-    def is_allowed(self, key: str, limit: int, window: int) -> tuple[bool, Dict[str, int]]:
-        """
-        Check if request is allowed based on rate limit.
-        
-        Args:
-            key: Unique identifier (usually IP address)
-            limit: Maximum requests allowed
-            window: Time window in seconds
-            
-        Returns:
-            tuple: (allowed, info_dict)
-        """
-        current_time = time.time()
-        
-        if key not in self.requests:
-            self.requests[key] = {}
-        
-        # Clean old requests outside the window
-        if "requests" not in self.requests[key]:
-            self.requests[key]["requests"] = []
-        
-        # Remove requests outside the time window
-        self.requests[key]["requests"] = [
-            req_time for req_time in self.requests[key]["requests"]
-            if current_time - req_time < window
-        ]
-        
-        # Check if under limit
-        if len(self.requests[key]["requests"]) < limit:
-            self.requests[key]["requests"].append(current_time)
-            return True, {
-                "limit": limit,
-                "remaining": limit - len(self.requests[key]["requests"]) - 1,
-                "reset": int(current_time + window)
-            }
-        else:
-            return False, {
-                "limit": limit,
-                "remaining": 0,
-                "reset": int(current_time + window)
-            }
+        self._client = None
+        self._script = None
+
+    def _get_script(self):
+        if self._script is None:
+            self._client = aioredis.Redis(
+                host=os.getenv("REDIS_HOST", "localhost"),
+                port=int(os.getenv("REDIS_PORT", 6379)),
+                db=int(os.getenv("REDIS_DB", 0)),
+                socket_timeout=1.0,
+                socket_connect_timeout=1.0,
+            )
+            self._script = self._client.register_script(_GCRA_LUA)
+        return self._script
+
+    async def hit(self, key: str, limit: int, window: int) -> RateLimitResult:
+        interval_ms = window * 1000 / limit
+        allowed, remaining, reset_ms, retry_ms = await self._get_script()(keys=[key], args=[interval_ms, limit])
+        return RateLimitResult(bool(allowed), limit, int(remaining), int(reset_ms) / 1000, int(retry_ms) / 1000)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = self._script = None
+
+
+class RateLimiter:
+    """Redis-backed when available, falling back to the shared in-process limiter on errors."""
+
+    def __init__(self):
+        self.memory = MemoryRateLimiter()
+        self.redis = RedisRateLimiter() if USE_REDIS else None
+        self._redis_down_until = 0.0
+
+    async def hit(self, key: str, limit: int, window: int) -> RateLimitResult:
+        if self.redis is not None and time.monotonic() >= self._redis_down_until:
+            try:
+                return await self.redis.hit(key, limit, window)
+            except (RedisError, OSError, asyncio.TimeoutError) as e:
+                logger.warning(f"Redis rate limiting unavailable, using in-process limits: {e}")
+                self._redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+        return await self.memory.hit(key, limit, window)
+
+    async def aclose(self):
+        if self.redis is not None:
+            await self.redis.aclose()
+
+
+rate_limiter = RateLimiter()
+
 
 def get_rate_limit_string(limit_str: str) -> tuple[int, int]:
     """
     Parse rate limit string like "5/minute" into (limit, window_seconds).
-    
+
     Args:
         limit_str: Rate limit string
-        
+
     Returns:
         tuple: (limit, window_seconds)
     """
     if "/" not in limit_str:
         return 100, 60  # Default
-    
+
     limit, period = limit_str.split("/", 1)
     limit = int(limit)
-    
+
     period_map = {
         "second": 1,
         "minute": 60,
         "hour": 3600,
         "day": 86400
     }
-    
+
     window = period_map.get(period.lower(), 60)
     return limit, window
 
-def check_rate_limit(
-    request: Request, 
+async def check_rate_limit(
+    request: Request,
     limit_type: str = "general",
     category: str = "api"
-) -> None:
+) -> RateLimitResult:
     """
     Check rate limit for a request.
-    
+
     Args:
         request: FastAPI Request object
         limit_type: Specific limit type (login, register, etc.)
         category: Rate limit category (auth, api)
-        
+
     Raises:
         HTTPException: If rate limit exceeded
     """
     # Get rate limit configuration
     limit_config = RATE_LIMITS.get(category, {}).get(limit_type, "100/minute")
     limit, window = get_rate_limit_string(limit_config)
-    
+
     # Get client IP
     client_ip = get_remote_address(request)
-    
-    if USE_REDIS:
-        # Use Redis-based rate limiting
-        key = f"rate_limit:{category}:{limit_type}:{client_ip}"
-        
-        try:
-            current_count = redis_client.get(key)
-            if current_count is None:
-                redis_client.setex(key, window, 1)
-            else:
-                current_count = int(current_count)
-                if current_count >= limit:
-                    raise HTTPException(
-                        status_code=429,
-                        detail=f"Rate limit exceeded. {limit} requests per {window//60} minute(s) allowed.",
-                        headers={
-                            "X-RateLimit-Limit": str(limit),
-                            "X-RateLimit-Remaining": "0",
-                            "X-RateLimit-Reset": str(int(time.time() + window))
-                        }
-                    )
-                redis_client.incr(key)
-                redis_client.expire(key, window)
-        except redis.RedisError:
-            # Fallback to memory limiter if Redis fails
-            memory_limiter = MemoryRateLimiter()
-            allowed, info = memory_limiter.is_allowed(client_ip, limit, window)
-            if not allowed:
-                raise HTTPException(
-                    status_code=429,
-                    detail=f"Rate limit exceeded. {limit} requests per {window//60} minute(s) allowed.",
-                    headers={
-                        "X-RateLimit-Limit": str(info["limit"]),
-                        "X-RateLimit-Remaining": str(info["remaining"]),
-                        "X-RateLimit-Reset": str(info["reset"])
-                    }
-                )
-    else:
-        # Use memory-based rate limiting
-        memory_limiter = MemoryRateLimiter()
-        allowed, info = memory_limiter.is_allowed(client_ip, limit, window)
-        if not allowed:
-            raise HTTPException(
-                status_code=429,
-                detail=f"Rate limit exceeded. {limit} requests per {window//60} minute(s) allowed.",
-                headers={
-                    "X-RateLimit-Limit": str(info["limit"]),
-                    "X-RateLimit-Remaining": str(info["remaining"]),
-                    "X-RateLimit-Reset": str(info["reset"])
-                }
-            )
+    key = f"rate_limit:{category}:{limit_type}:{client_ip}"
+
+    result = await rate_limiter.hit(key, limit, window)
+    if not result.allowed:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Rate limit exceeded. {limit_config.replace('/', ' requests per ')} allowed.",
+            headers={
+                "Retry-After": str(max(1, int(result.retry_after + 0.999))),
+                "X-RateLimit-Limit": str(limit),
+                "X-RateLimit-Remaining": "0",
+                "X-RateLimit-Reset": str(int(time.time() + result.reset_after))
+            }
+        )
+    return result
 
 # Decorator for rate limiting
 def rate_limit(limit_type: str = "general", category: str = "api"):
     """
     Decorator for applying rate limits to endpoints.
-    
+
     Args:
         limit_type: Specific limit type
         category: Rate limit category
@@ -217,10 +242,10 @@ def rate_limit(limit_type: str = "general", category: str = "api"):
                 if isinstance(value, Request):
                     request = value
                     break
-            
+
             if request:
-                check_rate_limit(request, limit_type, category)
-            
+                await check_rate_limit(request, limit_type, category)
+
             return await func(*args, **kwargs)
         return wrapper
     return decorator
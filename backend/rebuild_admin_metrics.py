@@ -0,0 +1,26 @@
+import asyncio
+import json
+import os
+import sys
+
+# Add the current directory to sys.path so we can import from db
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db import db
+from services.admin_metrics_service import admin_metrics_service
+
+async def rebuild_admin_metrics():
+    await db._ensure_connected()
+    if db.db is None:
+        print("[ERROR] Could not connect to MongoDB.")
+        return 1
+
+    print("Rebuilding admin dashboard rollups from raw collections...")
+    result = await admin_metrics_service.rebuild()
+    summary = {k: v for k, v in result.items() if k not in ("monthly", "tracks") and not k.startswith("refreshed.")}
+    print(json.dumps(summary, indent=2, default=str))
+    print("--- Admin metrics rebuilt ---")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(rebuild_admin_metrics()))
@@ -4,7 +4,7 @@ Handles CRUD operations for evaluation criteria
 """
 from fastapi import APIRouter, HTTPException, Body, Depends
 from typing import List, Dict, Any
-from auth_institution import get_auth_user, assert_institution_scope, assert_institution_owns_event
+from auth_institution import get_auth_user, assert_institution_scope, assert_institution_can_manage_event
 from evaluation_criteria_service import evaluation_criteria_service
 
 router = APIRouter(prefix="/api/evaluation-criteria", tags=["Evaluation Criteria"])
@@ -105,7 +105,7 @@ async def clone_criteria_from_template(
     """Clone criteria from a template to an event"""
     
     try:
-        await assert_institution_owns_event(event_id, user)
+        await assert_institution_can_manage_event(event_id, user)
         result = await evaluation_criteria_service.clone_criteria_from_template(
             event_id, template_name, user
         )
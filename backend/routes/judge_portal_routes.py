@@ -1,7 +1,7 @@
 """
 Judge Portal Routes - Comprehensive judging system
 """
-from fastapi import APIRouter, HTTPException, Body, Depends, Query
+from fastapi import APIRouter, HTTPException, Body, Depends, Query, Response
 from typing import Optional, List, Dict, Any
 from auth_institution import get_auth_user
 from judge_portal_service import judge_portal_service
@@ -105,16 +105,21 @@ async def get_my_invitations(user: dict = Depends(get_auth_user)):
 # Judge Assignment and Evaluation
 @router.get("/assignments")
 async def get_my_assignments(
+    response: Response,
     event_id: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=200),
     user: dict = Depends(get_auth_user)
 ):
-    """Get all submissions assigned to current judge"""
+    """Get submissions assigned to current judge (pass limit/cursor to page; next cursor in X-Next-Cursor)"""
     
     email = user.get("email", "").lower().strip()
     if not email:
         raise HTTPException(status_code=400, detail="Email required")
     
-    assignments = await judge_portal_service.get_judge_assignments(email, event_id)
+    assignments, next_cursor = await judge_portal_service.get_judge_assignments(email, event_id, cursor=cursor, limit=limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return assignments
 
 @router.get("/assignments/{submission_id}")
@@ -125,19 +130,12 @@ async def get_assignment_details(
     """Get detailed information for a specific assignment"""
     
     email = user.get("email", "").lower().strip()
-    assignments = await judge_portal_service.get_judge_assignments(email)
+    assignments, _ = await judge_portal_service.get_judge_assignments(email, submission_id=submission_id)
     
-    # Find specific assignment
-    assignment = None
-    for a in assignments:
-        if a["_id"] == submission_id:
-            assignment = a
-            break
-    
-    if not assignment:
+    if not assignments:
         raise HTTPException(status_code=404, detail="Assignment not found")
     
-    return assignment
+    return assignments[0]
 
 @router.post("/evaluate/{submission_id}")
 async def submit_evaluation(
@@ -182,43 +180,37 @@ async def get_judge_dashboard(user: dict = Depends(get_auth_user)):
         raise HTTPException(status_code=400, detail="Email required")
     
     from db import judges_col, events_col, submissions_col, scores_col
+    from services.judge_assignment_service import judge_assignment_service
     
-    # Get judge statistics
+    # Get judge statistics (pending/completed are maintained on assignment and score writes)
+    counters = await judge_assignment_service.get_stats(email)
     judge_stats = {
         "total_events": 0,
-        "pending_evaluations": 0,
-        "completed_evaluations": 0,
+        "pending_evaluations": counters["pending"],
+        "completed_evaluations": counters["completed"],
         "upcoming_deadlines": 0
     }
     
-    # Get accepted judge records
-    async for judge in judges_col.find({"email": email, "status": "ACCEPTED"}):
-        judge_stats["total_events"] += 1
-        
-        # Get event details
-        event = await events_col.find_one({"_id": ObjectId(judge["event_id"])})
-        if event:
-            # Check deadline
-            if event.get("submission_deadline"):
-                deadline = datetime.fromisoformat(event["submission_deadline"].replace('Z', '+00:00'))
-                if deadline > datetime.now(timezone.utc):
-                    judge_stats["upcoming_deadlines"] += 1
-    
-    # Get assignments
-    assignments = await judge_portal_service.get_judge_assignments(email)
-    
-    for assignment in assignments:
-        if assignment.get("existing_scores"):
-            judge_stats["completed_evaluations"] += 1
-        else:
-            judge_stats["pending_evaluations"] += 1
-    
-    # Get recent activity
+    # Get accepted judge records and their events in one round trip each
+    judge_records = await judges_col.find({"email": email, "status": "ACCEPTED"}, {"event_id": 1}).to_list(None)
+    judge_stats["total_events"] = len(judge_records)
+    event_oids = [ObjectId(j["event_id"]) for j in judge_records if ObjectId.is_valid(str(j.get("event_id")))]
+    judge_stats["upcoming_deadlines"] = await events_col.count_documents(
+        {"_id": {"$in": event_oids}, "submission_deadline_at": {"$gt": datetime.now(timezone.utc)}}
+    )
+    
+    # Get recent activity (batched hydration of submissions and events)
+    recent_scores = await scores_col.find({"judge_email": email}).sort("created_at", -1).limit(5).to_list(5)
+    sub_oids = [ObjectId(sc["submission_id"]) for sc in recent_scores if ObjectId.is_valid(str(sc.get("submission_id")))]
+    submissions = {str(sub["_id"]): sub async for sub in submissions_col.find({"_id": {"$in": sub_oids}}, {"title": 1, "event_id": 1})}
+    sub_event_oids = list({ObjectId(sub["event_id"]) for sub in submissions.values() if ObjectId.is_valid(str(sub.get("event_id")))})
+    events = {str(ev["_id"]): ev async for ev in events_col.find({"_id": {"$in": sub_event_oids}}, {"name": 1})}
+    
     recent_activity = []
-    async for score in scores_col.find({"judge_email": email}).sort("created_at", -1).limit(5):
-        submission = await submissions_col.find_one({"_id": ObjectId(score["submission_id"])})
+    for score in recent_scores:
+        submission = submissions.get(str(score["submission_id"]))
         if submission:
-            event = await events_col.find_one({"_id": ObjectId(submission["event_id"])})
+            event = events.get(str(submission.get("event_id")))
             recent_activity.append({
                 "submission_id": str(submission["_id"]),
                 "submission_title": submission.get("title", "Untitled"),
@@ -230,7 +222,7 @@ async def get_judge_dashboard(user: dict = Depends(get_auth_user)):
     return {
         "stats": judge_stats,
         "recent_activity": recent_activity,
-        "assignments_count": len(assignments)
+        "assignments_count": counters["pending"] + counters["completed"]
     }
 
 # Institution Management
@@ -282,80 +274,21 @@ async def assign_judges_to_submissions(
     """Assign judges to submissions (institution admin only)"""
     
     # Verify institution access
-    from auth_institution import assert_institution_scope, assert_institution_owns_event
+    from auth_institution import assert_institution_scope, assert_institution_can_manage_event
     assert_institution_scope(institution_id, user)
-    await assert_institution_owns_event(event_id, user)
-    
-    from db import judges_col, submissions_col
-    
-    # Get accepted judges for event
-    accepted_judges = []
-    async for judge in judges_col.find({"event_id": event_id, "status": "ACCEPTED"}):
-        accepted_judges.append(judge)
+    await assert_institution_can_manage_event(event_id, user)
     
-    if not accepted_judges:
-        raise HTTPException(status_code=400, detail="No accepted judges found for this event")
+    from services.judge_assignment_service import judge_assignment_service
     
-    # Get submitted submissions
-    submissions = []
-    async for submission in submissions_col.find({"event_id": event_id, "status": "Submitted"}):
-        submissions.append(submission)
-    
-    # Assignment strategy
-    assignment_type = assignment_config.get("type", "round_robin")  # round_robin, random, expert_based
-    judges_per_submission = assignment_config.get("judges_per_submission", 2)
-    
-    assigned_count = 0
-    for submission in submissions:
-        # Select judges for this submission
-        selected_judges = []
-        
-        if assignment_type == "round_robin":
-            # Simple round-robin assignment
-            judge_index = assigned_count % len(accepted_judges)
-            for i in range(judges_per_submission):
-                idx = (judge_index + i) % len(accepted_judges)
-                selected_judges.append(accepted_judges[idx])
-        
-        elif assignment_type == "random":
-            # Random assignment
-            import random
-            selected_judges = random.sample(accepted_judges, min(judges_per_submission, len(accepted_judges)))
-        
-        elif assignment_type == "expert_based":
-            # Expertise-based assignment (simplified)
-            submission_expertise = submission.get("required_expertise", [])
-            for judge in accepted_judges:
-                if len(selected_judges) >= judges_per_submission:
-                    break
-                # Simple expertise matching
-                if any(exp.lower() in judge.get("expertise", "").lower() for exp in submission_expertise):
-                    selected_judges.append(judge)
-            
-            # Fill remaining slots randomly if needed
-            if len(selected_judges) < judges_per_submission:
-                remaining_judges = [j for j in accepted_judges if j not in selected_judges]
-                import random
-                additional = random.sample(
-                    remaining_judges, 
-                    min(judges_per_submission - len(selected_judges), len(remaining_judges))
-                )
-                selected_judges.extend(additional)
-        
-        # Update submission with assigned judges
-        if selected_judges:
-            judge_emails = [judge["email"] for judge in selected_judges]
-            await submissions_col.update_one(
-                {"_id": submission["_id"]},
-                {
-                    "$set": {
-                        "assigned_judge_emails": judge_emails,
-                        "assigned_at": datetime.now(timezone.utc).isoformat(),
-                        "status": "Under Review"
-                    }
-                }
-            )
-            assigned_count += 1
+    # Load-balanced solver: per-judge caps, conflicts of interest, expertise matching.
+    # assignment_config: type (balanced | expert_based | random | round_robin),
+    # judges_per_submission, optional max_per_judge and expertise_weight.
+    try:
+        summary = await judge_assignment_service.assign_event(event_id, assignment_config)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    assigned_count = summary["assigned_submissions"]
+    assignment_type = summary["assignment_type"]
     
     # Create notification
     await notify_institution(
@@ -370,12 +303,7 @@ async def assign_judges_to_submissions(
         }
     )
     
-    return {
-        "status": "success",
-        "assigned_submissions": assigned_count,
-        "judges_used": len(accepted_judges),
-        "assignment_type": assignment_type
-    }
+    return {"status": "success", **summary}
 
 @router.get("/events/{event_id}/leaderboard")
 async def get_event_leaderboard(event_id: str):
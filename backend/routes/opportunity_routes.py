@@ -2,7 +2,6 @@ from fastapi import APIRouter, HTTPException, Body, Query, Depends, File, Upload
 from typing import List, Optional
 from bson import ObjectId
 from datetime import datetime
-import asyncio
 
 from auth_institution import get_auth_user
 from services.opportunity_service import (
@@ -15,7 +14,10 @@ from services.opportunity_service import (
 )
 from db import notifications_col
 from db import quizzes_col, events_col, participants_col, opportunities_col, opportunity_applications_col
-from services.email_service import send_notification_email
+from services.email_outbox import queue_notification_email
+import os
+
+STAGE_UPLOAD_MAX_BYTES = int(os.getenv("STAGE_UPLOAD_MAX_BYTES", 50 * 1024 * 1024))
 
 router = APIRouter(prefix="/api/opportunities", tags=["Opportunities"])
 
@@ -254,12 +256,10 @@ async def learner_submit_quiz(event_id: str, quiz_id: str, payload: dict = Body(
             )
             em = str(user.get("email") or "").strip()
             if em:
-                asyncio.create_task(
-                    send_notification_email(
-                        em,
-                        f"Shortlisted: {ev.get('title')}",
-                        f"<html><body><p>You passed the assessment (score {score}%). You are shortlisted.</p></body></html>",
-                    )
+                await queue_notification_email(
+                    em,
+                    f"Shortlisted: {ev.get('title')}",
+                    f"<html><body><p>You passed the assessment (score {score}%). You are shortlisted.</p></body></html>",
                 )
         except Exception:
             pass
@@ -306,28 +306,16 @@ async def learner_upload_stage_file(
         raise HTTPException(status_code=401, detail="Unauthorized")
     
     from db import submission_data_col
-    import os
-    import uuid
-    import shutil
+    from services.upload_service import key_from_url, release_upload, store_upload
     
     # 1. Verify participant
     p = await participants_col.find_one({"event_id": str(event_id), "user_id": uid})
     if not p:
         raise HTTPException(status_code=403, detail="Not registered for this event")
 
-    # 2. Save file
-    STAGE_UPLOADS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads", "stages")
-    os.makedirs(STAGE_UPLOADS, exist_ok=True)
-    
-    file_ext = os.path.splitext(file.filename)[1]
-    unique_filename = f"{stage_id}_{uid}_{uuid.uuid4().hex}{file_ext}"
-    file_path = os.path.join(STAGE_UPLOADS, unique_filename)
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # Generate accessible URL
-    file_url = f"/uploads/stages/{unique_filename}"
+    # 2. Stream file to the blob store (hashed + size-capped while streaming)
+    stored = await store_upload(file, STAGE_UPLOAD_MAX_BYTES)
+    file_url = stored["url"]
 
     # 3. Store in DB
     submission_entry = {
@@ -335,7 +323,7 @@ async def learner_upload_stage_file(
         "stage_id": str(stage_id),
         "user_id": uid,
         "team_id": p.get("team_id"),
-        "data": {"file_url": file_url, "filename": file.filename},
+        "data": {"file_url": file_url, "filename": file.filename, "size": stored["size"], "sha256": stored["sha256"]},
         "submitted_at": datetime.utcnow().isoformat(),
         "status": "Submitted"
     }
@@ -346,7 +334,11 @@ async def learner_upload_stage_file(
     else:
         query["user_id"] = uid
         
-    await submission_data_col.update_one(query, {"$set": submission_entry}, upsert=True)
+    previous = await submission_data_col.find_one_and_update(
+        query, {"$set": submission_entry}, projection={"data.file_url": 1}, upsert=True
+    )
+    # The replaced entry's file loses its reference (store_upload took a new one, even for the same blob)
+    await release_upload(key_from_url(((previous or {}).get("data") or {}).get("file_url")))
     
     # Update participant progress
     await participants_col.update_one(
@@ -7,6 +7,8 @@ from bson import ObjectId
 
 from auth_institution import get_auth_user
 from db import teams_col, participants_col, events_col
+from services.matchmaking_service import matchmaking_service
+from services.institution_stats_service import institution_stats_service
 
 
 router = APIRouter(prefix="/api/teams", tags=["Teams"])
@@ -91,6 +93,8 @@ async def create_team_secure(
         {"_id": p["_id"]},
         {"$set": {"team_id": team_id, "updated_at": datetime.utcnow()}},
     )
+    matchmaking_service.on_team_joined(event_id, uid, team_id)
+    await institution_stats_service.increment(ev.get("institution_id"), total_teams=1)
     return {"status": "success", "team_id": team_id}
 
 
@@ -188,5 +192,6 @@ async def join_by_invite(
         {"_id": p["_id"]},
         {"$set": {"team_id": str(team["_id"]), "updated_at": datetime.utcnow()}},
     )
+    matchmaking_service.on_team_joined(event_id, uid, str(team["_id"]))
     return {"status": "success", "team_id": str(team["_id"]), "event_id": event_id}
 
@@ -0,0 +1,41 @@
+import asyncio
+import json
+import os
+import sys
+
+# Add the current directory to sys.path so we can import from db
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db import db
+from services.job_scheduler import job_scheduler
+
+async def run_job(name: str = None, list_only: bool = False):
+    await db._ensure_connected()
+    if db.db is None:
+        print("[ERROR] Could not connect to MongoDB.")
+        return 1
+
+    job_scheduler.register_defaults()
+    if list_only or not name:
+        print(json.dumps(await job_scheduler.status(), indent=2, default=str))
+        return 0
+
+    if name not in job_scheduler.jobs:
+        print(f"[ERROR] Unknown job '{name}'. Available: {', '.join(sorted(job_scheduler.jobs))}")
+        return 1
+
+    print(f"Running job '{name}'...")
+    try:
+        result = await job_scheduler.run_now(name)
+    except RuntimeError as e:
+        print(f"[ERROR] {e}")
+        return 1
+    print(json.dumps(result, indent=2, default=str))
+    status = next(s for s in await job_scheduler.status() if s["name"] == name)
+    print(f"--- Job '{name}' finished: {status.get('last_status')} ---")
+    return 0 if status.get("last_status") == "ok" else 1
+
+if __name__ == "__main__":
+    # Usage: python run_job.py <job_name>   |   python run_job.py --list
+    names = [a for a in sys.argv[1:] if not a.startswith("--")]
+    sys.exit(asyncio.run(run_job(names[0] if names else None, list_only="--list" in sys.argv)))
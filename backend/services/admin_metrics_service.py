@@ -0,0 +1,385 @@
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from db import db as database, admin_metrics_col
+from services.search_service import CHANGE_STREAMS_UNSUPPORTED, CHANGE_STREAM_POSITION_LOST
+
+logger = logging.getLogger("admin_metrics_service")
+
+ADMIN_METRICS_DEBOUNCE = float(os.getenv("ADMIN_METRICS_DEBOUNCE", 3))
+ADMIN_METRICS_REFRESH_SECONDS = int(os.getenv("ADMIN_METRICS_REFRESH_SECONDS", 300))
+ADMIN_METRICS_MONTHS = 12
+ADMIN_HIRING_GOAL = int(os.getenv("ADMIN_HIRING_GOAL", 100))
+METRICS_DOC_ID = "global"
+
+# Source collection -> rollup groups that read it
+METRIC_SOURCES: Dict[str, List[str]] = {
+    "users": ["people", "monthly"],
+    "interviews": ["interviews", "monthly"],
+    "progress": ["progress"],
+    "courses": ["courses", "progress"],
+    "payments": ["revenue", "monthly"],
+}
+# Sources written too often to recount per change: their counters follow the
+# change events with $inc, and the groups are recounted in full every
+# ADMIN_METRICS_REFRESH_SECONDS (or when an event leaves the counters unknown)
+INCREMENTAL_SOURCES = {"progress"}
+COMPLETION_PCT_EXPR = {"$cond": [
+    {"$gt": ["$progress_total", 0]},
+    {"$toInt": {"$round": [{"$multiply": [{"$divide": ["$progress_completed", "$progress_total"]}, 100]}, 0]}},
+    0,
+]}
+
+
+def _month_expr(field: str) -> dict:
+    """YYYY-MM of a field stored either as a BSON date or an ISO string."""
+    return {"$cond": [
+        {"$eq": [{"$type": f"${field}"}, "date"]},
+        {"$dateToString": {"format": "%Y-%m", "date": f"${field}"}},
+        {"$substrCP": [{"$toString": {"$ifNull": [f"${field}", ""]}}, 0, 7]},
+    ]}
+
+
+def _recent_months(count: int = ADMIN_METRICS_MONTHS) -> List[str]:
+    now = datetime.utcnow()
+    year, month = now.year, now.month
+    months = []
+    for _ in range(count):
+        months.append(f"{year:04d}-{month:02d}")
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return list(reversed(months))
+
+
+async def _monthly_counts(collection: str, match: dict, months: List[str], value: Any = 1) -> Dict[str, float]:
+    rows = await database[collection].aggregate([
+        {"$match": match},
+        {"$group": {"_id": _month_expr("created_at"), "n": {"$sum": value}}},
+        {"$match": {"_id": {"$gte": months[0]}}},
+    ]).to_list(None)
+    return {r["_id"]: r["n"] for r in rows}
+
+
+class AdminMetricsService:
+    """
+    Materialized rollups for the admin dashboard.
+
+    Every metric group is computed server-side by one aggregation over its
+    source collection and written into a single `admin_metrics` document, so
+    /api/admin/stats is one find_one. A change stream over the source
+    collections marks groups dirty and recomputes them after a short debounce;
+    high-write sources (INCREMENTAL_SOURCES) instead `$inc` their counters from
+    the events and are recounted periodically. The follower runs on the job
+    scheduler's leader only; deployments without change streams refresh
+    everything periodically. `rebuild()` (see rebuild_admin_metrics.py)
+    backfills from the raw data.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._dirty: Set[str] = set()
+        self._deltas: Counter = Counter()
+        self._flush: Optional[asyncio.Task] = None
+
+    # --- Rollup groups ---
+
+    async def _people(self) -> dict:
+        row = (await database["users"].aggregate([
+            {"$group": {
+                "_id": None,
+                "students": {"$sum": {"$cond": [{"$eq": ["$role", "student"]}, 1, 0]}},
+                "placed": {"$sum": {"$cond": [{"$eq": ["$status", "Placed"]}, 1, 0]}},
+            }},
+        ]).to_list(1) or [{}])[0]
+        return {"students": row.get("students", 0), "placed": row.get("placed", 0)}
+
+    async def _interviews(self) -> dict:
+        row = (await database["interviews"].aggregate([
+            {"$facet": {
+                "completed": [
+                    {"$match": {"status": "completed"}},
+                    {"$group": {"_id": None, "count": {"$sum": 1}, "score": {"$avg": "$report.communication_confidence"}}},
+                ],
+                "offers": [
+                    {"$match": {"status": "completed"}},
+                    {"$group": {"_id": "$user_id"}},
+                    {"$count": "n"},
+                ],
+                "interviewed": [
+                    {"$match": {"status": {"$in": ["completed", "in_progress"]}}},
+                    {"$group": {"_id": "$user_id"}},
+                    {"$count": "n"},
+                ],
+            }},
+        ]).to_list(1) or [{}])[0]
+        completed = (row.get("completed") or [{}])[0]
+        return {
+            "interviews_completed": completed.get("count", 0),
+            "interview_score_avg": completed.get("score"),
+            "offers": (row.get("offers") or [{}])[0].get("n", 0),
+            "interviewed": (row.get("interviewed") or [{}])[0].get("n", 0),
+        }
+
+    async def _progress(self) -> dict:
+        row = (await database["progress"].aggregate([
+            {"$facet": {
+                "completion": [{"$group": {
+                    "_id": None,
+                    "total": {"$sum": 1},
+                    "completed": {"$sum": {"$cond": [{"$eq": ["$status", "completed"]}, 1, 0]}},
+                }}],
+                "ready": [
+                    {"$match": {"final_assessment_passed": True}},
+                    {"$group": {"_id": "$user_id"}},
+                    {"$count": "n"},
+                ],
+                "tracks": [
+                    {"$match": {"course_id": {"$ne": None}}},
+                    {"$group": {"_id": "$course_id", "count": {"$sum": 1}}},
+                    {"$sort": {"count": -1}},
+                    {"$limit": 10},
+                    {"$lookup": {"from": "courses", "localField": "_id", "foreignField": "_id", "as": "course"}},
+                    {"$project": {"count": 1, "title": {"$first": "$course.title"}}},
+                ],
+            }},
+        ]).to_list(1) or [{}])[0]
+        completion = (row.get("completion") or [{}])[0]
+        total = completion.get("total", 0)
+        return {
+            "progress_total": total,
+            "progress_completed": completion.get("completed", 0),
+            "completion_pct": int(round(completion.get("completed", 0) / total * 100)) if total else 0,
+            "ready": (row.get("ready") or [{}])[0].get("n", 0),
+            "tracks": [{"name": str(t.get("title") or t["_id"]), "count": t["count"]} for t in row.get("tracks") or []],
+        }
+
+    async def _courses(self) -> dict:
+        return {"courses": await database["courses"].count_documents({})}
+
+    async def _revenue(self) -> dict:
+        amount = {"$convert": {"input": "$amount", "to": "double", "onError": 0, "onNull": 0}}
+        row = (await database["payments"].aggregate([
+            {"$group": {"_id": None, "total": {"$sum": amount}}},
+        ]).to_list(1) or [{}])[0]
+        return {"revenue": row.get("total", 0)}
+
+    async def _monthly(self) -> dict:
+        months = _recent_months()
+        students = await _monthly_counts("users", {"role": "student"}, months)
+        assessments = await _monthly_counts("interviews", {"status": "completed"}, months)
+        revenue = await _monthly_counts(
+            "payments", {}, months, {"$convert": {"input": "$amount", "to": "double", "onError": 0, "onNull": 0}}
+        )
+        return {"monthly": [
+            {
+                "period": m,
+                "month": datetime.strptime(m, "%Y-%m").strftime("%b"),
+                "students": students.get(m, 0),
+                "assessments": assessments.get(m, 0),
+                "revenue": revenue.get(m, 0),
+            }
+            for m in months
+        ]}
+
+    _GROUPS = {
+        "people": _people,
+        "interviews": _interviews,
+        "progress": _progress,
+        "courses": _courses,
+        "revenue": _revenue,
+        "monthly": _monthly,
+    }
+
+    async def recompute(self, groups: Iterable[str]) -> dict:
+        update: Dict[str, Any] = {}
+        for group in groups:
+            started = time.perf_counter()
+            update.update(await self._GROUPS[group](self))
+            update[f"refreshed.{group}"] = datetime.utcnow()
+            logger.debug(f"Admin metrics group {group} recomputed in {time.perf_counter() - started:.3f}s")
+        if update:
+            update["updated_at"] = datetime.utcnow()
+            await admin_metrics_col.update_one({"_id": METRICS_DOC_ID}, {"$set": update}, upsert=True)
+        return update
+
+    async def rebuild(self) -> dict:
+        """Backfill every rollup from the raw collections."""
+        return await self.recompute(list(self._GROUPS))
+
+    # --- Change tracking ---
+
+    def mark_dirty(self, collection: str):
+        """Write hook: schedule the groups fed by `collection` for a debounced recompute."""
+        groups = METRIC_SOURCES.get(collection)
+        if not groups:
+            return
+        self._dirty.update(groups)
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush is None or self._flush.done():
+            self._flush = asyncio.create_task(self._flush_later())
+
+    def _count_progress(self, change: dict):
+        """Counter deltas of one `progress` change; anything the event cannot tell is left to a recount."""
+        op = change["operationType"]
+        if op == "insert":
+            self._deltas["progress_total"] += 1
+            if (change.get("fullDocument") or {}).get("status") == "completed":
+                self._deltas["progress_completed"] += 1
+        elif op == "update":
+            # completed_at is only ever set on a module's first completion
+            fields = (change.get("updateDescription") or {}).get("updatedFields") or {}
+            if fields.get("status") == "completed" and "completed_at" in fields:
+                self._deltas["progress_completed"] += 1
+            if "final_assessment_passed" in fields:
+                self._dirty.add("progress")
+        else:
+            # Deletes and replacements carry no prior status
+            self._dirty.add("progress")
+        self._schedule_flush()
+
+    async def _apply_deltas(self, deltas: Counter):
+        await admin_metrics_col.update_one(
+            {"_id": METRICS_DOC_ID},
+            [
+                {"$set": {k: {"$add": [{"$ifNull": [f"${k}", 0]}, v]} for k, v in deltas.items()}},
+                {"$set": {"completion_pct": COMPLETION_PCT_EXPR, "updated_at": "$$NOW"}},
+            ],
+        )
+
+    async def _flush_later(self):
+        # Groups marked while a recompute runs, or put back after a failure, go in the next round
+        delay = ADMIN_METRICS_DEBOUNCE
+        while self._dirty or self._deltas:
+            await asyncio.sleep(delay)
+            groups, self._dirty = self._dirty, set()
+            deltas, self._deltas = self._deltas, Counter()
+            if "progress" in groups:
+                # The recount supersedes the counted events
+                deltas.clear()
+            deltas = Counter({k: v for k, v in deltas.items() if v})
+            try:
+                if deltas:
+                    await self._apply_deltas(deltas)
+                if groups:
+                    await self.recompute(groups)
+                delay = ADMIN_METRICS_DEBOUNCE
+            except PyMongoError as e:
+                logger.warning(f"Admin metrics refresh failed: {e}")
+                self._dirty |= groups
+                self._deltas.update(deltas)
+                delay = min(delay * 2, ADMIN_METRICS_REFRESH_SECONDS)
+
+    async def _watch(self, start_at=None):
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": list(METRIC_SOURCES)},
+            "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+        }}]
+        async with database.db.watch(pipeline, start_at_operation_time=start_at, max_await_time_ms=1000) as stream:
+            logger.info("Admin metrics following change stream")
+            last_recount = time.monotonic()
+            while stream.alive:
+                change = await stream.try_next()
+                if change is not None:
+                    collection = change["ns"]["coll"]
+                    if collection in INCREMENTAL_SOURCES:
+                        self._count_progress(change)
+                    else:
+                        self.mark_dirty(collection)
+                if time.monotonic() - last_recount >= ADMIN_METRICS_REFRESH_SECONDS:
+                    # Repairs whatever the counted events could not tell (e.g. un-completions)
+                    for collection in INCREMENTAL_SOURCES:
+                        self.mark_dirty(collection)
+                    last_recount = time.monotonic()
+
+    async def _cluster_time(self):
+        try:
+            return (await database.db.command("hello")).get("operationTime")
+        except PyMongoError:
+            return None
+
+    async def _catch_up(self):
+        """Rebuild until it succeeds; returns the cluster time taken before it (None on standalone)."""
+        while True:
+            try:
+                start_at = (await database.db.command("hello")).get("operationTime")
+                await self.rebuild()
+                return start_at
+            except PyMongoError as e:
+                logger.error(f"Admin metrics rebuild failed: {e}; retrying in 30s")
+                await asyncio.sleep(30)
+
+    async def _poll(self):
+        logger.info(f"Refreshing admin metrics every {ADMIN_METRICS_REFRESH_SECONDS}s")
+        while True:
+            await asyncio.sleep(ADMIN_METRICS_REFRESH_SECONDS)
+            try:
+                await self.rebuild()
+            except PyMongoError as err:
+                logger.warning(f"Admin metrics rebuild failed: {err}")
+
+    async def _run(self):
+        # Nothing followed the sources before this worker took over
+        start_at = await self._catch_up()
+        while True:
+            try:
+                await self._watch(start_at)
+            except OperationFailure as e:
+                if e.code in CHANGE_STREAMS_UNSUPPORTED:
+                    logger.info(f"Change streams unavailable ({e.code})")
+                    await self._poll()
+                elif e.code in CHANGE_STREAM_POSITION_LOST or e.has_error_label("NonResumableChangeStreamError"):
+                    logger.warning(f"Admin metrics change stream position lost ({e.code}); rebuilding")
+                    start_at = await self._catch_up()
+                else:
+                    logger.warning(f"Admin metrics change stream failed: {e}; resuming")
+                    start_at = await self._resume_point()
+            except PyMongoError as e:
+                logger.warning(f"Admin metrics change stream interrupted: {e}; resuming")
+                start_at = await self._resume_point()
+
+    async def _resume_point(self):
+        """Reopen from the current cluster time after a pause, with every group marked dirty for the gap."""
+        await asyncio.sleep(5)
+        start_at = await self._cluster_time()
+        for collection in METRIC_SOURCES:
+            self.mark_dirty(collection)
+        return start_at
+
+    async def start(self):
+        if database.db is None or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        for task in (self._task, self._flush):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._task = self._flush = None
+        self._dirty.clear()
+        self._deltas.clear()
+
+    # --- Reads ---
+
+    async def get(self) -> dict:
+        doc = await admin_metrics_col.find_one({"_id": METRICS_DOC_ID})
+        if doc is None:
+            await self.rebuild()
+            doc = await admin_metrics_col.find_one({"_id": METRICS_DOC_ID}) or {}
+        return doc
+
+
+admin_metrics_service = AdminMetricsService()
@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, NamedTuple, Optional, Set
+
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from db import certificates_col, users_col
+
+logger = logging.getLogger("badge_service")
+
+BADGE_CACHE_SIZE = int(os.getenv("BADGE_CACHE_SIZE", 20000))
+EXPERT_DOMAIN_COURSES = 3
+
+
+class BadgeRule(NamedTuple):
+    badge_id: str
+    name: str
+    description: str
+    icon: str
+    level: str
+    earned: Callable[[dict], bool]
+
+
+# Evaluated in order against the snapshot built by BadgeService._snapshot
+BADGE_RULES: List[BadgeRule] = [
+    BadgeRule("beginner_explorer", "Beginner Explorer",
+              "Embark on your journey by starting your very first course.", "🚀", "Level 1",
+              lambda s: s["enrollments"] >= 1),
+    BadgeRule("knowledge_seeker", "Knowledge Seeker",
+              "Outstanding work! You've successfully completed your first learning module.", "⚡", "Level 2",
+              lambda s: s["completed_modules"] >= 1),
+    BadgeRule("course_master", "Course Master",
+              "Demonstrate mastery by completing an entire course and passing the final quiz.", "👑", "Level 3",
+              lambda s: s["certificates"] >= 1),
+]
+
+
+def _domain_badges(snapshot: dict) -> List[BadgeRule]:
+    """🧠 Subject Expert: one badge per domain with EXPERT_DOMAIN_COURSES certificates."""
+    return [
+        BadgeRule(f"expert_{domain.lower()}", f"{domain} Subject Expert",
+                  f"Become an authority by mastering 3 courses in the {domain} domain.", "🧠", "Level 4",
+                  lambda s: True)
+        for domain, count in snapshot["domains"].items()
+        if count >= EXPERT_DOMAIN_COURSES
+    ]
+
+
+def _badge_doc(rule: BadgeRule) -> dict:
+    return {
+        "badge_id": rule.badge_id,
+        "name": rule.name,
+        "description": rule.description,
+        "icon": rule.icon,
+        "level": rule.level,
+        "awarded_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+class BadgeService:
+    """
+    Rule-based badge evaluation.
+
+    A user's stats (enrollments, completed modules, certificates per course
+    domain) come from one aggregation, every rule is evaluated against that
+    snapshot, and anything newly earned is written with a single $addToSet.
+    The ids a user already holds are cached in an LRU so the common "nothing
+    new" case never touches the user document; the write is guarded on those
+    ids so a stale cache (another worker awarded first) cannot duplicate a
+    badge. `schedule()` runs the evaluation off the response path.
+    """
+
+    def __init__(self, cache_size: int = BADGE_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._earned: "OrderedDict[str, Set[str]]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._scheduled: Dict[str, asyncio.Task] = {}
+        self._rerun: Set[str] = set()
+
+    # --- Earned-set cache ---
+
+    async def _earned_ids(self, user_id: str, refresh: bool = False) -> Set[str]:
+        if not refresh and user_id in self._earned:
+            self._earned.move_to_end(user_id)
+            return self._earned[user_id]
+        doc = await users_col.find_one({"user_id": user_id}, {"badges.badge_id": 1})
+        earned = {b.get("badge_id") for b in (doc or {}).get("badges") or [] if isinstance(b, dict)}
+        self._remember(user_id, earned)
+        return earned
+
+    def _remember(self, user_id: str, earned: Set[str]):
+        self._earned[user_id] = earned
+        self._earned.move_to_end(user_id)
+        while len(self._earned) > self.cache_size:
+            self._earned.popitem(last=False)
+
+    def forget(self, user_id: str):
+        self._earned.pop(user_id, None)
+
+    # --- Evaluation ---
+
+    async def _snapshot(self, user_id: str) -> dict:
+        rows = await certificates_col.aggregate([
+            {"$match": {"user_id": user_id}},
+            {"$lookup": {"from": "courses", "localField": "course_id", "foreignField": "_id", "as": "course"}},
+            {"$project": {"_id": 0, "kind": {"$literal": "certificate"}, "domain": {"$first": "$course.role_tag"}}},
+            {"$unionWith": {"coll": "enrollments", "pipeline": [
+                {"$match": {"user_id": user_id}},
+                {"$project": {"_id": 0, "kind": {"$literal": "enrollment"}}},
+            ]}},
+            {"$unionWith": {"coll": "progress", "pipeline": [
+                {"$match": {"user_id": user_id, "status": "completed"}},
+                {"$project": {"_id": 0, "kind": {"$literal": "module"}}},
+            ]}},
+            {"$group": {"_id": {"kind": "$kind", "domain": "$domain"}, "n": {"$sum": 1}}},
+        ]).to_list(None)
+
+        snapshot = {"enrollments": 0, "completed_modules": 0, "certificates": 0, "domains": {}}
+        for row in rows:
+            kind, domain = row["_id"].get("kind"), row["_id"].get("domain")
+            if kind == "enrollment":
+                snapshot["enrollments"] += row["n"]
+            elif kind == "module":
+                snapshot["completed_modules"] += row["n"]
+            elif kind == "certificate":
+                snapshot["certificates"] += row["n"]
+                if domain:
+                    snapshot["domains"][domain] = snapshot["domains"].get(domain, 0) + row["n"]
+        return snapshot
+
+    async def _award(self, user_id: str, rules: List[BadgeRule]) -> List[dict]:
+        new_badges = [_badge_doc(r) for r in rules]
+        ids = [r.badge_id for r in rules]
+        result = await users_col.update_one(
+            {"user_id": user_id, "badges.badge_id": {"$nin": ids}},
+            {"$addToSet": {"badges": {"$each": new_badges}}},
+        )
+        if result.modified_count:
+            return new_badges
+
+        # Either the user has no profile yet or the cached earned set was stale
+        earned = await self._earned_ids(user_id, refresh=True)
+        if await users_col.count_documents({"user_id": user_id}, limit=1):
+            new_badges = [b for b in new_badges if b["badge_id"] not in earned]
+            if not new_badges:
+                return []
+            result = await users_col.update_one(
+                {"user_id": user_id, "badges.badge_id": {"$nin": [b["badge_id"] for b in new_badges]}},
+                {"$addToSet": {"badges": {"$each": new_badges}}},
+            )
+            return new_badges if result.modified_count else []
+        try:
+            await users_col.insert_one({
+                "user_id": user_id,
+                "badges": new_badges,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            })
+        except DuplicateKeyError:
+            # Created concurrently; pick it up on the next evaluation
+            self.forget(user_id)
+            return []
+        return new_badges
+
+    async def evaluate(self, user_id: str) -> List[dict]:
+        """Award every badge the user now qualifies for; returns the newly awarded ones."""
+        if not user_id:
+            return []
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        try:
+            async with lock:
+                earned, snapshot = await asyncio.gather(self._earned_ids(user_id), self._snapshot(user_id))
+                due = [r for r in BADGE_RULES + _domain_badges(snapshot)
+                       if r.badge_id not in earned and r.earned(snapshot)]
+                if not due:
+                    return []
+                awarded = await self._award(user_id, due)
+                self._remember(user_id, await self._earned_ids(user_id) | {b["badge_id"] for b in awarded})
+                return awarded
+        except PyMongoError as e:
+            logger.warning(f"Badge evaluation failed for {user_id}: {e}")
+            self.forget(user_id)
+            return []
+        finally:
+            if not lock.locked():
+                self._locks.pop(user_id, None)
+
+    # --- Background evaluation ---
+
+    def schedule(self, user_id: Optional[str]):
+        """Evaluate badges in the background; bursts for the same user coalesce into one rerun."""
+        if not user_id:
+            return
+        task = self._scheduled.get(user_id)
+        if task is not None and not task.done():
+            self._rerun.add(user_id)
+            return
+        self._scheduled[user_id] = asyncio.create_task(self._run_scheduled(user_id))
+
+    async def _run_scheduled(self, user_id: str):
+        try:
+            while True:
+                self._rerun.discard(user_id)
+                await self.evaluate(user_id)
+                if user_id not in self._rerun:
+                    break
+        finally:
+            self._scheduled.pop(user_id, None)
+
+    async def stop(self):
+        tasks = [t for t in self._scheduled.values() if not t.done()]
+        if tasks:
+            await asyncio.wait(tasks, timeout=5)
+
+
+badge_service = BadgeService()
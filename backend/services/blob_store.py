@@ -0,0 +1,289 @@
+"""
+Pluggable blob storage for uploaded files.
+
+BLOB_BACKEND=local (default) stores under backend/uploads; BLOB_BACKEND=s3 talks
+to any S3-compatible endpoint (AWS, MinIO via BLOB_S3_ENDPOINT) through aioboto3.
+Both backends accept an async iterator of chunks, so uploads are never held in
+memory, and both serve byte ranges for partial downloads.
+"""
+import asyncio
+import logging
+import os
+import posixpath
+import tempfile
+from abc import ABC, abstractmethod
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import AsyncIterator, Optional, Tuple
+
+logger = logging.getLogger("blob_store")
+
+try:
+    import aioboto3
+    AIOBOTO3_AVAILABLE = True
+except ImportError:
+    AIOBOTO3_AVAILABLE = False
+
+BLOB_BACKEND = os.getenv("BLOB_BACKEND", "local").lower()
+BLOB_LOCAL_ROOT = os.getenv("BLOB_LOCAL_ROOT", os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads"))
+BLOB_READ_CHUNK = 256 * 1024
+S3_PART_SIZE = max(int(os.getenv("BLOB_S3_PART_SIZE", 8 * 1024 * 1024)), 5 * 1024 * 1024)
+
+
+def normalize_key(key: str, under: Optional[str] = None) -> str:
+    """
+    Canonical form of a '/'-separated blob key. Raises ValueError for keys that
+    are absolute, contain backslashes or NUL, or resolve outside the store
+    (or outside the `under` prefix, e.g. "blobs" for publicly served files).
+    """
+    if not key or key.startswith("/") or "\\" in key or "\x00" in key:
+        raise ValueError("Invalid blob key")
+    norm = posixpath.normpath(key)
+    if norm in (".", "..") or norm.startswith("../"):
+        raise ValueError("Invalid blob key")
+    if under is not None and not norm.startswith(under.rstrip("/") + "/"):
+        raise ValueError("Invalid blob key")
+    return norm
+
+
+class BlobStore(ABC):
+    """Storage backend interface. Keys are '/'-separated relative paths."""
+
+    @abstractmethod
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes], content_type: str) -> int:
+        """Write all chunks under `key`; returns bytes written. Partial writes are cleaned up on error."""
+
+    @abstractmethod
+    async def promote(self, tmp_key: str, final_key: str) -> bool:
+        """Move a finished upload to its content-addressed key. Returns False if final_key already existed (dedupe)."""
+
+    @abstractmethod
+    async def stat(self, key: str) -> Optional[Tuple[int, str]]:
+        """(size, content_type) or None when missing."""
+
+    @abstractmethod
+    def read_range(self, key: str, start: int, end: int) -> AsyncIterator[bytes]:
+        """Yield bytes [start, end] inclusive."""
+
+    @abstractmethod
+    async def delete(self, key: str):
+        """Remove `key`; missing keys are ignored."""
+
+    @asynccontextmanager
+    async def local_path(self, key: str) -> AsyncIterator[str]:
+        """
+        A filesystem path holding the blob for the duration of the block, for code
+        that needs a real file (e.g. a worker process opening a zip). Remote
+        backends stream it into a temporary file that is removed afterwards.
+        """
+        stat = await self.stat(key)
+        if stat is None:
+            raise FileNotFoundError(key)
+        handle = await asyncio.to_thread(tempfile.NamedTemporaryFile, prefix="blob-", delete=False)
+        try:
+            if stat[0]:
+                async for chunk in self.read_range(key, 0, stat[0] - 1):
+                    await asyncio.to_thread(handle.write, chunk)
+            await asyncio.to_thread(handle.close)
+            yield handle.name
+        finally:
+            await asyncio.to_thread(handle.close)
+            try:
+                await asyncio.to_thread(os.remove, handle.name)
+            except OSError:
+                pass
+
+    async def aclose(self):
+        pass
+
+
+class LocalBlobStore(BlobStore):
+    """Filesystem backend; blocking file I/O runs in worker threads."""
+
+    def __init__(self, root: str = BLOB_LOCAL_ROOT):
+        self.root = os.path.realpath(root)
+
+    def _path(self, key: str) -> str:
+        # Resolve symlinks too: the final path must stay under the blob root
+        path = os.path.realpath(os.path.join(self.root, normalize_key(key)))
+        if path == self.root or os.path.commonpath([path, self.root]) != self.root:
+            raise ValueError("Invalid blob key")
+        return path
+
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes], content_type: str) -> int:
+        path = self._path(key)
+        await asyncio.to_thread(os.makedirs, os.path.dirname(path), exist_ok=True)
+        handle = await asyncio.to_thread(open, path, "wb")
+        written = 0
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(handle.write, chunk)
+                written += len(chunk)
+        except BaseException:
+            await asyncio.to_thread(handle.close)
+            await self.delete(key)
+            raise
+        await asyncio.to_thread(handle.close)
+        return written
+
+    async def promote(self, tmp_key: str, final_key: str) -> bool:
+        src, dst = self._path(tmp_key), self._path(final_key)
+        if await asyncio.to_thread(os.path.exists, dst):
+            await self.delete(tmp_key)
+            return False
+        await asyncio.to_thread(os.makedirs, os.path.dirname(dst), exist_ok=True)
+        await asyncio.to_thread(os.replace, src, dst)
+        return True
+
+    async def stat(self, key: str) -> Optional[Tuple[int, str]]:
+        try:
+            size = await asyncio.to_thread(os.path.getsize, self._path(key))
+        except (OSError, ValueError):
+            return None
+        return size, ""
+
+    async def read_range(self, key: str, start: int, end: int) -> AsyncIterator[bytes]:
+        handle = await asyncio.to_thread(open, self._path(key), "rb")
+        try:
+            await asyncio.to_thread(handle.seek, start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await asyncio.to_thread(handle.read, min(BLOB_READ_CHUNK, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            await asyncio.to_thread(handle.close)
+
+    async def delete(self, key: str):
+        try:
+            await asyncio.to_thread(os.remove, self._path(key))
+        except (OSError, ValueError):
+            pass
+
+    @asynccontextmanager
+    async def local_path(self, key: str) -> AsyncIterator[str]:
+        path = self._path(key)
+        if not await asyncio.to_thread(os.path.isfile, path):
+            raise FileNotFoundError(key)
+        yield path
+
+
+class S3BlobStore(BlobStore):
+    """S3-compatible backend using multipart uploads and ranged GETs."""
+
+    def __init__(self):
+        if not AIOBOTO3_AVAILABLE:
+            raise RuntimeError("BLOB_BACKEND=s3 requires the aioboto3 package")
+        self.bucket = os.getenv("BLOB_S3_BUCKET", "studlyf-uploads")
+        self._session = aioboto3.Session()
+        self._stack: Optional[AsyncExitStack] = None
+        self._client = None
+        self._lock = asyncio.Lock()
+
+    async def _s3(self):
+        if self._client is None:
+            async with self._lock:
+                if self._client is None:
+                    self._stack = AsyncExitStack()
+                    self._client = await self._stack.enter_async_context(self._session.client(
+                        "s3",
+                        endpoint_url=os.getenv("BLOB_S3_ENDPOINT") or None,
+                        region_name=os.getenv("BLOB_S3_REGION", "us-east-1"),
+                        aws_access_key_id=os.getenv("BLOB_S3_ACCESS_KEY"),
+                        aws_secret_access_key=os.getenv("BLOB_S3_SECRET_KEY"),
+                    ))
+        return self._client
+
+    async def aclose(self):
+        if self._stack is not None:
+            await self._stack.aclose()
+        self._stack = self._client = None
+
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes], content_type: str) -> int:
+        s3 = await self._s3()
+        key = normalize_key(key)
+        buffer = bytearray()
+        parts = []
+        upload_id = None
+        written = 0
+        try:
+            async for chunk in chunks:
+                buffer.extend(chunk)
+                written += len(chunk)
+                if len(buffer) >= S3_PART_SIZE:
+                    if upload_id is None:
+                        created = await s3.create_multipart_upload(Bucket=self.bucket, Key=key, ContentType=content_type)
+                        upload_id = created["UploadId"]
+                    part_no = len(parts) + 1
+                    part = await s3.upload_part(
+                        Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=part_no, Body=bytes(buffer)
+                    )
+                    parts.append({"ETag": part["ETag"], "PartNumber": part_no})
+                    buffer.clear()
+
+            if upload_id is None:
+                await s3.put_object(Bucket=self.bucket, Key=key, Body=bytes(buffer), ContentType=content_type)
+                return written
+
+            if buffer:
+                part_no = len(parts) + 1
+                part = await s3.upload_part(
+                    Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=part_no, Body=bytes(buffer)
+                )
+                parts.append({"ETag": part["ETag"], "PartNumber": part_no})
+            await s3.complete_multipart_upload(
+                Bucket=self.bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+            )
+            return written
+        except BaseException:
+            if upload_id is not None:
+                try:
+                    await s3.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+                except Exception as e:
+                    logger.warning(f"Failed to abort multipart upload {key}: {e}")
+            raise
+
+    async def promote(self, tmp_key: str, final_key: str) -> bool:
+        s3 = await self._s3()
+        tmp_key, final_key = normalize_key(tmp_key), normalize_key(final_key)
+        if await self.stat(final_key) is not None:
+            await self.delete(tmp_key)
+            return False
+        await s3.copy_object(Bucket=self.bucket, Key=final_key, CopySource={"Bucket": self.bucket, "Key": tmp_key})
+        await self.delete(tmp_key)
+        return True
+
+    async def stat(self, key: str) -> Optional[Tuple[int, str]]:
+        s3 = await self._s3()
+        try:
+            head = await s3.head_object(Bucket=self.bucket, Key=normalize_key(key))
+        except Exception:
+            return None
+        return head["ContentLength"], head.get("ContentType", "")
+
+    async def read_range(self, key: str, start: int, end: int) -> AsyncIterator[bytes]:
+        s3 = await self._s3()
+        obj = await s3.get_object(Bucket=self.bucket, Key=normalize_key(key), Range=f"bytes={start}-{end}")
+        async with obj["Body"] as body:
+            while True:
+                chunk = await body.read(BLOB_READ_CHUNK)
+                if not chunk:
+                    break
+                yield chunk
+
+    async def delete(self, key: str):
+        s3 = await self._s3()
+        try:
+            await s3.delete_object(Bucket=self.bucket, Key=normalize_key(key))
+        except Exception as e:
+            logger.warning(f"Failed to delete blob {key}: {e}")
+
+
+def _make_store() -> BlobStore:
+    if BLOB_BACKEND == "s3":
+        return S3BlobStore()
+    return LocalBlobStore()
+
+
+blob_store = _make_store()
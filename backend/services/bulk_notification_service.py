@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from bson import ObjectId
+
+from db import notification_jobs_col, notifications_col, participants_col, teams_col, users_col
+from services.email_outbox import email_outbox
+
+logger = logging.getLogger("bulk_notification_service")
+
+BULK_NOTIFY_CHUNK_SIZE = int(os.getenv("BULK_NOTIFY_CHUNK_SIZE", 500))
+
+
+def _chunks(items: List[Any], size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class BulkNotificationService:
+    """
+    Fan-out engine for event-wide notifications.
+    Participants are streamed in chunks; each chunk costs one `$in` lookup on
+    users, one insert_many into notifications and one insert_many into the
+    email outbox, whose bounded worker pool does the actual sending. Progress
+    is written to `notification_jobs` after every chunk so large blasts can be
+    tracked while they run.
+    """
+
+    def __init__(self, chunk_size: int = BULK_NOTIFY_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def start_event_blast(self, event: dict, message: str, requested_by: str) -> dict:
+        event_id = str(event["_id"])
+        total = await participants_col.count_documents({"event_id": event_id})
+        job_id = str(uuid.uuid4())
+        job = {
+            "_id": job_id,
+            "kind": "event_notify",
+            "event_id": event_id,
+            "requested_by": requested_by,
+            "status": "running",
+            "total": total,
+            "processed": 0,
+            "notifications_created": 0,
+            "emails_queued": 0,
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+        }
+        await notification_jobs_col.insert_one(job)
+
+        task = asyncio.create_task(self._run_event_blast(job_id, event, message))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _t: self._tasks.pop(job_id, None))
+        return job
+
+    async def _run_event_blast(self, job_id: str, event: dict, message: str):
+        event_id = str(event["_id"])
+        subject = f"Important Update: {event['title']}"
+        body = f"Hello,\n\nThere is an update regarding '{event['title']}':\n\n{message}\n\nBest regards,\nInstitution Team"
+
+        processed = created = queued = 0
+        try:
+            cursor = participants_col.find({"event_id": event_id}, {"user_id": 1}).batch_size(self.chunk_size)
+            batch: List[str] = []
+            async for p in cursor:
+                if p.get("user_id"):
+                    batch.append(p["user_id"])
+                processed += 1
+                if len(batch) >= self.chunk_size:
+                    c, q = await self._deliver_chunk(batch, event_id, message, subject, body)
+                    created, queued, batch = created + c, queued + q, []
+                    await self._progress(job_id, processed, created, queued)
+            if batch:
+                c, q = await self._deliver_chunk(batch, event_id, message, subject, body)
+                created, queued = created + c, queued + q
+
+            await self._progress(job_id, processed, created, queued, status="completed")
+        except Exception as e:
+            logger.error(f"Bulk notification {job_id} failed: {e}")
+            await self._progress(job_id, processed, created, queued, status="failed", error=str(e))
+
+    async def _deliver_chunk(self, user_ids: List[str], event_id: str, message: str, subject: str, body: str):
+        now = datetime.utcnow()
+        await notifications_col.insert_many([
+            {
+                "user_id": user_id,
+                "event_id": event_id,
+                "message": message,
+                "type": "update",
+                "trigger_type": "manual",
+                "is_read": False,
+                "delivery_status": "sent",
+                "created_at": now,
+            }
+            for user_id in user_ids
+        ], ordered=False)
+
+        emails = await users_col.find(
+            {"user_id": {"$in": user_ids}, "email": {"$nin": [None, ""]}},
+            {"email": 1}
+        ).to_list(None)
+        queued = await email_outbox.enqueue_many([
+            {"to": u["email"], "subject": subject, "html": body, "meta": {"event_id": event_id}}
+            for u in emails
+        ])
+        return len(user_ids), queued
+
+    async def _progress(self, job_id: str, processed: int, created: int, queued: int,
+                        status: Optional[str] = None, error: Optional[str] = None):
+        update: Dict[str, Any] = {
+            "processed": processed,
+            "notifications_created": created,
+            "emails_queued": queued,
+            "updated_at": datetime.utcnow(),
+        }
+        if status:
+            update["status"] = status
+        if error:
+            update["error"] = error
+        await notification_jobs_col.update_one({"_id": job_id}, {"$set": update})
+
+    async def get_job(self, job_id: str) -> Optional[dict]:
+        return await notification_jobs_col.find_one({"_id": job_id})
+
+    async def send_team_selection(self, event: dict, team_ids: List[str], next_stage: str,
+                                  render: Callable[[dict], Dict[str, str]]) -> int:
+        """
+        Queue selection emails for every member of the given teams and move
+        their participants to `next_stage`. `render(team)` returns subject/html.
+        Returns the number of teams found.
+        """
+        event_id = str(event["_id"])
+        object_ids = [ObjectId(tid) for tid in team_ids if ObjectId.is_valid(tid)]
+        found: List[str] = []
+
+        for chunk in _chunks(object_ids, self.chunk_size):
+            messages = []
+            async for team in teams_col.find({"_id": {"$in": chunk}}, {"name": 1, "members": 1}):
+                found.append(str(team["_id"]))
+                rendered = render(team)
+                messages.extend(
+                    {"to": member_email, **rendered, "meta": {"event_id": event_id, "team_id": str(team["_id"])}}
+                    for member_email in team.get("members", [])
+                )
+            await email_outbox.enqueue_many(messages)
+
+        if found:
+            await participants_col.update_many(
+                {"event_id": event_id, "team_id": {"$in": found}},
+                {"$set": {"current_stage": next_stage}}
+            )
+        return len(found)
+
+
+bulk_notification_service = BulkNotificationService()
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from auth_utils import BCRYPT_ROUNDS, get_password_hash, verify_password
+from db import users_col
+
+logger = logging.getLogger("credential_service")
+
+# bcrypt releases the GIL, so a thread pool gives real parallelism without pickling overhead
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+# Hash jobs allowed to run or wait at once; beyond this requests are shed with a 503
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", PASSWORD_HASH_WORKERS * 8))
+LOGIN_CANDIDATE_LIMIT = 10
+
+_BCRYPT_COST_RE = re.compile(r"^\$2[abxy]?\$(\d{2})\$")
+
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def email_key(email: str) -> str:
+    """Canonical lookup form of an email: trimmed and lower-cased."""
+    return str(email or "").strip().lower()
+
+
+def needs_rehash(hashed: str) -> bool:
+    """True for plaintext legacy rows and bcrypt hashes at a cost other than BCRYPT_ROUNDS."""
+    match = _BCRYPT_COST_RE.match(str(hashed or "").strip())
+    return match is None or int(match.group(1)) != BCRYPT_ROUNDS
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when the hashing queue is full; callers should answer 503."""
+
+
+class CredentialService:
+    """
+    Password hashing off the event loop, plus login candidate lookup.
+
+    bcrypt runs in a bounded thread pool. Jobs past PASSWORD_HASH_MAX_PENDING
+    are rejected straight away (PasswordPoolBusy) instead of queueing, so a
+    login storm degrades into fast 503s rather than a stalled worker. Rows are
+    found through the indexed `email_key` field, which replaces the
+    case-insensitive regex scan for legacy emails. A successful login
+    re-hashes plaintext or wrong-cost rows in the background.
+    """
+
+    def __init__(self, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.max_pending = max_pending
+        self._pending = 0
+        self._upgrades = set()
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.max_pending:
+            raise PasswordPoolBusy()
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(_get_pool(), fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        hashed = str(hashed or "")
+        if not _BCRYPT_COST_RE.match(hashed.strip()):
+            # Legacy plaintext row: nothing to hash
+            return bool(hashed) and hashed == password
+        return await self._run(verify_password, password, hashed)
+
+    # --- Login ---
+
+    async def find_candidates(self, email: str) -> List[dict]:
+        """Rows for an email, exact match first; legacy rows match on email_key."""
+        key = email_key(email)
+        rows = await users_col.find(
+            {"$or": [{"email": key}, {"email_key": key}]}
+        ).limit(LOGIN_CANDIDATE_LIMIT).to_list(LOGIN_CANDIDATE_LIMIT)
+        rows.sort(key=lambda u: u.get("email") != key)
+        return rows
+
+    async def authenticate(self, email: str, password: str) -> Optional[dict]:
+        """Return the user row the password unlocks, or None. May raise PasswordPoolBusy."""
+        key = email_key(email)
+        for user in await self.find_candidates(key):
+            if not user.get("password") or not await self.verify(password, user["password"]):
+                continue
+            # Normalize legacy email formatting / hashes on successful auth
+            normalize = user.get("email") != key or user.get("email_key") != key
+            if normalize or needs_rehash(user["password"]):
+                self._schedule_upgrade(user["_id"], password, user["password"], key if normalize else None)
+            return user
+        return None
+
+    def _schedule_upgrade(self, row_id, password: str, old_hash: str, key: Optional[str]):
+        if row_id in self._upgrades:
+            return
+        self._upgrades.add(row_id)
+        task = asyncio.create_task(self._upgrade(row_id, password, old_hash, key))
+        task.add_done_callback(lambda _: self._upgrades.discard(row_id))
+
+    async def _upgrade(self, row_id, password: str, old_hash: str, key: Optional[str]):
+        try:
+            if needs_rehash(old_hash):
+                # Guard on the old hash so a concurrent password reset is never overwritten
+                await users_col.update_one(
+                    {"_id": row_id, "password": old_hash},
+                    {"$set": {"password": await self.hash(password)}},
+                )
+            if key:
+                try:
+                    await users_col.update_one({"_id": row_id}, {"$set": {"email": key, "email_key": key}})
+                except DuplicateKeyError:
+                    # A canonical row already owns the email; keep this one findable by key
+                    await users_col.update_one({"_id": row_id}, {"$set": {"email_key": key}})
+        except PasswordPoolBusy:
+            pass  # Retried on the next login
+        except Exception as e:
+            logger.warning(f"Credential upgrade failed for {row_id}: {e}")
+
+    async def backfill_email_keys(self) -> int:
+        """Startup hook: give every user row an email_key (idempotent, server-side)."""
+        result = await users_col.update_many(
+            {"email_key": {"$exists": False}, "email": {"$type": "string"}},
+            [{"$set": {"email_key": {"$toLower": {"$trim": {"input": "$email"}}}}}],
+        )
+        if result.modified_count:
+            logger.info(f"Backfilled email_key on {result.modified_count} users")
+        return result.modified_count
+
+
+credential_service = CredentialService()
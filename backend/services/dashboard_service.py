@@ -1,10 +1,10 @@
-from db import db, events_col, participants_col, opportunities_col, opportunity_applications_col
+from db import db, events_col, opportunities_col, opportunity_applications_col
+from services.institution_stats_service import institution_stats_service
 from datetime import datetime
 
 async def get_institution_stats(institution_id: str):
     try:
-        institution_events = await events_col.find({"institution_id": institution_id}).to_list(length=1000)
-        event_ids = [str(e["_id"]) for e in institution_events]
+        institution_events = await events_col.find({"institution_id": institution_id}, {"status": 1}).to_list(length=1000)
 
         _FINAL = frozenset({"ENDED", "COMPLETED", "CANCELLED", "REJECTED"})
         active_opps = sum(
@@ -40,9 +40,8 @@ async def get_institution_stats(institution_id: str):
             {"opportunity_id": {"$in": hack_opp_ids}}
         ) if hack_opp_ids else 0
 
-        event_booth_regs = await participants_col.count_documents(
-            {"event_id": {"$in": event_ids}}
-        ) if event_ids else 0
+        # Classic event participants: incrementally maintained institution counter
+        event_booth_regs = (await institution_stats_service.get(institution_id)).get("total_participants", 0)
 
         # Trophy card: portal applies for mirrored opps + classic event participants
         opp_registrations = portal_hack_regs + event_booth_regs
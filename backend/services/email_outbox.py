@@ -0,0 +1,251 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+from db import email_outbox_col
+from services.email_service import email_transport
+
+logger = logging.getLogger("email_outbox")
+
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", 4))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", 6))
+EMAIL_LEASE_SECONDS = int(os.getenv("EMAIL_LEASE_SECONDS", 120))
+EMAIL_POLL_SECONDS = float(os.getenv("EMAIL_POLL_SECONDS", 5))
+EMAIL_BACKOFF_BASE_SECONDS = float(os.getenv("EMAIL_BACKOFF_BASE_SECONDS", 30))
+EMAIL_BACKOFF_MAX_SECONDS = float(os.getenv("EMAIL_BACKOFF_MAX_SECONDS", 3600))
+
+STATUS_PENDING = "pending"
+STATUS_SENDING = "sending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _backoff(attempts: int) -> float:
+    """Exponential backoff with full jitter, capped at EMAIL_BACKOFF_MAX_SECONDS."""
+    ceiling = min(EMAIL_BACKOFF_MAX_SECONDS, EMAIL_BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+class EmailOutbox:
+    """
+    Durable email queue backed by the `email_outbox` collection.
+    Callers enqueue a document and return immediately; a small pool of workers
+    claims jobs with a lease (find_one_and_update), delivers them through the
+    shared EmailTransport and retries with backoff. Jobs whose lease expires
+    (worker crash, redeploy) are picked up again by the next claim. Results
+    are written only while the claim is still ours (same worker and lease),
+    so a worker whose lease lapsed cannot overwrite the new owner's state.
+    """
+
+    def __init__(self, workers: int = EMAIL_WORKERS):
+        self.workers = workers
+        self._tasks: List[asyncio.Task] = []
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self.counters: Counter = Counter()
+        self._latencies: deque = deque(maxlen=500)
+        self.instance = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+    def _make_job(self, to_email: str, subject: str, body_html: str, meta: Optional[Dict[str, Any]] = None) -> dict:
+        now = _now()
+        return {
+            "_id": str(uuid.uuid4()),
+            "to": to_email,
+            "subject": subject,
+            "html": body_html,
+            "meta": meta or {},
+            "status": STATUS_PENDING,
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        }
+
+    async def enqueue(self, to_email: str, subject: str, body_html: str, meta: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        if not to_email:
+            return None
+        job = self._make_job(to_email, subject, body_html, meta)
+        await email_outbox_col.insert_one(job)
+        self.counters["enqueued"] += 1
+        self._wake.set()
+        return job["_id"]
+
+    async def enqueue_many(self, messages: List[Dict[str, Any]]) -> int:
+        """Bulk enqueue dicts with to/subject/html (and optional meta) in one insert_many."""
+        jobs = [
+            self._make_job(m["to"], m["subject"], m["html"], m.get("meta"))
+            for m in messages if m.get("to")
+        ]
+        if not jobs:
+            return 0
+        await email_outbox_col.insert_many(jobs, ordered=False)
+        self.counters["enqueued"] += len(jobs)
+        self._wake.set()
+        return len(jobs)
+
+    async def _claim(self, worker_id: str) -> Optional[dict]:
+        now = _now()
+        return await email_outbox_col.find_one_and_update(
+            {"$or": [
+                {"status": STATUS_PENDING, "next_attempt_at": {"$lte": now}},
+                {"status": STATUS_SENDING, "locked_until": {"$lt": now}},
+            ]},
+            {
+                "$set": {
+                    "status": STATUS_SENDING,
+                    "locked_until": now + timedelta(seconds=EMAIL_LEASE_SECONDS),
+                    "worker": worker_id,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    @staticmethod
+    def _owned(job: dict) -> dict:
+        """Filter matching the job only while this claim (worker + lease) still holds it."""
+        return {"_id": job["_id"], "worker": job.get("worker"), "locked_until": job.get("locked_until")}
+
+    async def _process(self, job: dict):
+        started = time.monotonic()
+        try:
+            provider = await email_transport.deliver(job["to"], job["subject"], job["html"])
+        except Exception as e:
+            await self._record_failure(job, str(e))
+            return
+
+        now = _now()
+        result = await email_outbox_col.update_one(
+            self._owned(job),
+            {
+                "$set": {"status": STATUS_SENT, "sent_at": now, "provider": provider},
+                "$unset": {"locked_until": "", "worker": "", "last_error": ""},
+            },
+        )
+        if not result.matched_count:
+            self.counters["lease_lost"] += 1
+            logger.warning(f"[OUTBOX] Lease on {job['_id']} lapsed before delivery was recorded")
+        self.counters["sent"] += 1
+        self.counters[f"sent_{provider}"] += 1
+        created_at = job["created_at"]
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        self._latencies.append(((now - created_at).total_seconds(), time.monotonic() - started))
+
+    async def _record_failure(self, job: dict, error: str):
+        attempts = job.get("attempts", 1)
+        if attempts >= EMAIL_MAX_ATTEMPTS:
+            update = {"status": STATUS_FAILED, "failed_at": _now(), "last_error": error[:500]}
+            self.counters["failed"] += 1
+            logger.error(f"[OUTBOX] Giving up on {job['to']} after {attempts} attempts: {error}")
+        else:
+            delay = _backoff(attempts)
+            update = {
+                "status": STATUS_PENDING,
+                "next_attempt_at": _now() + timedelta(seconds=delay),
+                "last_error": error[:500],
+            }
+            self.counters["retried"] += 1
+            logger.warning(f"[OUTBOX] Attempt {attempts} for {job['to']} failed, retrying in {int(delay)}s: {error}")
+        result = await email_outbox_col.update_one(
+            self._owned(job),
+            {"$set": update, "$unset": {"locked_until": "", "worker": ""}},
+        )
+        if not result.matched_count:
+            self.counters["lease_lost"] += 1
+            logger.warning(f"[OUTBOX] Lease on {job['_id']} lapsed; leaving it to its new owner")
+
+    async def _worker(self, worker_id: str):
+        while not self._stopping:
+            try:
+                job = await self._claim(worker_id)
+            except Exception as e:
+                logger.warning(f"[OUTBOX] Claim failed: {e}")
+                job = None
+
+            if job is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=EMAIL_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._process(job)
+            except Exception as e:
+                # Leave the lease in place; the job is reclaimed once it expires.
+                logger.error(f"[OUTBOX] Worker {worker_id} error on {job.get('_id')}: {e}")
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._stopping = False
+        self._tasks = [
+            asyncio.create_task(self._worker(f"{self.instance}-{i}"))
+            for i in range(self.workers)
+        ]
+        logger.info(f"[OUTBOX] Started {self.workers} email workers")
+
+    async def stop(self, grace: float = 10.0):
+        self._stopping = True
+        self._wake.set()
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=grace)
+            for task in pending:
+                task.cancel()
+        self._tasks = []
+        await email_transport.aclose()
+
+    async def stats(self) -> Dict[str, Any]:
+        depth = {status: 0 for status in (STATUS_PENDING, STATUS_SENDING, STATUS_FAILED)}
+        async for row in email_outbox_col.aggregate([
+            {"$match": {"status": {"$in": list(depth)}}},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+        ]):
+            depth[row["_id"]] = row["count"]
+
+        def percentile(values: List[float], pct: float) -> float:
+            if not values:
+                return 0.0
+            ordered = sorted(values)
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct))], 3)
+
+        queued = [q for q, _ in self._latencies]
+        delivery = [d for _, d in self._latencies]
+        return {
+            "workers": len(self._tasks),
+            "queue_depth": depth,
+            "counters": dict(self.counters),
+            "latency_seconds": {
+                "enqueue_to_sent_p50": percentile(queued, 0.5),
+                "enqueue_to_sent_p95": percentile(queued, 0.95),
+                "delivery_p50": percentile(delivery, 0.5),
+                "delivery_p95": percentile(delivery, 0.95),
+            },
+        }
+
+
+email_outbox = EmailOutbox()
+
+
+async def queue_notification_email(to_email: str, subject: str, body_html: str, meta: Optional[Dict[str, Any]] = None):
+    """Drop-in replacement for fire-and-forget send_notification_email tasks."""
+    try:
+        return await email_outbox.enqueue(to_email, subject, body_html, meta)
+    except Exception as e:
+        logger.error(f"[OUTBOX] Failed to enqueue email for {to_email}: {e}")
+        return None
@@ -1,6 +1,7 @@
 import smtplib
 import os
 import time
+from typing import Optional
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
@@ -20,110 +21,242 @@ SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
 EMAIL_FROM_NAME = os.getenv("EMAIL_FROM_NAME", "Studlyf Notifications")
 
 import asyncio
+import httpx
 
-async def send_notification_email(to_email: str, subject: str, body_html: str):
+try:
+    import aiosmtplib
+    AIOSMTPLIB_AVAILABLE = True
+except ImportError:
+    AIOSMTPLIB_AVAILABLE = False
+
+
+class _TokenBucket:
+    """Per-provider send rate limit (tokens per second, small burst)."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = max(rate, 0.01)
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class _SMTPPool:
+    """Keeps authenticated aiosmtplib connections open between sends."""
+
+    def __init__(self, size: int):
+        self._idle: "asyncio.Queue" = asyncio.Queue()
+        self._slots = asyncio.Semaphore(size)
+
+    async def _connect(self, server: str, port: int, user: str, password: str):
+        conn = aiosmtplib.SMTP(
+            hostname=server,
+            port=port,
+            use_tls=port == 465,
+            start_tls=port != 465 and os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes"),
+            timeout=15,
+        )
+        await conn.connect()
+        if user and password:
+            try:
+                await conn.login(user, password)
+            except Exception:
+                self._discard(conn)
+                raise
+        return conn
+
+    @staticmethod
+    def _discard(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    async def send(self, msg, server: str, port: int, user: str, password: str):
+        async with self._slots:
+            conn = None if self._idle.empty() else self._idle.get_nowait()
+            try:
+                for attempt in range(2):
+                    if conn is None or not conn.is_connected:
+                        conn = await self._connect(server, port, user, password)
+                    try:
+                        await conn.send_message(msg)
+                    except (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError):
+                        # Stale pooled connection: reconnect once
+                        self._discard(conn)
+                        conn = None
+                        if attempt:
+                            raise
+                        continue
+                    self._idle.put_nowait(conn)
+                    conn = None
+                    return
+            finally:
+                # Still held here means the send failed midway; the session state is unknown
+                if conn is not None:
+                    self._discard(conn)
+
+    async def close(self):
+        while not self._idle.empty():
+            conn = self._idle.get_nowait()
+            try:
+                await conn.quit()
+            except Exception:
+                conn.close()
+
+
+class EmailTransport:
     """
-    Sends an email notification. 
-    Priority: 1. Resend API (HTTP - most reliable), 2. SMTP SSL (Port 465)
+    Provider chain used by both direct sends and the outbox workers.
+    Priority: 1. Brevo API, 2. Resend API, 3. SMTP. HTTP calls share one pooled
+    httpx.AsyncClient; SMTP reuses pooled aiosmtplib connections when available.
     """
-    resend_key = os.getenv("RESEND_API_KEY")
-    brevo_key = os.getenv("BREVO_API_KEY")
-    smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-    smtp_port = int(os.getenv("SMTP_PORT", 465))
-    smtp_user = os.getenv("SMTP_USER")
-    smtp_pass = os.getenv("SMTP_PASSWORD")
-    email_from = os.getenv("EMAIL_FROM_NAME", "Studlyf Notifications")
-
-    # --- PRIMARY: BREVO API (Best for free tier without domain) ---
-    if brevo_key:
-        try:
-            import requests
-            logger.info(f"[EMAIL] Attempting Brevo API for {to_email}")
-            response = requests.post(
-                "https://api.brevo.com/v3/smtp/email",
-                headers={
-                    "api-key": brevo_key,
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "sender": {"name": email_from, "email": smtp_user if smtp_user else "notifications@studlyf.com"},
-                    "to": [{"email": to_email}],
-                    "subject": subject,
-                    "htmlContent": body_html,
-                },
-                timeout=10
-            )
-            if response.status_code in [200, 201, 202]:
-                logger.info(f"[EMAIL SUCCESS] Delivered via Brevo API to {to_email}")
-                return True
-            else:
-                logger.warning(f"[BREVO FAILED] Status {response.status_code}: {response.text}. Trying Resend...")
-        except Exception as e:
-            logger.error(f"[BREVO ERROR] {str(e)}")
 
-    # --- SECONDARY: RESEND API ---
-    if resend_key:
-        try:
-            import requests
-            logger.info(f"[EMAIL] Attempting Resend API for {to_email}")
-            response = requests.post(
-                "https://api.resend.com/emails",
-                headers={
-                    "Authorization": f"Bearer {resend_key}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "from": "onboarding@resend.dev" if not email_from else f"{email_from} <onboarding@resend.dev>",
-                    "to": [to_email],
-                    "subject": subject,
-                    "html": body_html,
-                },
-                timeout=10
+    def __init__(self):
+        self._http: Optional[httpx.AsyncClient] = None
+        self._smtp_pool = _SMTPPool(int(os.getenv("EMAIL_SMTP_POOL_SIZE", 4))) if AIOSMTPLIB_AVAILABLE else None
+        self.rate_limits = {
+            "brevo": _TokenBucket(float(os.getenv("EMAIL_RATE_BREVO", 5)), burst=5),
+            "resend": _TokenBucket(float(os.getenv("EMAIL_RATE_RESEND", 2)), burst=2),
+            "smtp": _TokenBucket(float(os.getenv("EMAIL_RATE_SMTP", 1)), burst=2),
+        }
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                timeout=10,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
             )
-            if response.status_code in [200, 201]:
-                logger.info(f"[EMAIL SUCCESS] Delivered via Resend API to {to_email}")
-                return True
-            else:
-                logger.warning(f"[RESEND FAILED] Status {response.status_code}: {response.text}. Falling back to SMTP...")
-        except Exception as e:
-            logger.error(f"[RESEND ERROR] {str(e)}. Falling back to SMTP...")
+        return self._http
+
+    async def aclose(self):
+        if self._http is not None and not self._http.is_closed:
+            await self._http.aclose()
+        if self._smtp_pool is not None:
+            await self._smtp_pool.close()
 
-    # --- FALLBACK: SMTP SSL (Port 465) ---
-    if not smtp_user or not smtp_pass:
-        logger.error("[EMAIL ERROR] No Resend Key and no SMTP credentials found.")
-        return False
+    async def deliver(self, to_email: str, subject: str, body_html: str) -> str:
+        """Send through the first provider that accepts the message; returns its name or raises."""
+        resend_key = os.getenv("RESEND_API_KEY")
+        brevo_key = os.getenv("BREVO_API_KEY")
+        smtp_user = os.getenv("SMTP_USER")
+        smtp_pass = os.getenv("SMTP_PASSWORD")
+        email_from = os.getenv("EMAIL_FROM_NAME", "Studlyf Notifications")
+        errors = []
 
-    def send_sync_email():
-        max_retries = 2
-        for attempt in range(max_retries):
+        # --- PRIMARY: BREVO API (Best for free tier without domain) ---
+        if brevo_key:
             try:
-                logger.info(f"[EMAIL] SMTP Fallback Attempt {attempt + 1}/{max_retries} to {to_email}")
-                # Force SSL for 465, else use STARTTLS
-                if smtp_port == 465:
-                    server = smtplib.SMTP_SSL(smtp_server, smtp_port, timeout=15)
-                else:
-                    server = smtplib.SMTP(smtp_server, smtp_port, timeout=15)
-                    server.starttls()
-                    
-                server.login(smtp_user, smtp_pass)
-                
-                msg = MIMEMultipart()
-                msg['From'] = f"{email_from} <{smtp_user}>"
-                msg['to'] = to_email
-                msg['Subject'] = subject
-                msg.attach(MIMEText(body_html, 'html'))
-                
-                server.send_message(msg)
-                server.quit()
-                logger.info(f"[EMAIL SUCCESS] Delivered via SMTP to {to_email}")
-                return True
+                await self.rate_limits["brevo"].acquire()
+                logger.info(f"[EMAIL] Attempting Brevo API for {to_email}")
+                response = await self._client().post(
+                    "https://api.brevo.com/v3/smtp/email",
+                    headers={"api-key": brevo_key, "Content-Type": "application/json"},
+                    json={
+                        "sender": {"name": email_from, "email": smtp_user if smtp_user else "notifications@studlyf.com"},
+                        "to": [{"email": to_email}],
+                        "subject": subject,
+                        "htmlContent": body_html,
+                    },
+                )
+                if response.status_code in [200, 201, 202]:
+                    logger.info(f"[EMAIL SUCCESS] Delivered via Brevo API to {to_email}")
+                    return "brevo"
+                logger.warning(f"[BREVO FAILED] Status {response.status_code}: {response.text}. Trying Resend...")
+                errors.append(f"brevo: {response.status_code}")
             except Exception as e:
-                logger.error(f"[SMTP ATTEMPT {attempt + 1} FAILED] {str(e)}")
-                if attempt < max_retries - 1:
-                    time.sleep(2)
-        return False
+                logger.error(f"[BREVO ERROR] {str(e)}")
+                errors.append(f"brevo: {e}")
+
+        # --- SECONDARY: RESEND API ---
+        if resend_key:
+            try:
+                await self.rate_limits["resend"].acquire()
+                logger.info(f"[EMAIL] Attempting Resend API for {to_email}")
+                response = await self._client().post(
+                    "https://api.resend.com/emails",
+                    headers={"Authorization": f"Bearer {resend_key}", "Content-Type": "application/json"},
+                    json={
+                        "from": "onboarding@resend.dev" if not email_from else f"{email_from} <onboarding@resend.dev>",
+                        "to": [to_email],
+                        "subject": subject,
+                        "html": body_html,
+                    },
+                )
+                if response.status_code in [200, 201]:
+                    logger.info(f"[EMAIL SUCCESS] Delivered via Resend API to {to_email}")
+                    return "resend"
+                logger.warning(f"[RESEND FAILED] Status {response.status_code}: {response.text}. Falling back to SMTP...")
+                errors.append(f"resend: {response.status_code}")
+            except Exception as e:
+                logger.error(f"[RESEND ERROR] {str(e)}. Falling back to SMTP...")
+                errors.append(f"resend: {e}")
+
+        # --- FALLBACK: SMTP ---
+        if not smtp_user or not smtp_pass:
+            logger.error("[EMAIL ERROR] No Resend Key and no SMTP credentials found.")
+            raise RuntimeError(" | ".join(errors) or "No email provider configured")
+
+        await self.rate_limits["smtp"].acquire()
+        await self._send_smtp(to_email, subject, body_html, smtp_user, smtp_pass, email_from)
+        logger.info(f"[EMAIL SUCCESS] Delivered via SMTP to {to_email}")
+        return "smtp"
+
+    async def _send_smtp(self, to_email, subject, body_html, smtp_user, smtp_pass, email_from):
+        smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+        smtp_port = int(os.getenv("SMTP_PORT", 465))
+
+        msg = MIMEMultipart()
+        msg['From'] = f"{email_from} <{smtp_user}>"
+        msg['to'] = to_email
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body_html, 'html'))
 
-    return await asyncio.to_thread(send_sync_email)
+        if self._smtp_pool is not None:
+            await self._smtp_pool.send(msg, smtp_server, smtp_port, smtp_user, smtp_pass)
+            return
+
+        def send_sync_email():
+            # Force SSL for 465, else use STARTTLS
+            if smtp_port == 465:
+                server = smtplib.SMTP_SSL(smtp_server, smtp_port, timeout=15)
+            else:
+                server = smtplib.SMTP(smtp_server, smtp_port, timeout=15)
+                server.starttls()
+            server.login(smtp_user, smtp_pass)
+            server.send_message(msg)
+            server.quit()
+
+        await asyncio.to_thread(send_sync_email)
+
+
+email_transport = EmailTransport()
+
+
+async def send_notification_email(to_email: str, subject: str, body_html: str):
+    """
+    Sends an email notification immediately (used where the caller needs the result, e.g. OTP).
+    Fire-and-forget notifications should go through services.email_outbox.queue_notification_email.
+    """
+    max_retries = 2
+    for attempt in range(max_retries):
+        try:
+            await email_transport.deliver(to_email, subject, body_html)
+            return True
+        except Exception as e:
+            logger.error(f"[EMAIL ATTEMPT {attempt + 1} FAILED] {str(e)}")
+            if attempt < max_retries - 1:
+                await asyncio.sleep(2)
+    return False
 
 def get_registration_template(user_name: str, event_name: str, custom_message: str = ""):
     message_html = f"<p>{custom_message}</p><br>" if custom_message else ""
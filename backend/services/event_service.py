@@ -4,10 +4,15 @@ from bson import ObjectId
 from datetime import datetime
 from typing import List, Optional
 
+from auth_institution import forget_event_owner
+from services.institution_stats_service import institution_stats_service
+from services.reminder_service import with_deadline_at
+
 async def create_event(event_data: dict):
     event_data["created_at"] = datetime.utcnow()
     event_data["updated_at"] = datetime.utcnow()
-    result = await db.events.insert_one(event_data)
+    result = await db.events.insert_one(with_deadline_at(event_data))
+    await institution_stats_service.increment(event_data.get("institution_id"), total_events=1)
     event_data["_id"] = str(result.inserted_id)
     return event_data
 
@@ -29,12 +34,17 @@ async def update_event(event_id: str, update_data: dict):
     update_data["updated_at"] = datetime.utcnow()
     await db.events.update_one(
         {"_id": ObjectId(event_id)},
-        {"$set": update_data}
+        {"$set": with_deadline_at(update_data)}
     )
     return await get_event_by_id(event_id)
 
 async def delete_event(event_id: str):
-    await db.events.delete_one({"_id": ObjectId(event_id)})
+    event = await db.events.find_one_and_delete({"_id": ObjectId(event_id)}, {"institution_id": 1})
+    if event:
+        # Participants/teams/submissions of the event stop counting too; the recount settles them
+        await institution_stats_service.increment(event.get("institution_id"), total_events=-1)
+        institution_stats_service.forget_event(event_id)
+        forget_event_owner(event_id)
     return {"message": "Event deleted successfully"}
 
 async def update_event_status(event_id: str, status: str):
@@ -0,0 +1,389 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from db import github_repo_cache_col
+
+logger = logging.getLogger("github_service")
+
+GITHUB_API_BASE = os.getenv("GITHUB_API_BASE", "https://api.github.com").rstrip("/")
+GITHUB_CONCURRENCY = int(os.getenv("GITHUB_CONCURRENCY", 8))
+GITHUB_MAX_REPOS = int(os.getenv("GITHUB_MAX_REPOS", 60))
+GITHUB_ETAG_CACHE_SIZE = int(os.getenv("GITHUB_ETAG_CACHE_SIZE", 5000))
+# Upper bound on the response bodies (READMEs, listings) kept for conditional requests
+GITHUB_ETAG_CACHE_BYTES = int(os.getenv("GITHUB_ETAG_CACHE_BYTES", 32 * 1024 * 1024))
+GITHUB_REPO_CACHE_DAYS = int(os.getenv("GITHUB_REPO_CACHE_DAYS", 30))
+# Stop scheduling new requests for a token when its remaining quota drops to this floor
+GITHUB_RATE_FLOOR = int(os.getenv("GITHUB_RATE_FLOOR", 25))
+GITHUB_MAX_RATE_WAIT = float(os.getenv("GITHUB_MAX_RATE_WAIT", 5))
+
+_NEXT_LINK_RE = re.compile(r'<([^>]+)>;\s*rel="next"')
+
+SKILL_AREAS = ("Backend", "Frontend", "DevOps", "Data", "GenAI")
+FRAMEWORK_MAP = {
+    "Backend": ["fastapi", "flask", "django", "express", "spring", "laravel"],
+    "Frontend": ["react", "next", "vue", "angular", "tailwind", "vite"],
+    "DevOps": ["docker", "kubernetes", "jenkins", "action", "terraform", "ansible"],
+    "Data": ["pandas", "numpy", "matplotlib", "scikit", "sql", "spark"],
+    "GenAI": ["openai", "langchain", "llama", "transformers", "pytorch", "tensorflow"],
+}
+NORMALIZATION_FACTOR = {"Backend": 50000, "Frontend": 40000, "DevOps": 10000, "Data": 25000, "GenAI": 15000}
+
+
+class GitHubAuthError(Exception):
+    pass
+
+
+class GitHubRateLimited(Exception):
+    def __init__(self, message: str, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class GitHubUpstreamError(RuntimeError):
+    """GitHub answered with a 5xx."""
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:24]
+
+
+class GitHubClient:
+    """
+    Shared async client for the GitHub REST API.
+
+    One pooled httpx.AsyncClient for the worker. The working auth scheme
+    (`Bearer` vs legacy `token`) is detected once per token and remembered.
+    GET responses are cached with their ETag/Last-Modified, so repeat calls are
+    conditional requests answered by 304 (which GitHub does not charge against
+    the rate limit). X-RateLimit-* headers are tracked per token: requests wait
+    briefly for a reset that is seconds away and otherwise raise
+    GitHubRateLimited instead of burning the remaining quota.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._schemes: "OrderedDict[str, str]" = OrderedDict()
+        self._etags: "OrderedDict[Tuple[str, str], Tuple[Optional[str], Optional[str], Any, int]]" = OrderedDict()
+        self._etag_bytes = 0
+        self._rate: Dict[str, Tuple[int, float]] = {}
+        self.counters = {"requests": 0, "not_modified": 0}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=GITHUB_API_BASE,
+                timeout=httpx.Timeout(10.0, connect=5.0),
+                limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+                headers={"User-Agent": "Studlyf-Analysis-Agent"},
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    async def _respect_rate_limit(self, key: str):
+        remaining, reset = self._rate.get(key, (None, 0.0))
+        if remaining is None or remaining > GITHUB_RATE_FLOOR:
+            return
+        wait = reset - time.time()
+        if wait <= 0:
+            return
+        if wait > GITHUB_MAX_RATE_WAIT:
+            raise GitHubRateLimited(f"GitHub rate limit low; resets in {int(wait)}s", retry_after=int(wait) + 1)
+        await asyncio.sleep(wait)
+
+    def _track_rate(self, key: str, response: httpx.Response):
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset = response.headers.get("X-RateLimit-Reset")
+        if remaining is not None and reset is not None:
+            try:
+                self._rate[key] = (int(remaining), float(reset))
+            except ValueError:
+                pass
+
+    def _remember(self, cache_key: Tuple[str, str], entry: Tuple[Optional[str], Optional[str], Any, int]):
+        previous = self._etags.pop(cache_key, None)
+        if previous is not None:
+            self._etag_bytes -= previous[3]
+        if entry[3] > GITHUB_ETAG_CACHE_BYTES // 16:
+            return
+        self._etags[cache_key] = entry
+        self._etag_bytes += entry[3]
+        while len(self._etags) > GITHUB_ETAG_CACHE_SIZE or self._etag_bytes > GITHUB_ETAG_CACHE_BYTES:
+            _, evicted = self._etags.popitem(last=False)
+            self._etag_bytes -= evicted[3]
+
+    async def _send(self, token: str, scheme: str, path: str, accept: str, cache_key: Tuple[str, str]) -> httpx.Response:
+        headers = {"Authorization": f"{scheme} {token}", "Accept": accept}
+        cached = self._etags.get(cache_key)
+        if cached:
+            if cached[0]:
+                headers["If-None-Match"] = cached[0]
+            elif cached[1]:
+                headers["If-Modified-Since"] = cached[1]
+        self.counters["requests"] += 1
+        return await self._get_client().get(path, headers=headers)
+
+    async def get(self, token: str, path: str, raw: bool = False, _retried: bool = False) -> Tuple[Any, httpx.Headers]:
+        """
+        GET `path` (relative to the API base, query string included).
+        Returns (body, headers); body is None for 404/409 (missing or empty repo content).
+        """
+        key = _token_key(token)
+        await self._respect_rate_limit(key)
+        accept = "application/vnd.github.raw" if raw else "application/vnd.github.v3+json"
+        cache_key = (key, f"{accept}|{path}")
+
+        scheme = self._schemes.get(key)
+        schemes = [scheme] if scheme else ["Bearer", "token"]
+        response = None
+        for candidate in schemes:
+            response = await self._send(token, candidate, path, accept, cache_key)
+            self._track_rate(key, response)
+            if response.status_code != 401:
+                self._schemes[key] = candidate
+                self._schemes.move_to_end(key)
+                while len(self._schemes) > GITHUB_ETAG_CACHE_SIZE:
+                    self._schemes.popitem(last=False)
+                break
+        if response.status_code == 401:
+            self._schemes.pop(key, None)
+            raise GitHubAuthError("Invalid GitHub token")
+
+        if response.status_code == 304:
+            cached = self._etags.get(cache_key)
+            if cached is None:
+                # Evicted while the request was in flight: fetch it unconditionally
+                return await self.get(token, path, raw, _retried=True)
+            self.counters["not_modified"] += 1
+            self._etags.move_to_end(cache_key)
+            return cached[2], response.headers
+        if response.status_code in (403, 429) and (
+            response.headers.get("X-RateLimit-Remaining") == "0" or response.headers.get("Retry-After")
+        ):
+            retry_after = float(response.headers.get("Retry-After") or 0)
+            if not _retried and 0 < retry_after <= GITHUB_MAX_RATE_WAIT:
+                await asyncio.sleep(retry_after)
+                return await self.get(token, path, raw, _retried=True)
+            if not retry_after:
+                reset = float(response.headers.get("X-RateLimit-Reset") or 0)
+                retry_after = max(reset - time.time(), 1) if reset else 60
+            raise GitHubRateLimited(f"GitHub rate limited ({response.status_code})", retry_after=int(retry_after))
+        if response.status_code in (404, 409):
+            return None, response.headers
+        if response.status_code >= 500:
+            raise GitHubUpstreamError(f"GitHub API {path} failed with {response.status_code}")
+        if response.status_code >= 400:
+            raise RuntimeError(f"GitHub API {path} failed with {response.status_code}")
+
+        body = response.text if raw else response.json()
+        etag, modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if etag or modified:
+            self._remember(cache_key, (etag, modified, body, len(response.content)))
+        return body, response.headers
+
+    async def get_paginated(self, token: str, path: str, max_items: int) -> List[Any]:
+        items: List[Any] = []
+        next_path: Optional[str] = path
+        while next_path and len(items) < max_items:
+            page, headers = await self.get(token, next_path)
+            if not page:
+                break
+            items.extend(page)
+            match = _NEXT_LINK_RE.search(headers.get("Link") or "")
+            next_path = match.group(1).replace(GITHUB_API_BASE, "", 1) if match else None
+        return items[:max_items]
+
+
+github_client = GitHubClient()
+
+
+def analyze_readme(readme_content: str) -> float:
+    if not readme_content:
+        return 0
+    # Simple heuristic: length and presence of headers/sections
+    score = min(20, len(readme_content) / 100)
+    if "#" in readme_content:
+        score += 5
+    if "```" in readme_content:
+        score += 5
+    return score
+
+
+def score_repo(repo: dict, facts: dict) -> dict:
+    """Skill contributions of one repo from its cached facts (languages, root filenames, README score)."""
+    name = repo["name"]
+    repo_iden = (name + " " + (repo.get("description") or "")).lower()
+    base_weight = 0.2 if repo.get("fork", False) else 1.0
+    result = {"skills": {k: 0.0 for k in SKILL_AREAS}, "langs": {}, "loc": 0, "signals": []}
+
+    # 1. Language Analysis
+    for lang, loc in (facts.get("langs") or {}).items():
+        result["langs"][lang] = loc
+        result["loc"] += loc
+        if lang in ["Python", "Go", "Rust", "Java", "PHP"]:
+            result["skills"]["Backend"] += (loc * 0.01) * base_weight
+        elif lang in ["JavaScript", "TypeScript", "HTML", "CSS"]:
+            result["skills"]["Frontend"] += (loc * 0.01) * base_weight
+        elif lang in ["Jupyter Notebook"]:
+            result["skills"]["Data"] += (loc * 0.01) * base_weight
+
+    # 2. File & Framework Analysis
+    filenames = facts.get("filenames")
+    if filenames:
+        if any(f in ["dockerfile", "docker-compose.yml", "kubernetes.yaml"] or f.endswith(".yaml") for f in filenames):
+            result["skills"]["DevOps"] += 2000 * base_weight
+            result["signals"].append(f"Infrastructure: {name}")
+        for skill, keywords in FRAMEWORK_MAP.items():
+            for kw in keywords:
+                if kw in repo_iden:
+                    result["skills"][skill] += 3000 * base_weight
+                    result["signals"].append(f"{kw.capitalize()} in {name}")
+                    break
+
+    # 3. Quality & Recency
+    q_score = facts.get("readme_score") or 0
+    if q_score:
+        for skill in result["skills"]:
+            if skill in repo_iden:
+                result["skills"][skill] += q_score * 100
+
+    if "2025" in repo.get("updated_at", "") or "2026" in repo.get("updated_at", ""):
+        for skill in result["skills"]:
+            if any(kw in repo_iden for kw in FRAMEWORK_MAP.get(skill, [])):
+                result["skills"][skill] += 500 * base_weight
+    return result
+
+
+class GitHubAnalysisService:
+    """
+    Skill profile from a user's GitHub repositories.
+    Per-repo facts are cached in `github_repo_cache` keyed by repo id and
+    `pushed_at`, so a repo that has not been pushed to since the last analysis
+    costs no API calls at all; only the listing endpoints are revalidated
+    (via ETag). Repos are fetched with bounded concurrency.
+    """
+
+    def __init__(self, client: GitHubClient = github_client):
+        self.client = client
+
+    @staticmethod
+    def _cache_id(repo: dict) -> str:
+        return f"{repo.get('id')}:{repo.get('pushed_at') or repo.get('updated_at')}"
+
+    async def _fetch_facts(self, token: str, repo: dict) -> dict:
+        full_name = f"{repo['owner']['login']}/{repo['name']}"
+        langs, contents, readme = await asyncio.gather(
+            self.client.get(token, f"/repos/{full_name}/languages"),
+            self.client.get(token, f"/repos/{full_name}/contents"),
+            self.client.get(token, f"/repos/{full_name}/readme", raw=True),
+        )
+        contents_body = contents[0] if isinstance(contents[0], list) else []
+        return {
+            "langs": langs[0] or {},
+            "filenames": [str(f.get("name", "")).lower() for f in contents_body],
+            "readme_score": analyze_readme(readme[0] or ""),
+        }
+
+    async def analyze(self, token: str) -> Optional[dict]:
+        user_data, _ = await self.client.get(token, "/user")
+        if not user_data:
+            raise GitHubAuthError("Invalid GitHub token")
+        repos = await self.client.get_paginated(
+            token, "/user/repos?per_page=100&sort=updated&type=owner", GITHUB_MAX_REPOS
+        )
+        if not repos:
+            return None
+
+        cache_ids = [self._cache_id(r) for r in repos]
+        facts: Dict[str, dict] = {}
+        async for row in github_repo_cache_col.find({"_id": {"$in": cache_ids}}, {"facts": 1}):
+            facts[row["_id"]] = row["facts"]
+
+        semaphore = asyncio.Semaphore(GITHUB_CONCURRENCY)
+        partial = False
+
+        async def load(repo: dict, cache_id: str):
+            nonlocal partial
+            async with semaphore:
+                try:
+                    facts[cache_id] = await self._fetch_facts(token, repo)
+                except GitHubRateLimited:
+                    partial = True
+                    return
+                except Exception as e:
+                    logger.warning(f"GitHub analysis skipped {repo.get('name')}: {e}")
+                    return
+            await github_repo_cache_col.update_one(
+                {"_id": cache_id},
+                {"$set": {"facts": facts[cache_id], "expires_at": datetime.utcnow() + timedelta(days=GITHUB_REPO_CACHE_DAYS)}},
+                upsert=True,
+            )
+
+        missing = [(r, c) for r, c in zip(repos, cache_ids) if c not in facts]
+        if missing:
+            await asyncio.gather(*(load(r, c) for r, c in missing))
+
+        skills_raw = {k: 0.0 for k in SKILL_AREAS}
+        language_stats: Dict[str, int] = {}
+        total_loc = 0
+        signals_found: List[str] = []
+        analyzed = 0
+        for repo, cache_id in zip(repos, cache_ids):
+            if cache_id not in facts:
+                continue
+            analyzed += 1
+            res = score_repo(repo, facts[cache_id])
+            for skill, val in res["skills"].items():
+                skills_raw[skill] += val
+            for lang, loc in res["langs"].items():
+                language_stats[lang] = language_stats.get(lang, 0) + loc
+                total_loc += loc
+            signals_found.extend(res["signals"])
+
+        # 4. Normalize to 0-100
+        normalized_skills = {}
+        for skill, raw in skills_raw.items():
+            limit = NORMALIZATION_FACTOR.get(skill, 20000)
+            score = min(100, int((raw / limit) * 100))
+            if raw > 500:
+                score = max(score, 12)
+            normalized_skills[skill] = score
+
+        # Readiness Score = Weighted average of active skills
+        active_skills = [v for v in normalized_skills.values() if v > 0]
+        readiness_score = int(sum(active_skills) / len(active_skills)) if active_skills else 0
+
+        # Calculate percentages for top 5 languages
+        top_langs_list = sorted(language_stats.items(), key=lambda x: x[1], reverse=True)[:5]
+        lang_percentages = {}
+        if total_loc > 0:
+            lang_percentages = {lang: round((count / total_loc) * 100, 1) for lang, count in top_langs_list}
+
+        return {
+            "username": user_data["login"],
+            "avatar_url": user_data["avatar_url"],
+            "skills": normalized_skills,
+            "languages": lang_percentages,
+            "total_loc": total_loc,
+            # The listing is capped at GITHUB_MAX_REPOS; report the account's real total
+            "repo_count": max(len(repos), int(user_data.get("public_repos") or 0) + int(user_data.get("owned_private_repos") or 0)),
+            "repos_analyzed": analyzed,
+            "partial": partial,
+            "signals": sorted(list(set(signals_found)))[:12],
+            "readiness_score": readiness_score,
+        }
+
+
+github_analysis_service = GitHubAnalysisService()
@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+
+from db import events_col, institutions_col, participants_col, submissions_col, teams_col
+
+logger = logging.getLogger("institution_stats_service")
+
+# How long after the last counter bump an institution is recounted from the raw collections
+INSTITUTION_RECONCILE_DELAY = float(os.getenv("INSTITUTION_RECONCILE_DELAY", 300))
+# Upper bound from the first bump, so an institution that never goes quiet is still recounted
+INSTITUTION_RECONCILE_MAX_DELAY = float(os.getenv("INSTITUTION_RECONCILE_MAX_DELAY", 1800))
+# Recount attempts when counters keep moving underneath the recount
+INSTITUTION_RECONCILE_ATTEMPTS = 3
+_EVENT_CACHE_SIZE = 5000
+
+STAT_FIELDS = ("total_events", "total_participants", "total_teams", "total_submissions")
+
+
+def _institution_filter(inst_id: str) -> dict:
+    # Events reference institutions either by the document _id or by its `institution_id` slug
+    clauses = [{"institution_id": inst_id}]
+    if ObjectId.is_valid(inst_id):
+        clauses.insert(0, {"_id": ObjectId(inst_id)})
+    return {"$or": clauses} if len(clauses) > 1 else clauses[0]
+
+
+class InstitutionStatsService:
+    """
+    Per-institution counters kept in `cached_stats` on the institution document.
+
+    Participant, team, submission and event writes `$inc` the matching counter
+    right after they land, so dashboards read a handful of integers instead of
+    recounting every event on every registration. Each bump also schedules the
+    institution for reconciliation: after INSTITUTION_RECONCILE_DELAY of quiet
+    the counters are recounted once from the raw collections, which repairs
+    any drift (failed writes, deletes without hooks) for a whole burst at once;
+    a burst that never goes quiet is recounted after INSTITUTION_RECONCILE_MAX_DELAY.
+    Every bump also increments `cached_stats.version`, and a recount is only
+    written if the version has not moved since it started, so it never
+    overwrites increments that landed while it was counting.
+    """
+
+    def __init__(
+        self,
+        reconcile_delay: float = INSTITUTION_RECONCILE_DELAY,
+        max_delay: float = INSTITUTION_RECONCILE_MAX_DELAY,
+    ):
+        self.reconcile_delay = reconcile_delay
+        self.max_delay = max(max_delay, reconcile_delay)
+        self._event_institutions: "OrderedDict[str, str]" = OrderedDict()
+        # inst_id -> (first bump, last bump) in monotonic time
+        self._pending: Dict[str, Tuple[float, float]] = {}
+        self._flush: Optional[asyncio.Task] = None
+
+    async def institution_for_event(self, event_id: str) -> str:
+        event_id = str(event_id or "")
+        if event_id in self._event_institutions:
+            self._event_institutions.move_to_end(event_id)
+            return self._event_institutions[event_id]
+        inst_id = ""
+        if ObjectId.is_valid(event_id):
+            event = await events_col.find_one({"_id": ObjectId(event_id)}, {"institution_id": 1})
+            inst_id = str((event or {}).get("institution_id") or "")
+        self._event_institutions[event_id] = inst_id
+        while len(self._event_institutions) > _EVENT_CACHE_SIZE:
+            self._event_institutions.popitem(last=False)
+        return inst_id
+
+    async def increment(self, inst_id: Optional[str], **deltas: int):
+        """Atomically bump cached_stats counters, e.g. increment(inst, total_participants=1)."""
+        inst_id = str(inst_id or "")
+        if not inst_id or not deltas:
+            return
+        try:
+            await institutions_col.update_one(
+                _institution_filter(inst_id),
+                {
+                    "$inc": {**{f"cached_stats.{k}": v for k, v in deltas.items()}, "cached_stats.version": 1},
+                    "$set": {"cached_stats.last_updated": datetime.utcnow().isoformat()},
+                },
+            )
+        except PyMongoError as e:
+            logger.warning(f"Institution counter update failed for {inst_id}: {e}")
+        self.schedule_reconcile(inst_id)
+
+    async def increment_for_event(self, event_id: Optional[str], **deltas: int):
+        if event_id:
+            await self.increment(await self.institution_for_event(event_id), **deltas)
+
+    def forget_event(self, event_id: str):
+        self._event_institutions.pop(str(event_id), None)
+
+    # --- Reconciliation ---
+
+    def schedule_reconcile(self, inst_id: str):
+        now = time.monotonic()
+        first, _ = self._pending.get(inst_id, (now, now))
+        self._pending[inst_id] = (first, now)
+        if self._flush is None or self._flush.done():
+            self._flush = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        # Institutions bumped while a recount runs stay in _pending and are handled in a later round
+        while self._pending:
+            now = time.monotonic()
+            due = [
+                inst_id for inst_id, (first, last) in self._pending.items()
+                if now - last >= self.reconcile_delay or now - first >= self.max_delay
+            ]
+            for inst_id in due:
+                self._pending.pop(inst_id, None)
+            for inst_id in due:
+                if await self.reconcile(inst_id) is None:
+                    self.schedule_reconcile(inst_id)
+            if self._pending:
+                wake = min(min(last + self.reconcile_delay, first + self.max_delay) for first, last in self._pending.values())
+                await asyncio.sleep(max(wake - time.monotonic(), 0.05))
+
+    async def _count(self, inst_id: str) -> Dict[str, object]:
+        event_ids = [str(e["_id"]) async for e in events_col.find({"institution_id": inst_id}, {"_id": 1})]
+        query = {"event_id": {"$in": event_ids}}
+        return {
+            "total_events": len(event_ids),
+            "total_participants": await participants_col.count_documents(query) if event_ids else 0,
+            "total_teams": await teams_col.count_documents(query) if event_ids else 0,
+            "total_submissions": await submissions_col.count_documents(query) if event_ids else 0,
+        }
+
+    async def reconcile(self, inst_id: str) -> Optional[Dict[str, object]]:
+        """Recount an institution's stats from the raw collections and overwrite cached_stats."""
+        try:
+            for _ in range(INSTITUTION_RECONCILE_ATTEMPTS):
+                doc = await institutions_col.find_one(_institution_filter(inst_id), {"cached_stats.version": 1})
+                version = ((doc or {}).get("cached_stats") or {}).get("version")
+                stats = await self._count(inst_id)
+                stats["version"] = version or 0
+                stats["last_updated"] = stats["reconciled_at"] = datetime.utcnow().isoformat()
+                if doc is None:
+                    return stats
+                # Only replace the counters if no increment landed while counting
+                result = await institutions_col.update_one(
+                    {"_id": doc["_id"], "cached_stats.version": version if version is not None else {"$exists": False}},
+                    {"$set": {"cached_stats": stats, "updated_at": datetime.utcnow()}},
+                )
+                if result.matched_count:
+                    return stats
+            logger.info(f"Institution {inst_id} counters kept moving during reconciliation; retrying later")
+            self.schedule_reconcile(inst_id)
+            return stats
+        except Exception as e:
+            logger.warning(f"Institution stats reconciliation failed for {inst_id}: {e}")
+            return None
+
+    async def reconcile_all(self) -> int:
+        """Full sweep over every institution that owns events (periodic drift repair)."""
+        count = 0
+        for inst_id in await events_col.distinct("institution_id"):
+            if inst_id and await self.reconcile(str(inst_id)) is not None:
+                count += 1
+        return count
+
+    async def stop(self):
+        if self._flush is not None:
+            self._flush.cancel()
+            self._flush = None
+
+    # --- Reads ---
+
+    async def get(self, inst_id: str) -> Dict[str, object]:
+        doc = await institutions_col.find_one(_institution_filter(inst_id), {"cached_stats": 1})
+        stats = (doc or {}).get("cached_stats") or {}
+        if not all(field in stats for field in STAT_FIELDS):
+            stats = await self.reconcile(inst_id) or {field: 0 for field in STAT_FIELDS}
+        return stats
+
+
+institution_stats_service = InstitutionStatsService()
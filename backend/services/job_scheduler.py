@@ -0,0 +1,308 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from db import db as database, job_leases_col
+
+logger = logging.getLogger("job_scheduler")
+
+SCHEDULER_TICK_SECONDS = float(os.getenv("SCHEDULER_TICK_SECONDS", 15))
+SCHEDULER_LEASE_SECONDS = float(os.getenv("SCHEDULER_LEASE_SECONDS", 60))
+JOB_HISTORY_DAYS = int(os.getenv("JOB_HISTORY_DAYS", 30))
+# Background runs still marked "running" after this long lost their worker
+STALE_RUN_SECONDS = int(os.getenv("STALE_RUN_SECONDS", 3600))
+
+LEADER_ID = "leader"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _job_id(name: str) -> str:
+    return f"job:{name}"
+
+
+class Job(NamedTuple):
+    name: str
+    func: Callable[[], Awaitable[Any]]
+    interval: float            # seconds between runs
+    jitter: float = 0.1        # +/- fraction of the interval added to each next run
+    timeout: Optional[float] = None
+    run_on_start: bool = False  # first run on first deploy instead of one interval later
+    description: str = ""
+
+    def next_delay(self) -> float:
+        return self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def lock_seconds(self) -> float:
+        return self.timeout or min(self.interval / 2, 3600)
+
+
+async def cleanup_job_history() -> Dict[str, int]:
+    """Fail background runs whose worker died and drop old run / outbox history."""
+    from db import email_outbox_col, notification_jobs_col, plagiarism_runs_col
+
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=STALE_RUN_SECONDS)
+    cutoff = now - timedelta(days=JOB_HISTORY_DAYS)
+    result: Dict[str, int] = {}
+    for name, col in (("plagiarism_runs", plagiarism_runs_col), ("notification_jobs", notification_jobs_col)):
+        failed = await col.update_many(
+            {"status": "running", "updated_at": {"$lt": stale}},
+            {"$set": {"status": "failed", "error": "Worker stopped before the run finished", "updated_at": now}},
+        )
+        removed = await col.delete_many({"status": {"$in": ["completed", "failed"]}, "updated_at": {"$lt": cutoff}})
+        result[f"{name}_failed"] = failed.modified_count
+        result[f"{name}_removed"] = removed.deleted_count
+    outbox = await email_outbox_col.delete_many({"status": "failed", "created_at": {"$lt": _now() - timedelta(days=JOB_HISTORY_DAYS)}})
+    result["email_outbox_failed_removed"] = outbox.deleted_count
+    return result
+
+
+def default_jobs() -> List[Job]:
+    from services.institution_stats_service import institution_stats_service
+    from services.leaderboard_service import leaderboard_service
+    from services.quiz_generation_service import quiz_generation_service
+    from services.reminder_service import reminder_service
+    from services.upload_service import collect_orphaned_blobs
+
+    jobs = [
+        Job("judge_reminders", reminder_service.send_judge_reminders, 12 * 3600,
+            description="Email judges with pending evaluations near a deadline"),
+        Job("institution_stats_reconcile", institution_stats_service.reconcile_all, 6 * 3600,
+            description="Recount every institution's cached_stats from the raw collections"),
+        Job("leaderboard_refresh", leaderboard_service.refresh_live_leaderboards, 15 * 60, jitter=0.2,
+            description="Republish the leaderboard of every LIVE event"),
+        Job("cleanup", cleanup_job_history, 24 * 3600, run_on_start=True,
+            description="Fail orphaned background runs and drop old run / outbox history"),
+        Job("blob_gc", collect_orphaned_blobs, 6 * 3600,
+            description="Delete uploaded blobs that lost their last reference"),
+    ]
+    if os.getenv("QUIZ_PREGENERATION", "true").lower() in ("1", "true", "yes"):
+        jobs.append(Job("quiz_pregeneration", quiz_generation_service.pregenerate_missing, 24 * 3600,
+                        run_on_start=True, description="Generate quizzes for modules that have none"))
+    return jobs
+
+
+class Follower(NamedTuple):
+    """A long-running background task that must run on exactly one worker (e.g. a change stream follower)."""
+    name: str
+    start: Callable[[], Awaitable[Any]]
+    stop: Callable[[], Awaitable[Any]]
+
+
+class JobScheduler:
+    """
+    Cluster-wide periodic jobs backed by the `job_leases` collection.
+
+    Every worker runs the loop, but only the holder of the leader lease
+    (renewed each tick, taken over once it lapses) starts jobs. Each job also
+    has its own document holding a lock, next_run_at and the outcome of the
+    last run; a run starts only after a conditional find_one_and_update on that
+    document wins, so a leader change mid-run, a second deployment or the
+    run_job.py CLI never execute the same job twice. next_run_at carries the
+    interval plus jitter so jobs registered together drift apart.
+    Followers are started when this worker gains the leader lease and stopped
+    when it loses it (or can no longer renew it), so they run on one worker.
+    """
+
+    def __init__(self):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.jobs: Dict[str, Job] = {}
+        self.followers: Dict[str, Follower] = {}
+        self.is_leader = False
+        self._following = False
+        self._renewed_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._running: Dict[str, asyncio.Task] = {}
+
+    def register(self, job: Job):
+        self.jobs[job.name] = job
+
+    def register_follower(self, follower: Follower):
+        self.followers[follower.name] = follower
+
+    def register_defaults(self):
+        for job in default_jobs():
+            self.register(job)
+
+    # --- Leases ---
+
+    async def _renew_leadership(self) -> bool:
+        now = _now()
+        try:
+            await job_leases_col.find_one_and_update(
+                {"_id": LEADER_ID, "$or": [{"owner": self.owner}, {"lease_until": {"$lt": now}}]},
+                {"$set": {"owner": self.owner, "lease_until": now + timedelta(seconds=SCHEDULER_LEASE_SECONDS)}},
+                upsert=True,
+            )
+            leader = True
+            self._renewed_at = time.monotonic()
+        except DuplicateKeyError:
+            # Someone else holds a live lease
+            leader = False
+        if leader != self.is_leader:
+            logger.info(f"Scheduler {self.owner} {'acquired' if leader else 'lost'} leadership")
+        self.is_leader = leader
+        return leader
+
+    async def _sync_followers(self):
+        if self.is_leader == self._following:
+            return
+        self._following = self.is_leader
+        for follower in self.followers.values():
+            try:
+                await (follower.start() if self._following else follower.stop())
+            except Exception as e:
+                logger.warning(f"Could not {'start' if self._following else 'stop'} follower {follower.name}: {e}")
+
+    async def _ensure_job_docs(self):
+        now = _now()
+        for job in self.jobs.values():
+            first_run = now if job.run_on_start else now + timedelta(seconds=job.next_delay())
+            await job_leases_col.update_one(
+                {"_id": _job_id(job.name)},
+                {"$setOnInsert": {"name": job.name, "next_run_at": first_run, "locked_until": None}},
+                upsert=True,
+            )
+
+    async def _acquire(self, job: Job, force: bool = False) -> Optional[dict]:
+        now = _now()
+        query: Dict[str, Any] = {
+            "_id": _job_id(job.name),
+            "$or": [{"locked_until": None}, {"locked_until": {"$lt": now}}],
+        }
+        if not force:
+            query["next_run_at"] = {"$lte": now}
+        return await job_leases_col.find_one_and_update(
+            query,
+            {"$set": {
+                "locked_by": self.owner,
+                "locked_until": now + timedelta(seconds=job.lock_seconds()),
+                "started_at": now,
+            }},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    # --- Runs ---
+
+    async def _execute(self, job: Job) -> Any:
+        started = time.monotonic()
+        status, error, result = "ok", None, None
+        try:
+            result = await asyncio.wait_for(job.func(), timeout=job.lock_seconds())
+        except asyncio.CancelledError:
+            status, error = "cancelled", "Scheduler stopped"
+            raise
+        except Exception as e:
+            status, error = "error", str(e)
+            logger.error(f"Job {job.name} failed: {e}")
+        finally:
+            finished = _now()
+            try:
+                await job_leases_col.update_one(
+                    {"_id": _job_id(job.name), "locked_by": self.owner},
+                    {"$set": {
+                        "locked_until": None,
+                        "last_run_at": finished,
+                        "last_status": status,
+                        "last_error": error,
+                        "last_duration_ms": int((time.monotonic() - started) * 1000),
+                        "last_run_by": self.owner,
+                        "next_run_at": finished + timedelta(seconds=job.next_delay()),
+                    }},
+                )
+            except PyMongoError as e:
+                logger.warning(f"Could not record run of job {job.name}: {e}")
+        logger.info(f"Job {job.name} finished ({status}) in {time.monotonic() - started:.1f}s")
+        return result
+
+    async def run_now(self, name: str) -> Any:
+        """Run one job immediately (CLI / admin); still honours the per-job lock."""
+        job = self.jobs.get(name)
+        if job is None:
+            raise KeyError(name)
+        await self._ensure_job_docs()
+        if await self._acquire(job, force=True) is None:
+            raise RuntimeError(f"Job {name} is already running elsewhere")
+        return await self._execute(job)
+
+    async def _tick(self):
+        leader = await self._renew_leadership()
+        await self._sync_followers()
+        if not leader:
+            return
+        now = _now()
+        async for doc in job_leases_col.find({"_id": {"$in": [_job_id(n) for n in self.jobs]}, "next_run_at": {"$lte": now}}):
+            job = self.jobs.get(doc.get("name"))
+            if job is None or job.name in self._running:
+                continue
+            if await self._acquire(job) is None:
+                continue
+            task = asyncio.create_task(self._execute(job))
+            self._running[job.name] = task
+            task.add_done_callback(lambda _t, n=job.name: self._running.pop(n, None))
+
+    async def _run(self):
+        await self._ensure_job_docs()
+        while True:
+            try:
+                await self._tick()
+            except PyMongoError as e:
+                logger.warning(f"Scheduler tick failed: {e}")
+                if self.is_leader and time.monotonic() - self._renewed_at >= SCHEDULER_LEASE_SECONDS:
+                    # The lease may have lapsed and been taken over: stop acting as leader
+                    logger.info(f"Scheduler {self.owner} could not renew leadership")
+                    self.is_leader = False
+                    await self._sync_followers()
+            await asyncio.sleep(SCHEDULER_TICK_SECONDS * random.uniform(0.8, 1.2))
+
+    async def start(self):
+        if database.db is None or self._task is not None:
+            return
+        if not self.jobs:
+            self.register_defaults()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Job scheduler started as {self.owner} with jobs: {', '.join(sorted(self.jobs))}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in list(self._running.values()):
+            task.cancel()
+        if self.is_leader:
+            try:
+                # Hand over straight away instead of waiting for the lease to lapse
+                await job_leases_col.update_one(
+                    {"_id": LEADER_ID, "owner": self.owner}, {"$set": {"lease_until": _now()}}
+                )
+            except PyMongoError:
+                pass
+            self.is_leader = False
+        await self._sync_followers()
+
+    async def status(self) -> List[dict]:
+        docs = {d["_id"]: d async for d in job_leases_col.find({"_id": {"$in": [_job_id(n) for n in self.jobs]}})}
+        return [
+            {
+                "name": job.name,
+                "description": job.description,
+                "interval_seconds": job.interval,
+                **{k: v for k, v in docs.get(_job_id(job.name), {}).items() if k not in ("_id", "name")},
+            }
+            for job in self.jobs.values()
+        ]
+
+
+job_scheduler = JobScheduler()
@@ -0,0 +1,529 @@
+import asyncio
+import heapq
+import logging
+import math
+import random
+import re
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from db import (
+    events_col, judge_assignment_stats_col, judge_assignments_col, judges_col,
+    participants_col, scores_col, submissions_col, teams_col, users_col,
+)
+
+logger = logging.getLogger("judge_assignment_service")
+
+_SKILL_SPLIT = re.compile(r"[,;/|]+")
+SUBMISSION_SKILL_FIELDS = ("required_expertise", "track", "category", "tags", "tech_stack", "domain")
+
+
+def _skills(value: Any) -> Set[str]:
+    """Normalise a free-text or list expertise field into a set of lowercase skills."""
+    if not value:
+        return set()
+    items: Iterable[Any] = value if isinstance(value, (list, tuple, set)) else _SKILL_SPLIT.split(str(value))
+    return {str(item).strip().lower() for item in items if str(item).strip()}
+
+
+def _norm(value: Any) -> str:
+    return str(value or "").strip().lower()
+
+
+def _assignment_id(submission_id: str, judge_email: str) -> str:
+    return f"{submission_id}:{judge_email}"
+
+
+class JudgeSkillIndex:
+    """Inverted index skill -> judge positions, built once per solve."""
+
+    def __init__(self, judges: List[dict]):
+        self.by_skill: Dict[str, List[int]] = defaultdict(list)
+        for idx, judge in enumerate(judges):
+            for skill in _skills(judge.get("expertise")):
+                self.by_skill[skill].append(idx)
+
+    def matches(self, skills: Set[str]) -> Dict[int, int]:
+        """judge position -> number of shared skills (only judges with at least one)."""
+        counts: Dict[int, int] = defaultdict(int)
+        for skill in skills:
+            for idx in self.by_skill.get(skill, ()):
+                counts[idx] += 1
+        return counts
+
+
+def solve_assignments(
+    judges: List[dict],
+    submissions: List[dict],
+    judges_per_submission: int = 2,
+    max_per_judge: Optional[int] = None,
+    expertise_weight: float = 0.0,
+    conflicts: Optional[Dict[int, Set[int]]] = None,
+    randomize: bool = False,
+) -> Dict[str, Any]:
+    """
+    Greedy load-balanced assignment.
+
+    Submissions are processed most-constrained first (fewest eligible judges).
+    For each one the k cheapest eligible judges are taken from a heap, where
+    cost = current load - expertise_weight * shared skills. Judges at their cap
+    or in `conflicts[submission_pos]` are never chosen.
+    Returns {"assignments": {submission_pos: [judge_pos, ...]}, "loads": [...], "short": [submission_pos, ...]}.
+    """
+    n_judges = len(judges)
+    k = max(1, min(judges_per_submission, n_judges))
+    conflicts = conflicts or {}
+    if max_per_judge is None:
+        max_per_judge = math.ceil(len(submissions) * k / n_judges) if n_judges else 0
+    caps = [int(j.get("max_assignments") or max_per_judge) for j in judges]
+
+    index = JudgeSkillIndex(judges)
+    matches = [index.matches(_submission_skills(s)) if expertise_weight else {} for s in submissions]
+
+    order = sorted(range(len(submissions)), key=lambda s: n_judges - len(conflicts.get(s, ())))
+    loads = [0] * n_judges
+    assignments: Dict[int, List[int]] = {}
+    short: List[int] = []
+    rng = random.Random()
+
+    for s in order:
+        blocked = conflicts.get(s, set())
+        match = matches[s]
+        candidates = (
+            (loads[j] - expertise_weight * match.get(j, 0) + (rng.random() * 0.5 if randomize else 0), j)
+            for j in range(n_judges)
+            if j not in blocked and loads[j] < caps[j]
+        )
+        chosen = [j for _, j in heapq.nsmallest(k, candidates)]
+        for j in chosen:
+            loads[j] += 1
+        assignments[s] = chosen
+        if len(chosen) < k:
+            short.append(s)
+
+    return {"assignments": assignments, "loads": loads, "short": short}
+
+
+def _submission_skills(submission: dict) -> Set[str]:
+    skills: Set[str] = set()
+    for field in SUBMISSION_SKILL_FIELDS:
+        skills |= _skills(submission.get(field))
+    return skills
+
+
+class JudgeAssignmentService:
+    """
+    Assignment engine plus the normalised assignment index.
+
+    `assigned_judge_emails` on the submission stays the source of truth for
+    access checks; every writer also calls `sync_assignments`, which mirrors it
+    into `judge_assignments` (one row per submission x judge, indexed by judge
+    email) and keeps per-judge pending/completed counters in
+    `judge_assignment_stats`. `mark_scored` moves a row from pending to scored.
+    """
+
+    STRATEGY_EXPERTISE = {"round_robin": 0.0, "random": 0.0, "balanced": 0.0, "expert_based": 2.0}
+
+    async def _team_identities(self, submissions: List[dict]) -> Dict[str, Set[str]]:
+        team_ids = {str(s["team_id"]) for s in submissions if s.get("team_id")}
+        object_ids = [ObjectId(t) for t in team_ids if ObjectId.is_valid(t)]
+        identities: Dict[str, Set[str]] = {}
+        if not object_ids:
+            return identities
+        async for team in teams_col.find({"_id": {"$in": object_ids}}, {"members": 1, "team_leader_id": 1}):
+            keys = {_norm(team.get("team_leader_id"))}
+            for member in team.get("members") or []:
+                if isinstance(member, dict):
+                    keys |= {_norm(member.get("user_id")), _norm(member.get("email"))}
+                else:
+                    keys.add(_norm(member))
+            identities[str(team["_id"])] = keys - {""}
+        return identities
+
+    def _conflicts(self, judges: List[dict], submissions: List[dict], team_identities: Dict[str, Set[str]]) -> Dict[int, Set[int]]:
+        """
+        A judge conflicts with a submission when they are on the team, share the
+        submitter's organisation/college, or list the team/user in their `conflicts`.
+        """
+        judge_keys = []
+        for judge in judges:
+            keys = {_norm(judge.get("email")), _norm(judge.get("user_id"))}
+            keys |= {_norm(c) for c in judge.get("conflicts") or []}
+            judge_keys.append((keys - {""}, _norm(judge.get("organization") or judge.get("college_name"))))
+
+        conflicts: Dict[int, Set[int]] = {}
+        for s, sub in enumerate(submissions):
+            sub_keys = {
+                _norm(sub.get("user_id")),
+                _norm(sub.get("email")),
+                _norm(sub.get("submitted_by")),
+                _norm(sub.get("team_id")),
+            } | team_identities.get(str(sub.get("team_id")), set())
+            sub_keys.discard("")
+            org = _norm(sub.get("college_name") or sub.get("organization"))
+            blocked = {
+                j for j, (keys, judge_org) in enumerate(judge_keys)
+                if keys & sub_keys or (org and judge_org and org == judge_org)
+            }
+            if blocked:
+                conflicts[s] = blocked
+        return conflicts
+
+    async def assign_event(self, event_id: str, config: Dict[str, Any]) -> Dict[str, Any]:
+        judges = await judges_col.find(
+            {"event_id": event_id, "status": "ACCEPTED"},
+            {"email": 1, "expertise": 1, "max_assignments": 1, "conflicts": 1, "organization": 1, "college_name": 1, "user_id": 1}
+        ).to_list(None)
+        if not judges:
+            raise ValueError("No accepted judges found for this event")
+
+        submissions = await submissions_col.find({"event_id": event_id, "status": "Submitted"}).to_list(None)
+        strategy = config.get("type", "balanced")
+        per_submission = int(config.get("judges_per_submission", 2))
+
+        team_identities = await self._team_identities(submissions)
+        result = solve_assignments(
+            judges,
+            submissions,
+            judges_per_submission=per_submission,
+            max_per_judge=config.get("max_per_judge"),
+            expertise_weight=float(config.get("expertise_weight", self.STRATEGY_EXPERTISE.get(strategy, 0.0))),
+            conflicts=self._conflicts(judges, submissions, team_identities),
+            randomize=strategy == "random",
+        )
+
+        assigned_at = datetime.now(timezone.utc).isoformat()
+        ops = [
+            UpdateOne(
+                {"_id": submissions[s]["_id"]},
+                {"$set": {
+                    "assigned_judge_emails": [judges[j]["email"] for j in chosen],
+                    "assigned_at": assigned_at,
+                    "status": "Under Review",
+                }},
+            )
+            for s, chosen in result["assignments"].items() if chosen
+        ]
+        if ops:
+            await submissions_col.bulk_write(ops, ordered=False)
+            await self.sync_assignments([
+                (submissions[s], [judges[j]["email"] for j in chosen])
+                for s, chosen in result["assignments"].items() if chosen
+            ])
+
+        loads = result["loads"]
+        return {
+            "assigned_submissions": len(ops),
+            "judges_used": sum(1 for load in loads if load),
+            "assignment_type": strategy,
+            "load": {"min": min(loads), "max": max(loads)},
+            "under_assigned": [str(submissions[s]["_id"]) for s in result["short"]],
+        }
+
+    # --- Assignment index maintenance ---
+
+    @staticmethod
+    def _counter_inc(counters: Dict[str, Dict[str, int]], email: str, event_id: str, field: str, delta: int):
+        bucket = counters.setdefault(email, {})
+        for key in (field, f"by_event.{event_id}.{field}"):
+            bucket[key] = bucket.get(key, 0) + delta
+
+    async def _apply_counters(self, counters: Dict[str, Dict[str, int]]):
+        ops = [
+            UpdateOne({"_id": email}, {"$inc": {k: v for k, v in inc.items() if v}}, upsert=True)
+            for email, inc in counters.items() if any(inc.values())
+        ]
+        if ops:
+            await judge_assignment_stats_col.bulk_write(ops, ordered=False)
+
+    async def sync_assignments(self, entries: List[Tuple[dict, List[str]]]):
+        """
+        Mirror each (submission, assigned emails) pair into judge_assignments:
+        rows for judges no longer assigned are removed, new judges get a pending row.
+        Counters move only for rows this call actually inserted or deleted, so
+        concurrent syncs of the same submission never count a row twice.
+        """
+        if not entries:
+            return
+        wanted: Dict[str, Set[str]] = {}
+        events: Dict[str, str] = {}
+        for submission, emails in entries:
+            sid = str(submission["_id"])
+            wanted[sid] = {_norm(e) for e in emails if _norm(e)}
+            events[sid] = str(submission.get("event_id") or "")
+
+        existing: Dict[str, Set[str]] = defaultdict(set)
+        async for row in judge_assignments_col.find(
+            {"submission_id": {"$in": list(wanted)}}, {"submission_id": 1, "judge_email": 1}
+        ):
+            existing[row["submission_id"]].add(row["judge_email"])
+
+        now = datetime.now(timezone.utc)
+        inserts: List[UpdateOne] = []
+        inserted_keys: List[Tuple[str, str]] = []  # (email, event_id) per insert op
+        removals: List[str] = []
+        for sid, emails in wanted.items():
+            event_id = events[sid]
+            current = existing.get(sid, set())
+            for email in emails - current:
+                inserts.append(UpdateOne(
+                    {"_id": _assignment_id(sid, email)},
+                    {"$setOnInsert": {
+                        "submission_id": sid,
+                        "judge_email": email,
+                        "event_id": event_id,
+                        "status": "pending",
+                        "assigned_at": now,
+                    }},
+                    upsert=True,
+                ))
+                inserted_keys.append((email, event_id))
+            removals.extend(_assignment_id(sid, email) for email in current - emails)
+
+        counters: Dict[str, Dict[str, int]] = {}
+        error: Optional[BulkWriteError] = None
+        if inserts:
+            try:
+                upserted = (await judge_assignments_col.bulk_write(inserts, ordered=False)).upserted_ids.keys()
+            except BulkWriteError as e:
+                # Duplicate _id: a concurrent sync inserted (and counted) that row first
+                upserted = [u["index"] for u in e.details.get("upserted", [])]
+                if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                    error = e
+            for idx in upserted:
+                email, event_id = inserted_keys[idx]
+                self._counter_inc(counters, email, event_id, "pending", 1)
+
+        # One conditional delete per row: only the caller that removed a row decrements for it,
+        # using the status the row had at that moment
+        deleted = await asyncio.gather(*(judge_assignments_col.find_one_and_delete({"_id": rid}) for rid in removals))
+        for row in deleted:
+            if row:
+                field = "completed" if row.get("status") == "scored" else "pending"
+                self._counter_inc(counters, row["judge_email"], row.get("event_id", ""), field, -1)
+
+        await self._apply_counters(counters)
+        if error is not None:
+            raise error
+
+    async def mark_scored(self, submission_id: str, judge_email: str):
+        email = _norm(judge_email)
+        if not email:
+            return
+        row = await judge_assignments_col.find_one_and_update(
+            {"_id": _assignment_id(str(submission_id), email), "status": "pending"},
+            {"$set": {"status": "scored", "scored_at": datetime.now(timezone.utc)}},
+        )
+        if row:
+            counters: Dict[str, Dict[str, int]] = {}
+            self._counter_inc(counters, email, row.get("event_id", ""), "pending", -1)
+            self._counter_inc(counters, email, row.get("event_id", ""), "completed", 1)
+            await self._apply_counters(counters)
+
+    async def rebuild_index(self, event_id: Optional[str] = None) -> int:
+        """
+        Reconcile judge_assignments and the counters from submissions + scores
+        (backfill for data written before the index existed).
+        """
+        query: Dict[str, Any] = {"assigned_judge_emails.0": {"$exists": True}}
+        if event_id:
+            query["event_id"] = event_id
+        submissions = await submissions_col.find(query, {"event_id": 1, "assigned_judge_emails": 1}).to_list(None)
+        sids = [str(s["_id"]) for s in submissions]
+
+        scored: Set[Tuple[str, str]] = set()
+        async for score in scores_col.find({"submission_id": {"$in": sids}, "judge_email": {"$nin": [None, ""]}},
+                                           {"submission_id": 1, "judge_email": 1}):
+            scored.add((score["submission_id"], _norm(score["judge_email"])))
+
+        rows = []
+        for sub in submissions:
+            sid = str(sub["_id"])
+            for email in {_norm(e) for e in sub.get("assigned_judge_emails") or [] if _norm(e)}:
+                is_scored = (sid, email) in scored
+                rows.append({
+                    "_id": _assignment_id(sid, email),
+                    "submission_id": sid,
+                    "judge_email": email,
+                    "event_id": str(sub.get("event_id") or ""),
+                    "status": "scored" if is_scored else "pending",
+                })
+
+        delete_filter = {"event_id": event_id} if event_id else {}
+        # Judges who lose every row in scope still need their counters recomputed
+        previous_emails = set(await judge_assignments_col.distinct("judge_email", delete_filter))
+        await judge_assignments_col.delete_many(delete_filter)
+        if rows:
+            await judge_assignments_col.bulk_write(
+                [UpdateOne({"_id": r["_id"]}, {"$set": r}, upsert=True) for r in rows], ordered=False
+            )
+
+        # Recompute counters for every judge touched
+        emails = list({r["judge_email"] for r in rows} | previous_emails)
+        totals = await judge_assignments_col.aggregate([
+            {"$match": {"judge_email": {"$in": emails}}},
+            {"$group": {
+                "_id": {"email": "$judge_email", "event_id": "$event_id"},
+                "pending": {"$sum": {"$cond": [{"$eq": ["$status", "pending"]}, 1, 0]}},
+                "completed": {"$sum": {"$cond": [{"$eq": ["$status", "scored"]}, 1, 0]}},
+            }},
+        ]).to_list(None)
+        stats: Dict[str, Dict[str, Any]] = {
+            email: {"pending": 0, "completed": 0, "by_event": {}} for email in emails
+        }
+        for t in totals:
+            doc = stats[t["_id"]["email"]]
+            doc["pending"] += t["pending"]
+            doc["completed"] += t["completed"]
+            doc["by_event"][t["_id"]["event_id"]] = {"pending": t["pending"], "completed": t["completed"]}
+        if stats:
+            await judge_assignment_stats_col.bulk_write(
+                [UpdateOne({"_id": email}, {"$set": doc}, upsert=True) for email, doc in stats.items()],
+                ordered=False,
+            )
+        if not event_id:
+            # Full rebuild: every other stats document belongs to a judge with no rows left
+            await judge_assignment_stats_col.update_many(
+                {"_id": {"$nin": list(stats)}},
+                {"$set": {"pending": 0, "completed": 0, "by_event": {}}},
+            )
+        return len(rows)
+
+    async def backfill_if_empty(self) -> int:
+        """Startup hook: build the index once for deployments that predate it."""
+        if await judge_assignments_col.estimated_document_count():
+            return 0
+        count = await self.rebuild_index()
+        logger.info(f"Backfilled {count} judge assignments")
+        return count
+
+    # --- Reads ---
+
+    async def get_stats(self, judge_email: str) -> Dict[str, Any]:
+        doc = await judge_assignment_stats_col.find_one({"_id": _norm(judge_email)}) or {}
+        return {
+            "pending": max(doc.get("pending", 0), 0),
+            "completed": max(doc.get("completed", 0), 0),
+            "by_event": doc.get("by_event", {}),
+        }
+
+    async def list_for_judge(
+        self,
+        judge_email: str,
+        event_ids: List[str],
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        submission_id: Optional[str] = None,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Keyset page of assignment rows ordered by _id; returns (rows, next_cursor)."""
+        query: Dict[str, Any] = {"judge_email": _norm(judge_email), "event_id": {"$in": event_ids}}
+        if submission_id:
+            query["submission_id"] = submission_id
+        if cursor:
+            query["_id"] = {"$gt": cursor}
+        find = judge_assignments_col.find(query).sort("_id", 1)
+        if limit:
+            find = find.limit(limit + 1)
+        rows = await find.to_list(None)
+        next_cursor = None
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1]["_id"]
+        return rows, next_cursor
+
+    async def hydrate(self, rows: List[dict], judge_email: str, judge_ids: List[str]) -> List[dict]:
+        """Batch-load submissions, events, teams, participants, users and this judge's scores."""
+        sids = [r["submission_id"] for r in rows]
+        if not sids:
+            return []
+        submissions = {
+            str(s["_id"]): s
+            for s in await submissions_col.find({"_id": {"$in": [ObjectId(i) for i in sids if ObjectId.is_valid(i)]}}).to_list(None)
+        }
+        event_oids = {ObjectId(s["event_id"]) for s in submissions.values() if ObjectId.is_valid(str(s.get("event_id")))}
+        events = {
+            str(e["_id"]): e
+            for e in await events_col.find({"_id": {"$in": list(event_oids)}}, {"name": 1, "judging_criteria": 1}).to_list(None)
+        }
+        team_oids = {ObjectId(str(s["team_id"])) for s in submissions.values() if ObjectId.is_valid(str(s.get("team_id")))}
+        teams = {
+            str(t["_id"]): t
+            for t in await teams_col.find({"_id": {"$in": list(team_oids)}}, {"team_name": 1, "members": 1, "leader_name": 1}).to_list(None)
+        }
+        participant_oids = {
+            ObjectId(str(s["participant_id"])) for s in submissions.values()
+            if not teams.get(str(s.get("team_id"))) and ObjectId.is_valid(str(s.get("participant_id")))
+        }
+        participants = {
+            str(p["_id"]): p
+            for p in await participants_col.find({"_id": {"$in": list(participant_oids)}}, {"user_id": 1}).to_list(None)
+        }
+        users = {
+            u["user_id"]: u
+            for u in await users_col.find(
+                {"user_id": {"$in": [p.get("user_id") for p in participants.values() if p.get("user_id")]}},
+                {"user_id": 1, "name": 1, "email": 1}
+            ).to_list(None)
+        }
+        scores: Dict[str, dict] = {}
+        async for score in scores_col.find({
+            "submission_id": {"$in": sids},
+            "$or": [{"judge_email": judge_email}, {"judge_id": {"$in": judge_ids}}],
+        }):
+            scores.setdefault(score["submission_id"], score)
+
+        out = []
+        for row in rows:
+            submission = submissions.get(row["submission_id"])
+            if not submission:
+                continue
+            event = events.get(str(submission.get("event_id")))
+            score = scores.get(row["submission_id"])
+            out.append({
+                "_id": row["submission_id"],
+                "event_id": submission["event_id"],
+                "event_name": event.get("name", "Unknown Event") if event else "Unknown Event",
+                "title": submission.get("title", "Untitled Submission"),
+                "description": submission.get("description", ""),
+                "submitted_at": submission.get("submitted_at", ""),
+                "status": submission.get("status", "Submitted"),
+                "participant_info": self._participant_info(submission, teams, participants, users),
+                "submission_data": submission.get("submission_data", {}),
+                "files": submission.get("files", []),
+                "existing_scores": {
+                    "scores": score.get("scores", {}),
+                    "comments": score.get("comments", ""),
+                    "created_at": score.get("created_at", ""),
+                } if score else None,
+                "evaluation_criteria": event.get("judging_criteria", []) if event else [],
+            })
+        return out
+
+    @staticmethod
+    def _participant_info(submission: dict, teams: dict, participants: dict, users: dict) -> dict:
+        team = teams.get(str(submission.get("team_id")))
+        if team:
+            return {
+                "type": "team",
+                "name": team.get("team_name", "Unknown Team"),
+                "members": team.get("members", []),
+                "leader": team.get("leader_name", "Unknown Leader"),
+            }
+        participant = participants.get(str(submission.get("participant_id")))
+        if participant:
+            user = users.get(participant.get("user_id"))
+            return {
+                "type": "individual",
+                "name": user.get("name", "Unknown Participant") if user else "Unknown Participant",
+                "email": user.get("email", "") if user else "",
+                "user_id": participant.get("user_id", ""),
+            }
+        return {"type": "unknown", "name": "Unknown Participant"}
+
+
+judge_assignment_service = JudgeAssignmentService()
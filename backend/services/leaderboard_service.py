@@ -1,78 +1,316 @@
+import time
 from datetime import datetime
+from typing import Dict, Optional
 from bson import ObjectId
-from db import scores_col, submissions_col, leaderboard_col, events_col
+from pymongo.errors import DuplicateKeyError
+from db import events_col, submissions_col, leaderboard_col, leaderboard_meta_col, score_aggregates_col, teams_col, participants_col
+
+# Judges' criterion points live under different keys depending on which flow wrote the score.
+# The first key that is present and not null wins, in Python and in the pipelines alike.
+SCORE_POINT_FIELDS = ("scores", "criteria_scores", "score_breakdown")
+SCORE_POINTS_EXPR = {"$ifNull": [*(f"${f}" for f in SCORE_POINT_FIELDS), {}]}
+AVG_SCORE_EXPR = {"$cond": [
+    {"$gt": [{"$ifNull": ["$criteria_count", 0]}, 0]},
+    {"$round": [{"$divide": ["$points_sum", "$criteria_count"]}, 2]},
+    0,
+]}
+
+
+def _object_id_or_null(field: str) -> dict:
+    return {"$convert": {"input": field, "to": "objectId", "onError": None, "onNull": None}}
+
+
+def _criterion_key(name) -> str:
+    return str(name).replace(".", "_").lstrip("$") or "_"
+
+
+def score_points(score_doc: Optional[dict]) -> Dict[str, float]:
+    """Numeric criterion points of a score document, keyed by (field-safe) criterion name."""
+    if not score_doc:
+        return {}
+    raw = next((score_doc[f] for f in SCORE_POINT_FIELDS if score_doc.get(f) is not None), {})
+    if not isinstance(raw, dict):
+        return {}
+    return {
+        _criterion_key(k): float(v)
+        for k, v in raw.items()
+        if isinstance(v, (int, float)) and not isinstance(v, bool)
+    }
+
 
 class LeaderboardService:
+    """
+    Rankings are written as an immutable *version* of rows and published by
+    flipping the pointer in `leaderboard_meta` ({_id: event_id, version}).
+    Readers always resolve the pointer first, so a recompute never exposes
+    an empty or half-written leaderboard.
+    """
+
+    def _ranking_pipeline(self, event_id: str, version: int) -> list:
+        return [
+            {"$match": {"event_id": event_id}},
+            {"$addFields": {
+                "_sub_id": {"$toString": "$_id"},
+                "_team_oid": _object_id_or_null("$team_id"),
+                "_participant_oid": _object_id_or_null("$participant_id"),
+            }},
+            # Average across all criteria and judges: sum(points) / count(criteria)
+            {"$lookup": {
+                "from": "scores",
+                "localField": "_sub_id",
+                "foreignField": "submission_id",
+                "pipeline": [
+                    {"$project": {"pairs": {"$objectToArray": SCORE_POINTS_EXPR}}},
+                    {"$unwind": "$pairs"},
+                    {"$match": {"pairs.v": {"$type": "number"}}},
+                    {"$group": {"_id": None, "points": {"$sum": "$pairs.v"}, "criteria": {"$sum": 1}}},
+                ],
+                "as": "_totals",
+            }},
+            {"$lookup": {
+                "from": "teams",
+                "localField": "_team_oid",
+                "foreignField": "_id",
+                "pipeline": [{"$project": {"team_name": 1}}],
+                "as": "_team",
+            }},
+            {"$lookup": {
+                "from": "participants",
+                "localField": "_participant_oid",
+                "foreignField": "_id",
+                "pipeline": [{"$project": {"full_name": 1}}],
+                "as": "_participant",
+            }},
+            {"$set": {
+                "_totals": {"$first": "$_totals"},
+                "_team": {"$first": "$_team"},
+                "_participant": {"$first": "$_participant"},
+                "_has_team": {"$gt": [{"$ifNull": ["$team_id", ""]}, ""]},
+            }},
+            {"$project": {
+                "_id": 0,
+                "event_id": {"$literal": event_id},
+                "version": {"$literal": version},
+                "submission_id": "$_sub_id",
+                "team_id": {"$ifNull": ["$team_id", None]},
+                "participant_id": {"$ifNull": ["$participant_id", None]},
+                "participation_type": {"$cond": ["$_has_team", "TEAM", "INDIVIDUAL"]},
+                "team_name": {"$cond": [
+                    "$_has_team",
+                    {"$ifNull": ["$_team.team_name", "Unknown Team"]},
+                    "N/A",
+                ]},
+                "recipient_name": {"$ifNull": ["$_participant.full_name", "Participant"]},
+                "total_score": {"$cond": [
+                    {"$gt": [{"$ifNull": ["$_totals.criteria", 0]}, 0]},
+                    {"$round": [{"$divide": ["$_totals.points", "$_totals.criteria"]}, 2]},
+                    0,
+                ]},
+                "project_name": {"$ifNull": ["$project_name", "Unnamed Project"]},
+                "last_updated": "$$NOW",
+            }},
+            {"$setWindowFields": {
+                "sortBy": {"total_score": -1},
+                "output": {"rank": {"$documentNumber": {}}},
+            }},
+            {"$merge": {"into": "leaderboard", "whenMatched": "fail", "whenNotMatched": "insert"}},
+        ]
+
+    async def current_version(self, event_id: str) -> Optional[int]:
+        meta = await leaderboard_meta_col.find_one({"_id": event_id})
+        return meta.get("version") if meta else None
+
+    async def get_rankings(self, event_id: str, limit: Optional[int] = None):
+        """Rows of the published leaderboard version, best rank first."""
+        query = {"event_id": event_id}
+        version = await self.current_version(event_id)
+        if version is not None:
+            query["version"] = version
+        cursor = leaderboard_col.find(query).sort("rank", 1)
+        if limit:
+            cursor = cursor.limit(limit)
+        return await cursor.to_list(None)
+
     async def calculate_event_leaderboard(self, event_id: str):
         """
         Dynamically calculates rankings by aggregating judge scores.
         Handles both individual and team participation.
+        Scores, team and participant names and ranks are resolved server-side in a
+        single pipeline, written as a new version, then published atomically.
+        """
+        version = time.time_ns()
+
+        # 1. Build the new version server-side ($merge writes it, nothing comes back over the wire)
+        await submissions_col.aggregate(self._ranking_pipeline(event_id, version)).to_list(None)
+
+        # 2. Flip the pointer, unless a newer recompute already published
+        try:
+            await leaderboard_meta_col.update_one(
+                {"_id": event_id, "$or": [{"version": {"$lt": version}}, {"version": {"$exists": False}}]},
+                {"$set": {"version": version, "published_at": datetime.utcnow()}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            await leaderboard_col.delete_many({"event_id": event_id, "version": version})
+            return await self.get_rankings(event_id)
+
+        # 3. Drop superseded versions (and legacy unversioned rows)
+        await leaderboard_col.delete_many({
+            "event_id": event_id,
+            "$or": [{"version": {"$lt": version}}, {"version": {"$exists": False}}],
+        })
+
+        rankings = await leaderboard_col.find(
+            {"event_id": event_id, "version": version}, {"_id": 0}
+        ).sort("rank", 1).to_list(None)
+        return rankings
+
+    async def refresh_live_leaderboards(self) -> int:
+        """Periodic job: republish the leaderboard of every LIVE event; returns the number refreshed."""
+        refreshed = 0
+        async for event in events_col.find({"status": "LIVE"}, {"_id": 1}):
+            await self.calculate_event_leaderboard(str(event["_id"]))
+            refreshed += 1
+        return refreshed
+
+    # ─── Incremental live rankings ───────────────────────────────────────────
+    # `score_aggregates` holds one running row per submission
+    # ({_id: submission_id, points_sum, criteria_count, judge_count, criteria_sums, avg_score}),
+    # updated in place on every judge score write. The (event_id, avg_score) index
+    # answers top-K without recomputing the event, and "my rank" by counting
+    # the entries ahead on the same index.
+
+    async def record_score(self, submission: dict, new_score: dict, previous_score: Optional[dict] = None):
+        """Apply one judge's score (or the change from their previous score) to the running aggregates."""
+        new_points = score_points(new_score)
+        old_points = score_points(previous_score)
+
+        inc: Dict[str, float] = {
+            "points_sum": sum(new_points.values()) - sum(old_points.values()),
+            "criteria_count": len(new_points) - len(old_points),
+            "judge_count": 0 if previous_score else 1,
+        }
+        for name in new_points.keys() | old_points.keys():
+            inc[f"criteria_sums.{name}"] = new_points.get(name, 0) - old_points.get(name, 0)
+            inc[f"criteria_counts.{name}"] = (name in new_points) - (name in old_points)
+
+        submission_id = str(submission["_id"])
+        await score_aggregates_col.update_one(
+            {"_id": submission_id},
+            {
+                "$inc": inc,
+                "$set": {"updated_at": datetime.utcnow()},
+                "$setOnInsert": {
+                    "event_id": str(submission.get("event_id")),
+                    "team_id": submission.get("team_id"),
+                    "participant_id": submission.get("participant_id"),
+                    "project_name": submission.get("project_name") or submission.get("project_title") or "Unnamed Project",
+                },
+            },
+            upsert=True
+        )
+        # Derived from the stored counters, so concurrent writers cannot leave a stale average
+        await score_aggregates_col.update_one(
+            {"_id": submission_id},
+            [{"$set": {"avg_score": AVG_SCORE_EXPR}}]
+        )
+
+    async def rebuild_score_aggregates(self, event_id: str):
+        """Recompute the running aggregates for an event from raw scores (drift repair)."""
+        pipeline = [
+            {"$match": {"event_id": event_id}},
+            {"$project": {
+                "_sub_id": {"$toString": "$_id"},
+                "event_id": 1, "team_id": 1, "participant_id": 1,
+                "project_name": {"$ifNull": ["$project_name", "$project_title", "Unnamed Project"]},
+            }},
+            {"$lookup": {
+                "from": "scores",
+                "localField": "_sub_id",
+                "foreignField": "submission_id",
+                "pipeline": [
+                    {"$project": {"pairs": {"$objectToArray": SCORE_POINTS_EXPR}}},
+                    {"$unwind": "$pairs"},
+                    {"$match": {"pairs.v": {"$type": "number"}}},
+                    {"$group": {
+                        "_id": {"$replaceAll": {"input": "$pairs.k", "find": ".", "replacement": "_"}},
+                        "sum": {"$sum": "$pairs.v"},
+                        "count": {"$sum": 1},
+                    }},
+                ],
+                "as": "_criteria",
+            }},
+            {"$lookup": {
+                "from": "scores",
+                "localField": "_sub_id",
+                "foreignField": "submission_id",
+                "pipeline": [{"$count": "n"}],
+                "as": "_judges",
+            }},
+            {"$match": {"_judges.0": {"$exists": True}}},
+            {"$project": {
+                "_id": "$_sub_id",
+                "event_id": 1, "team_id": 1, "participant_id": 1, "project_name": 1,
+                "points_sum": {"$sum": "$_criteria.sum"},
+                "criteria_count": {"$sum": "$_criteria.count"},
+                "judge_count": {"$first": "$_judges.n"},
+                "criteria_sums": {"$arrayToObject": {"$map": {"input": "$_criteria", "in": {"k": "$$this._id", "v": "$$this.sum"}}}},
+                "criteria_counts": {"$arrayToObject": {"$map": {"input": "$_criteria", "in": {"k": "$$this._id", "v": "$$this.count"}}}},
+                "updated_at": "$$NOW",
+            }},
+            {"$set": {"avg_score": AVG_SCORE_EXPR}},
+            {"$merge": {"into": "score_aggregates", "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+        ]
+        await submissions_col.aggregate(pipeline).to_list(None)
+
+    async def _hydrate_names(self, rows: list):
+        team_ids = [ObjectId(r["team_id"]) for r in rows if r.get("team_id") and ObjectId.is_valid(str(r["team_id"]))]
+        participant_ids = [ObjectId(r["participant_id"]) for r in rows if r.get("participant_id") and ObjectId.is_valid(str(r["participant_id"]))]
+        teams = {
+            str(t["_id"]): t.get("team_name")
+            async for t in teams_col.find({"_id": {"$in": team_ids}}, {"team_name": 1})
+        } if team_ids else {}
+        people = {
+            str(p["_id"]): p.get("full_name")
+            async for p in participants_col.find({"_id": {"$in": participant_ids}}, {"full_name": 1})
+        } if participant_ids else {}
+
+        for r in rows:
+            r["submission_id"] = r.pop("_id")
+            r["participation_type"] = "TEAM" if r.get("team_id") else "INDIVIDUAL"
+            r["team_name"] = (teams.get(str(r["team_id"])) or "Unknown Team") if r.get("team_id") else "N/A"
+            r["recipient_name"] = people.get(str(r.get("participant_id"))) or "Participant"
+            r["total_score"] = r.get("avg_score", 0)
+        return rows
+
+    async def get_live_top(self, event_id: str, k: int = 10):
+        """Top-K submissions by running average score, served from the rank index."""
+        rows = await score_aggregates_col.find({"event_id": event_id}).sort(
+            [("avg_score", -1), ("_id", 1)]
+        ).limit(k).to_list(k)
+        rows = await self._hydrate_names(rows)
+        previous_score, previous_rank = None, 0
+        for idx, r in enumerate(rows):
+            # Competition ranking: ties share a rank
+            if r["total_score"] != previous_score:
+                previous_score, previous_rank = r["total_score"], idx + 1
+            r["rank"] = previous_rank
+        return rows
+
+    async def get_live_rank(self, event_id: str, submission_id: str):
+        """
+        Live rank of one submission: the entries with a higher running average,
+        counted on the (event_id, avg_score) index, plus one. Ties share a rank,
+        the same competition ranking get_live_top uses, so both agree on every poll.
         """
-        # 1. Get all submissions for the event
-        submissions = await submissions_col.find({"event_id": event_id}).to_list(None)
-        if not submissions:
-            return []
-
-        rankings_data = []
-
-        for sub in submissions:
-            sub_id = str(sub["_id"])
-            
-            # 2. Get all scores for this submission
-            scores = await scores_col.find({"submission_id": sub_id}).to_list(None)
-            
-            if not scores:
-                avg_score = 0
-            else:
-                # 3. Calculate average score across all criteria and judges
-                total_points = 0
-                total_criteria = 0
-                
-                for s in scores:
-                    points_dict = s.get("scores", {})
-                    total_points += sum(points_dict.values())
-                    total_criteria += len(points_dict)
-                
-                avg_score = round(total_points / total_criteria, 2) if total_criteria > 0 else 0
-
-            # Fetch names for integration
-            team_name = "N/A"
-            recipient_name = "Participant"
-            
-            if sub.get("team_id"):
-                from db import teams_col
-                team = await teams_col.find_one({"_id": ObjectId(sub["team_id"])})
-                team_name = team.get("team_name", "Unknown Team") if team else "Unknown Team"
-            
-            if sub.get("participant_id"):
-                from db import participants_col
-                p = await participants_col.find_one({"_id": ObjectId(sub["participant_id"])})
-                recipient_name = p.get("full_name", "Participant") if p else "Participant"
-
-            rankings_data.append({
-                "event_id": event_id,
-                "team_id": sub.get("team_id"),
-                "participant_id": sub.get("participant_id"),
-                "participation_type": "TEAM" if sub.get("team_id") else "INDIVIDUAL",
-                "team_name": team_name,
-                "recipient_name": recipient_name,
-                "total_score": avg_score,
-                "project_name": sub.get("project_name", "Unnamed Project"),
-                "last_updated": datetime.utcnow()
-            })
-
-        # 4. Sort by score descending
-        rankings_data.sort(key=lambda x: x["total_score"], reverse=True)
-
-        # 5. Assign ranks
-        for idx, entry in enumerate(rankings_data):
-            entry["rank"] = idx + 1
-
-        # 6. Atomic Sync: Clear old and insert new
-        await leaderboard_col.delete_many({"event_id": event_id})
-        if rankings_data:
-            await leaderboard_col.insert_many(rankings_data)
-
-        return rankings_data
+        row = await score_aggregates_col.find_one({"_id": submission_id, "event_id": event_id})
+        if not row:
+            return None
+        ahead = await score_aggregates_col.count_documents(
+            {"event_id": event_id, "avg_score": {"$gt": row.get("avg_score", 0)}}
+        )
+        entry = (await self._hydrate_names([row]))[0]
+        entry["rank"] = ahead + 1
+        return entry
 
 leaderboard_service = LeaderboardService()
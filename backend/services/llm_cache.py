@@ -0,0 +1,159 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from db import llm_cache_col
+from services.llm_gateway import llm_gateway
+
+logger = logging.getLogger("llm_cache")
+
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 2000))
+LLM_CACHE_DEFAULT_TTL = int(os.getenv("LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+LLM_CACHE_MONGO = os.getenv("LLM_CACHE_MONGO", "true").lower() in ("1", "true", "yes")
+
+
+class LLMResponseCache:
+    """
+    Content-addressed cache for LLM completions.
+    Key = sha256(model, messages, params). Tier 1 is an in-process LRU with
+    per-entry TTL; tier 2 (optional) is the `llm_cache` collection, which
+    carries a TTL index on `expires_at` so Mongo drops stale rows itself.
+    """
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, use_mongo: bool = LLM_CACHE_MONGO):
+        self.max_entries = max_entries
+        self.use_mongo = use_mongo
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.counters = {"memory_hits": 0, "mongo_hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def key_for(model: str, messages: List[Dict[str, str]], params: Optional[Dict[str, Any]] = None) -> str:
+        raw = json.dumps(
+            {"model": model, "messages": messages, "params": params or {}},
+            sort_keys=True,
+            ensure_ascii=True,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _memory_set(self, key: str, value: str, ttl: int):
+        self._entries[key] = (time.time() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self._memory_get(key)
+        if value is not None:
+            self.counters["memory_hits"] += 1
+            return value
+
+        if self.use_mongo:
+            try:
+                doc = await llm_cache_col.find_one({"_id": key})
+                if doc:
+                    expires_at = doc["expires_at"]
+                    if expires_at.tzinfo is None:
+                        expires_at = expires_at.replace(tzinfo=timezone.utc)
+                    remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+                    if remaining > 0:
+                        self._memory_set(key, doc["response"], int(remaining))
+                        self.counters["mongo_hits"] += 1
+                        return doc["response"]
+            except Exception as e:
+                logger.warning(f"LLM cache read failed: {e}")
+
+        self.counters["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: str, ttl: Optional[int] = None, model: str = ""):
+        ttl = ttl or LLM_CACHE_DEFAULT_TTL
+        self._memory_set(key, value, ttl)
+        if self.use_mongo:
+            now = datetime.now(timezone.utc)
+            try:
+                await llm_cache_col.update_one(
+                    {"_id": key},
+                    {"$set": {
+                        "response": value,
+                        "model": model,
+                        "created_at": now,
+                        "expires_at": now + timedelta(seconds=ttl),
+                    }},
+                    upsert=True
+                )
+            except Exception as e:
+                logger.warning(f"LLM cache write failed: {e}")
+
+    async def cached(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        producer: Callable[[], Awaitable[str]],
+        params: Optional[Dict[str, Any]] = None,
+        ttl: Optional[int] = None,
+        validate: Optional[Callable[[str], Any]] = None,
+    ) -> str:
+        """
+        Return the cached completion for this prompt or call `producer` and store it.
+        `validate` (e.g. json.loads) runs before storing so malformed output is never cached.
+        """
+        key = self.key_for(model, messages, params)
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        value = await producer()
+        if validate is not None:
+            validate(value)
+        await self.set(key, value, ttl, model=model)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["memory_hits"] + self.counters["mongo_hits"] + self.counters["misses"]
+        hits = lookups - self.counters["misses"]
+        return {
+            **self.counters,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "mongo_tier": self.use_mongo,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+llm_cache = LLMResponseCache()
+
+
+async def cached_completion(
+    messages: List[Dict[str, str]],
+    model: str = "llama-3.3-70b-versatile",
+    ttl: Optional[int] = None,
+    validate: Optional[Callable[[str], Any]] = None,
+    **params: Any,
+) -> str:
+    """Groq completion through the gateway, served from the cache when the prompt repeats."""
+    return await llm_cache.cached(
+        model,
+        messages,
+        lambda: llm_gateway.complete(messages, model=model, **params),
+        params=params,
+        ttl=ttl,
+        validate=validate,
+    )
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("llm_gateway")
+
+GROQ_API_KEY = os.getenv("GROQ_API_KEY", "YOUR-GROQ-API-KEY")
+GROQ_API_BASE = os.getenv("GROQ_API_BASE", "https://api.groq.com/openai/v1").rstrip("/")
+GROQ_INTERVIEW_MODEL = os.getenv("GROQ_INTERVIEW_MODEL", "llama-3.3-70b-versatile")
+
+XAI_API_KEY = os.getenv("XAI_API_KEY") or os.getenv("GROK_API_KEY")
+XAI_API_BASE = os.getenv("XAI_API_BASE", "https://api.x.ai/v1").rstrip("/")
+GROK_MODEL = os.getenv("GROK_MODEL", "grok-3-mini")
+
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 45))
+# How long an attempt may run before the next candidate is launched alongside it.
+LLM_HEDGE_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_DELAY_SECONDS", 6))
+PROVIDER_CONCURRENCY = {
+    "xai": int(os.getenv("LLM_XAI_MAX_CONCURRENCY", 8)),
+    "groq": int(os.getenv("LLM_GROQ_MAX_CONCURRENCY", 8)),
+}
+
+Attempt = Tuple[str, Callable[[], Awaitable[str]]]
+
+
+def grok_model_candidates() -> List[str]:
+    candidates = [
+        GROK_MODEL,
+        os.getenv("GROK_FALLBACK_MODEL"),
+        "grok-2-latest",
+        "grok-beta",
+    ]
+    deduped: List[str] = []
+    for candidate in candidates:
+        if candidate and candidate not in deduped:
+            deduped.append(candidate)
+    return deduped
+
+
+def groq_key_chain(api_key: Optional[str] = None) -> List[str]:
+    """User supplied key first, then the server key (if configured)."""
+    keys: List[str] = []
+    for key in (api_key, GROQ_API_KEY):
+        if key and key != "YOUR-GROQ-API-KEY" and key not in keys:
+            keys.append(key)
+    return keys
+
+
+class LLMGateway:
+    """
+    Non-blocking chat-completions client shared by the whole worker.
+    One pooled httpx.AsyncClient, a semaphore per provider, and hedged
+    fallback: if an attempt fails, or is still running after the hedge
+    delay, the next candidate is started and the first success wins.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._limits = {name: asyncio.Semaphore(size) for name, size in PROVIDER_CONCURRENCY.items()}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=10.0),
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=16),
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    async def _post(self, provider: str, url: str, key: str, payload: Dict[str, Any]) -> str:
+        async with self._limits[provider]:
+            response = await self._get_client().post(
+                url,
+                headers={"Authorization": f"Bearer {key}", "Content-Type": "application/json"},
+                json=payload,
+            )
+        if response.status_code >= 400:
+            raise RuntimeError(f"{response.status_code} {response.text[:180]}")
+        return response.json()["choices"][0]["message"]["content"].strip()
+
+    def _groq_attempt(self, key: str, model: str, payload: Dict[str, Any], label: str) -> Attempt:
+        body = {**payload, "model": model}
+        return label, lambda: self._post("groq", f"{GROQ_API_BASE}/chat/completions", key, body)
+
+    def _xai_attempt(self, model: str, payload: Dict[str, Any]) -> Attempt:
+        body = {**payload, "model": model}
+        return model, lambda: self._post("xai", f"{XAI_API_BASE}/chat/completions", XAI_API_KEY, body)
+
+    async def _hedged(self, attempts: List[Attempt], hedge_delay: float) -> str:
+        errors: List[str] = []
+        remaining = iter(attempts)
+        labels: Dict[asyncio.Task, str] = {}
+        pending: set = set()
+
+        def launch() -> bool:
+            attempt = next(remaining, None)
+            if attempt is None:
+                return False
+            label, factory = attempt
+            task = asyncio.create_task(factory())
+            labels[task] = label
+            pending.add(task)
+            return True
+
+        launch()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch()
+                    continue
+                for task in done:
+                    pending.discard(task)
+                    if task.exception() is None:
+                        return task.result()
+                    errors.append(f"{labels[task]}: {task.exception()}")
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise RuntimeError(" | ".join(errors[:3]) or "Missing xAI/Grok and Groq credentials for interview generation")
+
+    async def chat(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.4,
+        max_tokens: int = 900,
+        api_key: Optional[str] = None,
+        response_format: Optional[Dict[str, str]] = None,
+    ) -> str:
+        """
+        Interview chain: user Groq key -> xAI model candidates -> server Groq key.
+        """
+        payload: Dict[str, Any] = {"messages": messages, "temperature": temperature, "max_tokens": max_tokens}
+        if response_format:
+            payload["response_format"] = response_format
+
+        attempts: List[Attempt] = []
+        if api_key:
+            attempts.append(self._groq_attempt(api_key, GROQ_INTERVIEW_MODEL, payload, "Groq User Key"))
+        if XAI_API_KEY:
+            attempts.extend(self._xai_attempt(model, payload) for model in grok_model_candidates())
+        server_keys = [k for k in groq_key_chain() if k != api_key]
+        for key in server_keys:
+            attempts.append(self._groq_attempt(key, GROQ_INTERVIEW_MODEL, payload, f"groq:{GROQ_INTERVIEW_MODEL}"))
+
+        return await self._hedged(attempts, LLM_HEDGE_DELAY_SECONDS)
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "llama-3.3-70b-versatile",
+        api_key: Optional[str] = None,
+        **params: Any,
+    ) -> str:
+        """Single Groq model, falling back across the Groq key chain."""
+        payload: Dict[str, Any] = {"messages": messages, **{k: v for k, v in params.items() if v is not None}}
+        attempts = [self._groq_attempt(key, model, payload, f"groq:{model}") for key in groq_key_chain(api_key)]
+        return await self._hedged(attempts, LLM_HEDGE_DELAY_SECONDS)
+
+
+llm_gateway = LLMGateway()
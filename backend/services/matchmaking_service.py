@@ -0,0 +1,277 @@
+import asyncio
+import heapq
+import logging
+import math
+import os
+import re
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from bson import ObjectId
+
+from db import participants_col, teams_col
+
+logger = logging.getLogger("matchmaking_service")
+
+MATCHMAKING_INDEX_TTL = int(os.getenv("MATCHMAKING_INDEX_TTL", 60))
+MATCHMAKING_MAX_EVENTS = int(os.getenv("MATCHMAKING_MAX_EVENTS", 200))
+# Share of the score that rewards covering the team's gaps vs. bringing new skills at all
+COVERAGE_WEIGHT = 0.7
+COMPLEMENT_WEIGHT = 0.3
+# Named proficiency levels (models use Beginner/Intermediate/Advanced) -> vector weight
+SKILL_LEVELS: Dict[str, float] = {"beginner": 0.5, "intermediate": 0.75, "advanced": 1.0, "expert": 1.0}
+
+# alias -> canonical skill
+SKILL_SYNONYMS: Dict[str, str] = {
+    "js": "javascript", "ecmascript": "javascript", "es6": "javascript", "node": "nodejs", "node js": "nodejs",
+    "ts": "typescript", "reactjs": "react", "react js": "react", "react native": "react-native",
+    "vuejs": "vue", "vue js": "vue", "angularjs": "angular", "nextjs": "next", "next js": "next",
+    "py": "python", "python3": "python", "golang": "go", "c++": "cpp", "cplusplus": "cpp", "c#": "csharp",
+    "dotnet": ".net", "ml": "machine-learning", "machine learning": "machine-learning",
+    "dl": "deep-learning", "deep learning": "deep-learning", "ai": "artificial-intelligence",
+    "artificial intelligence": "artificial-intelligence", "nlp": "natural-language-processing",
+    "cv": "computer-vision", "computer vision": "computer-vision", "ds": "data-science",
+    "data science": "data-science", "mongo": "mongodb", "postgres": "postgresql", "psql": "postgresql",
+    "k8s": "kubernetes", "aws": "amazon-web-services", "gcp": "google-cloud", "ui": "ui-design",
+    "ux": "ux-design", "ui/ux": "ui-design", "figma design": "figma", "html5": "html", "css3": "css",
+    "tailwindcss": "tailwind", "sklearn": "scikit-learn", "tf": "tensorflow", "fe": "frontend",
+    "front end": "frontend", "front-end": "frontend", "be": "backend", "back end": "backend",
+    "back-end": "backend", "fullstack": "full-stack", "full stack": "full-stack", "devops engineer": "devops",
+}
+_SPACE_RE = re.compile(r"[\s_]+")
+
+
+def normalize_skill(raw: str) -> str:
+    skill = _SPACE_RE.sub(" ", str(raw or "").strip().lower())
+    skill = SKILL_SYNONYMS.get(skill, skill)
+    if skill.endswith(".js") and len(skill) > 3:
+        base = skill[:-3]
+        skill = SKILL_SYNONYMS.get(base + "js", SKILL_SYNONYMS.get(base, base))
+    return skill
+
+
+def _level_weight(level) -> float:
+    if level is None or level == "":
+        return 1.0
+    if isinstance(level, str) and level.strip().lower() in SKILL_LEVELS:
+        return SKILL_LEVELS[level.strip().lower()]
+    try:
+        return float(level)
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def skill_vector(raw: Iterable) -> Dict[str, float]:
+    """Sparse vector from a skill list (or comma string); entries may be {"name", "level"} dicts."""
+    if isinstance(raw, str):
+        raw = raw.split(",")
+    vector: Dict[str, float] = {}
+    for item in raw or []:
+        if isinstance(item, dict):
+            name, weight = item.get("name") or item.get("skill"), _level_weight(item.get("level"))
+        else:
+            name, weight = item, 1.0
+        skill = normalize_skill(name)
+        if skill:
+            vector[skill] = max(vector.get(skill, 0.0), weight)
+    return vector
+
+
+class EventSkillIndex:
+    """Participants of one event with an inverted index skill -> unteamed user ids."""
+
+    def __init__(self, event_id: str):
+        self.event_id = event_id
+        self.people: Dict[str, dict] = {}
+        self.unteamed_by_skill: Dict[str, Set[str]] = {}
+        self.members_by_team: Dict[str, Set[str]] = {}
+        self.doc_freq: Dict[str, int] = {}
+        self.loaded_at = 0.0
+
+    def upsert(self, p: dict):
+        user_id = str(p.get("user_id") or "")
+        if not user_id:
+            return
+        self.remove(user_id)
+        vector = skill_vector(p.get("skills"))
+        person = {
+            "_id": str(p.get("_id") or ""),
+            "user_id": user_id,
+            "full_name": p.get("full_name") or p.get("name"),
+            "college_name": p.get("college_name"),
+            "department": p.get("department"),
+            "skills": p.get("skills") or [],
+            "team_id": str(p["team_id"]) if p.get("team_id") else None,
+            "vector": vector,
+        }
+        self.people[user_id] = person
+        if person["team_id"]:
+            self.members_by_team.setdefault(person["team_id"], set()).add(user_id)
+        for skill in vector:
+            self.doc_freq[skill] = self.doc_freq.get(skill, 0) + 1
+            if person["team_id"] is None:
+                self.unteamed_by_skill.setdefault(skill, set()).add(user_id)
+
+    def remove(self, user_id: str):
+        person = self.people.pop(user_id, None)
+        if not person:
+            return
+        team = self.members_by_team.get(person["team_id"]) if person["team_id"] else None
+        if team is not None:
+            team.discard(user_id)
+            if not team:
+                del self.members_by_team[person["team_id"]]
+        for skill in person["vector"]:
+            self.doc_freq[skill] -= 1
+            members = self.unteamed_by_skill.get(skill)
+            if members is not None:
+                members.discard(user_id)
+                if not members:
+                    del self.unteamed_by_skill[skill]
+
+    def set_team(self, user_id: str, team_id: Optional[str]):
+        person = self.people.get(user_id)
+        if person:
+            self.upsert({**person, "team_id": team_id})
+
+    def idf(self, skill: str) -> float:
+        # Rare skills are worth more when filling a gap
+        return math.log(1 + len(self.people) / (1 + self.doc_freq.get(skill, 0))) + 1.0
+
+
+class MatchmakingService:
+    """
+    Teammate suggestions from sparse skill vectors.
+
+    Each event's participants are held in an in-memory EventSkillIndex, loaded
+    with one projected query and then kept current by registration / team-join
+    hooks (plus a TTL reload, since other workers can write too). A query only
+    scores unteamed participants reachable through the inverted index from the
+    team's missing skills, and picks the top k with a heap.
+    """
+
+    def __init__(self, ttl: int = MATCHMAKING_INDEX_TTL):
+        self.ttl = ttl
+        self._indexes: Dict[str, EventSkillIndex] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def _load(self, event_id: str) -> EventSkillIndex:
+        index = EventSkillIndex(event_id)
+        projection = {"user_id": 1, "full_name": 1, "name": 1, "college_name": 1, "department": 1, "skills": 1, "team_id": 1}
+        async for p in participants_col.find({"event_id": event_id}, projection):
+            index.upsert(p)
+        index.loaded_at = time.monotonic()
+        return index
+
+    async def get_index(self, event_id: str) -> EventSkillIndex:
+        index = self._indexes.get(event_id)
+        if index is not None and time.monotonic() - index.loaded_at < self.ttl:
+            return index
+        lock = self._locks.setdefault(event_id, asyncio.Lock())
+        async with lock:
+            index = self._indexes.get(event_id)
+            if index is None or time.monotonic() - index.loaded_at >= self.ttl:
+                index = await self._load(event_id)
+                if len(self._indexes) >= MATCHMAKING_MAX_EVENTS and event_id not in self._indexes:
+                    oldest = min(self._indexes, key=lambda e: self._indexes[e].loaded_at)
+                    self._indexes.pop(oldest, None)
+                self._indexes[event_id] = index
+        return index
+
+    # --- Refresh hooks (no-ops for events not currently indexed) ---
+
+    def on_registered(self, participant: dict):
+        index = self._indexes.get(str(participant.get("event_id") or ""))
+        if index is not None:
+            index.upsert(participant)
+
+    def on_team_joined(self, event_id: str, user_id: str, team_id: Optional[str]):
+        index = self._indexes.get(str(event_id))
+        if index is not None:
+            index.set_team(str(user_id), str(team_id) if team_id else None)
+
+    def invalidate(self, event_id: str):
+        self._indexes.pop(str(event_id), None)
+
+    # --- Queries ---
+
+    async def _team_vector(self, index: EventSkillIndex, team_id: str) -> Dict[str, float]:
+        members = [index.people[u] for u in index.members_by_team.get(team_id, ())]
+        if not members and ObjectId.is_valid(team_id):
+            team = await teams_col.find_one({"_id": ObjectId(team_id)}, {"members": 1})
+            ids = {str(m.get("user_id") if isinstance(m, dict) else m) for m in (team or {}).get("members") or []}
+            members = [index.people[u] for u in ids if u in index.people]
+        covered: Dict[str, float] = {}
+        for member in members:
+            for skill, weight in member["vector"].items():
+                covered[skill] = max(covered.get(skill, 0.0), weight)
+        return covered
+
+    async def suggest(
+        self,
+        event_id: str,
+        skills: Optional[str] = None,
+        user_id: Optional[str] = None,
+        limit: int = 10,
+    ) -> List[dict]:
+        index = await self.get_index(event_id)
+
+        covered: Dict[str, float] = {}
+        requester = index.people.get(str(user_id)) if user_id else None
+        if requester:
+            covered = (await self._team_vector(index, requester["team_id"])) if requester["team_id"] else dict(requester["vector"])
+
+        wanted = skill_vector(skills) if skills else {}
+        gaps = {s for s in wanted if s not in covered}
+        if not wanted:
+            # No explicit ask: every skill present in the event the team lacks is a gap
+            gaps = {s for s in index.unteamed_by_skill if s not in covered}
+        weights = {s: index.idf(s) for s in gaps}
+        gap_weight = sum(weights.values()) or 1.0
+
+        exclude = {requester["user_id"]} if requester else set()
+        candidate_ids: Set[str] = set()
+        for skill in gaps:
+            candidate_ids |= index.unteamed_by_skill.get(skill, set())
+        candidate_ids -= exclude
+
+        def score(uid: str) -> float:
+            vector = index.people[uid]["vector"]
+            coverage = sum(w * min(vector[s], 1.0) for s, w in weights.items() if s in vector) / gap_weight
+            complement = sum(1 for s in vector if s not in covered) / len(vector) if vector else 0.0
+            return COVERAGE_WEIGHT * coverage + COMPLEMENT_WEIGHT * complement
+
+        top = heapq.nlargest(max(limit, 1), ((score(uid), uid) for uid in candidate_ids))
+        # The index can lag team joins made outside the team routes; re-check the picks
+        for _ in range(3):
+            picked = [uid for _, uid in top]
+            if not picked:
+                break
+            stale = participants_col.find(
+                {"event_id": event_id, "user_id": {"$in": picked}, "team_id": {"$nin": [None, ""]}},
+                {"user_id": 1, "team_id": 1},
+            )
+            joined = [p async for p in stale]
+            if not joined:
+                break
+            for p in joined:
+                index.set_team(str(p["user_id"]), str(p["team_id"]))
+                candidate_ids.discard(str(p["user_id"]))
+            top = heapq.nlargest(max(limit, 1), ((score(uid), uid) for uid in candidate_ids))
+        results = []
+        for value, uid in top:
+            person = index.people[uid]
+            results.append({
+                "_id": person["_id"],
+                "user_id": uid,
+                "full_name": person["full_name"],
+                "college_name": person["college_name"],
+                "department": person["department"],
+                "skills": person["skills"],
+                "match_score": round(value, 4),
+                "fills_gaps": sorted(s for s in gaps if s in person["vector"]),
+            })
+        return results
+
+
+matchmaking_service = MatchmakingService()
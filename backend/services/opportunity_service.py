@@ -1,4 +1,3 @@
-import asyncio
 
 from db import db, events_col, users_col, notifications_col, institutions_col
 from models import Opportunity, OpportunityApplication
@@ -6,7 +5,9 @@ from bson import ObjectId
 from datetime import datetime
 from typing import List, Optional
 
-from services.email_service import send_notification_email
+from services.email_outbox import queue_notification_email
+from services.matchmaking_service import matchmaking_service
+from services.institution_stats_service import institution_stats_service
 
 opportunities_col = db["opportunities"]
 opportunity_applications_col = db["opportunity_applications"]
@@ -80,7 +81,7 @@ async def _notify_portal_review(app: dict, opp: dict, new_status: str) -> None:
         subj = f"Application update: {title}"
         body = f"""<html><body style="font-family:system-ui,sans-serif;color:#111827"><p>{msg}</p>
         <p>Open Studlyf → Opportunities → My applications to review your status.</p></body></html>"""
-        asyncio.create_task(send_notification_email(email, subj, body))
+        await queue_notification_email(email, subj, body)
 
 # Event must be published-like for learners to see the mirrored listing
 _LISTABLE_EVENT_STATUSES = frozenset({"LIVE", "PUBLISHED", "ACTIVE", "UPCOMING"})
@@ -428,23 +429,24 @@ async def apply_for_opportunity(application_data: dict) -> dict:
                             first_stage = st[0].get("name") or st[0].get("id")
                     except Exception:
                         first_stage = None
-                    await participants_col.insert_one(
-                        {
-                            "event_id": str(eid),
-                            "institution_id": inst,
-                            "user_id": uid,
-                            "full_name": application_data.get("name"),
-                            "name": application_data.get("name"),
-                            "email": application_data.get("email"),
-                            "event_title": ev.get("title"),
-                            "registered_at": application_data["applied_at"],
-                            "status": "pending",
-                            "current_stage": first_stage or "Registration",
-                            "resume_url": application_data.get("resume_url"),
-                            "source": "opportunity_portal",
-                            "opportunity_application_id": app_id_str,
-                        }
-                    )
+                    participant_doc = {
+                        "event_id": str(eid),
+                        "institution_id": inst,
+                        "user_id": uid,
+                        "full_name": application_data.get("name"),
+                        "name": application_data.get("name"),
+                        "email": application_data.get("email"),
+                        "event_title": ev.get("title"),
+                        "registered_at": application_data["applied_at"],
+                        "status": "pending",
+                        "current_stage": first_stage or "Registration",
+                        "resume_url": application_data.get("resume_url"),
+                        "source": "opportunity_portal",
+                        "opportunity_application_id": app_id_str,
+                    }
+                    await participants_col.insert_one(participant_doc)
+                    matchmaking_service.on_registered(participant_doc)
+                    await institution_stats_service.increment(ev.get("institution_id"), total_participants=1)
     except Exception:
         pass
 
@@ -581,22 +583,23 @@ async def backfill_portal_participants_for_institution(institution_id: str) -> d
             dup = await participants_col.find_one({"event_id": eid, "user_id": uid})
             if dup:
                 continue
-            await participants_col.insert_one(
-                {
-                    "event_id": eid,
-                    "institution_id": app.get("institution_id") or inst,
-                    "user_id": uid,
-                    "full_name": app.get("name"),
-                    "name": app.get("name"),
-                    "email": app.get("email"),
-                    "event_title": ev.get("title"),
-                    "registered_at": app.get("applied_at") or datetime.utcnow(),
-                    "status": app.get("status", "pending"),
-                    "resume_url": app.get("resume_url"),
-                    "source": "opportunity_portal_backfill",
-                    "opportunity_application_id": str(app["_id"]),
-                }
-            )
+            participant_doc = {
+                "event_id": eid,
+                "institution_id": app.get("institution_id") or inst,
+                "user_id": uid,
+                "full_name": app.get("name"),
+                "name": app.get("name"),
+                "email": app.get("email"),
+                "event_title": ev.get("title"),
+                "registered_at": app.get("applied_at") or datetime.utcnow(),
+                "status": app.get("status", "pending"),
+                "resume_url": app.get("resume_url"),
+                "source": "opportunity_portal_backfill",
+                "opportunity_application_id": str(app["_id"]),
+            }
+            await participants_col.insert_one(participant_doc)
+            matchmaking_service.on_registered(participant_doc)
+            await institution_stats_service.increment(ev.get("institution_id"), total_participants=1)
             inserted += 1
     return {"status": "success", "participants_inserted": inserted}
 
@@ -0,0 +1,171 @@
+"""
+Pure fingerprinting functions for the plagiarism engine.
+
+Kept free of database/framework imports so they can run inside a
+ProcessPoolExecutor. Pipeline: normalise -> token k-grams -> winnowing
+fingerprints -> MinHash signature -> LSH band keys.
+"""
+import hashlib
+import io
+import re
+import zipfile
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+KGRAM = 5            # tokens per k-gram
+WINDOW = 4           # winnowing window (guarantees any shared run of KGRAM+WINDOW-1 tokens is caught)
+NUM_PERM = 128       # MinHash permutations
+BANDS = 32           # LSH bands (rows per band = NUM_PERM // BANDS)
+ROWS = NUM_PERM // BANDS
+MAX_FINGERPRINTS = 8000
+_MERSENNE = (1 << 61) - 1
+_MASK63 = (1 << 63) - 1
+
+CODE_EXTENSIONS = {
+    ".py", ".js", ".jsx", ".ts", ".tsx", ".java", ".c", ".h", ".cpp", ".hpp", ".cc", ".cs", ".go",
+    ".rs", ".rb", ".php", ".kt", ".swift", ".scala", ".sql", ".sh", ".html", ".css", ".vue", ".dart",
+}
+TEXT_EXTENSIONS = {".md", ".txt", ".rst"}
+MAX_FILE_BYTES = 256 * 1024
+MAX_ARCHIVE_TEXT = 4 * 1024 * 1024
+
+_KEYWORDS = {
+    "if", "else", "elif", "for", "while", "do", "return", "def", "class", "function", "const", "let", "var",
+    "import", "from", "export", "public", "private", "protected", "static", "void", "int", "float", "double",
+    "char", "bool", "boolean", "string", "new", "try", "catch", "except", "finally", "throw", "raise", "switch",
+    "case", "break", "continue", "in", "of", "and", "or", "not", "is", "lambda", "async", "await", "yield",
+    "struct", "enum", "interface", "extends", "implements", "package", "fn", "func", "with", "as", "pass",
+    "true", "false", "null", "none", "nil", "self", "this", "print", "println", "printf", "main",
+}
+_COMMENT_RE = re.compile(r"/\*.*?\*/|//[^\n]*|#[^\n]*|<!--.*?-->", re.S)
+_STRING_RE = re.compile(r"\"\"\".*?\"\"\"|'''.*?'''|\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'|`(?:\\.|[^`\\])*`", re.S)
+_CODE_TOKEN_RE = re.compile(r"[A-Za-z_]\w*|\d+(?:\.\d+)?|==|!=|<=|>=|&&|\|\||->|=>|[{}()\[\];,.=+\-*/<>%!&|^~?:]")
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# Deterministic MinHash permutation coefficients
+_PERMS: List[Tuple[int, int]] = []
+for _i in range(NUM_PERM):
+    _digest = hashlib.blake2b(f"perm-{_i}".encode(), digest_size=16).digest()
+    _PERMS.append((int.from_bytes(_digest[:8], "big") % (_MERSENNE - 1) + 1, int.from_bytes(_digest[8:], "big") % _MERSENNE))
+
+
+def normalize_code(source: str) -> List[str]:
+    """Drop comments, collapse literals and rename identifiers so renames and reformatting don't hide copies."""
+    source = _STRING_RE.sub(" S ", source)
+    source = _COMMENT_RE.sub(" ", source)
+    tokens = []
+    for tok in _CODE_TOKEN_RE.findall(source):
+        low = tok.lower()
+        if low in _KEYWORDS:
+            tokens.append(low)
+        elif tok[0].isdigit():
+            tokens.append("N")
+        elif tok[0].isalpha() or tok[0] == "_":
+            tokens.append("V")
+        else:
+            tokens.append(tok)
+    return tokens
+
+
+def normalize_text(text: str) -> List[str]:
+    return [w for w in _WORD_RE.findall(text.lower()) if len(w) > 2]
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big") & _MASK63
+
+
+def winnow(tokens: List[str], k: int = KGRAM, window: int = WINDOW) -> Set[int]:
+    """Winnowing (Schleimer et al.): keep the minimum k-gram hash of every window."""
+    if len(tokens) < k:
+        return {_hash64(" ".join(tokens))} if tokens else set()
+    hashes = [_hash64(" ".join(tokens[i:i + k])) for i in range(len(tokens) - k + 1)]
+    if len(hashes) <= window:
+        return {min(hashes)}
+    selected: Set[int] = set()
+    for i in range(len(hashes) - window + 1):
+        selected.add(min(hashes[i:i + window]))
+    return selected
+
+
+def minhash(fingerprints: Iterable[int]) -> List[int]:
+    values = list(fingerprints)
+    if not values:
+        return [_MERSENNE] * NUM_PERM
+    return [min((a * v + b) % _MERSENNE for v in values) for a, b in _PERMS]
+
+
+def band_keys(signature: List[int]) -> List[str]:
+    """One bucket key per LSH band."""
+    return [
+        hashlib.blake2b(",".join(map(str, signature[b * ROWS:(b + 1) * ROWS])).encode(), digest_size=8).hexdigest()
+        for b in range(BANDS)
+    ]
+
+
+def extract_archive(source: Union[bytes, str]) -> List[Tuple[str, str]]:
+    """(path, text) for the source/text files inside a zip (raw bytes or a file path), size-capped."""
+    files: List[Tuple[str, str]] = []
+    total = 0
+    try:
+        with zipfile.ZipFile(io.BytesIO(source) if isinstance(source, bytes) else source) as archive:
+            for info in archive.infolist():
+                name = info.filename
+                ext = "." + name.rsplit(".", 1)[-1].lower() if "." in name else ""
+                if info.is_dir() or info.file_size > MAX_FILE_BYTES or ext not in CODE_EXTENSIONS | TEXT_EXTENSIONS:
+                    continue
+                if any(part in ("node_modules", "__pycache__", ".git", "dist", "build", "venv") for part in name.split("/")):
+                    continue
+                text = archive.read(info).decode("utf-8", errors="ignore")
+                total += len(text)
+                if total > MAX_ARCHIVE_TEXT:
+                    break
+                files.append((name, text))
+    except (zipfile.BadZipFile, OSError):
+        pass
+    return files
+
+
+def fingerprint_document(parts: List[Dict[str, str]], archives: Optional[List[Union[bytes, str]]] = None) -> Dict[str, object]:
+    """
+    parts: [{"kind": "code"|"text", "content": ...}]; archives: zip file paths (or raw bytes).
+    Returns fingerprints (sorted, capped) plus MinHash signature and LSH band keys.
+    """
+    fingerprints: Set[int] = set()
+    token_count = 0
+    for part in parts:
+        tokens = normalize_code(part["content"]) if part.get("kind") == "code" else normalize_text(part["content"])
+        token_count += len(tokens)
+        fingerprints |= winnow(tokens)
+    for data in archives or []:
+        for name, text in extract_archive(data):
+            ext = "." + name.rsplit(".", 1)[-1].lower()
+            tokens = normalize_code(text) if ext in CODE_EXTENSIONS else normalize_text(text)
+            token_count += len(tokens)
+            fingerprints |= winnow(tokens)
+
+    ordered = sorted(fingerprints)[:MAX_FINGERPRINTS]
+    signature = minhash(ordered)
+    return {
+        "fingerprints": ordered,
+        "signature": signature,
+        "bands": band_keys(signature) if ordered else [],
+        "token_count": token_count,
+    }
+
+
+def compare(a: List[int], b: List[int]) -> Dict[str, float]:
+    sa, sb = set(a), set(b)
+    if not sa or not sb:
+        return {"jaccard": 0.0, "containment": 0.0, "shared": 0}
+    shared = len(sa & sb)
+    return {
+        "jaccard": round(shared / len(sa | sb), 4),
+        # Share of the smaller document found in the other (catches copied subsets)
+        "containment": round(shared / min(len(sa), len(sb)), 4),
+        "shared": shared,
+    }
+
+
+def compare_candidates(pairs: List[Tuple[str, str]], fingerprints: Dict[str, List[int]]) -> List[Tuple[str, str, Dict[str, float]]]:
+    """Exact comparison of LSH candidate pairs (process-pool friendly batch)."""
+    return [(a, b, compare(fingerprints[a], fingerprints[b])) for a, b in pairs]
@@ -0,0 +1,391 @@
+import asyncio
+import logging
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import AsyncExitStack
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from db import (
+    participants_col,
+    plagiarism_fingerprints_col,
+    plagiarism_pairs_col,
+    plagiarism_runs_col,
+    submission_data_col,
+    submissions_col,
+)
+from services import plagiarism_engine
+from services.blob_store import blob_store
+from services.upload_service import key_from_url
+
+logger = logging.getLogger("plagiarism_service")
+
+PLAGIARISM_WORKERS = int(os.getenv("PLAGIARISM_WORKERS", max((os.cpu_count() or 2) - 1, 1)))
+# Containment (share of the smaller submission found in the other) reported as a match
+PLAGIARISM_MATCH_THRESHOLD = float(os.getenv("PLAGIARISM_MATCH_THRESHOLD", 0.3))
+PLAGIARISM_HIGH_THRESHOLD = float(os.getenv("PLAGIARISM_HIGH_THRESHOLD", 0.6))
+PLAGIARISM_MAX_ARCHIVE_BYTES = int(os.getenv("PLAGIARISM_MAX_ARCHIVE_BYTES", 25 * 1024 * 1024))
+PLAGIARISM_COMPARE_CHUNK = 2000
+# Submissions fingerprinted per round; bounds how many archive files are open (or spooled) at once
+PLAGIARISM_BATCH_SIZE = 50
+PLAGIARISM_MAX_MATCHES = 10
+
+# Free-text and code-bearing fields a submission document may carry
+_TEXT_FIELDS = ("project_description", "description", "abstract", "writeup")
+_CODE_FIELDS = ("code", "source_code", "solution")
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PLAGIARISM_WORKERS)
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _pair_id(a: str, b: str) -> Tuple[str, str, str]:
+    a, b = sorted((a, b))
+    return f"{a}|{b}", a, b
+
+
+class PlagiarismService:
+    """
+    Code-similarity checks for event submissions.
+
+    Each submission is reduced to a document (its written fields, code-bearing
+    stage uploads such as zipped repositories, and the coding answers its
+    authors gave in event quizzes), normalised so renamed identifiers and
+    reformatting don't hide copies, and fingerprinted with winnowing. A MinHash
+    signature of the fingerprints is split into LSH bands stored alongside them
+    in `plagiarism_fingerprints`, so candidate pairs inside an event come from a
+    multikey index lookup instead of comparing every submission with every other.
+    Candidates are then scored exactly on their fingerprints and recorded in
+    `plagiarism_pairs`. Fingerprinting is CPU-bound and runs in a process pool.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    # --- Document assembly ---
+
+    async def _archive_key(self, file_url: str) -> Optional[str]:
+        """Blob key of a zipped upload worth fingerprinting; workers open it by path, never by value."""
+        key = key_from_url(file_url)
+        if not key or not key.lower().endswith(".zip"):
+            return None
+        stat = await blob_store.stat(key)
+        if stat is None or stat[0] == 0 or stat[0] > PLAGIARISM_MAX_ARCHIVE_BYTES:
+            return None
+        return key
+
+    async def _collect(self, sub: dict, uploads: List[dict], attempts: List[dict]) -> Tuple[List[dict], List[str], List[str]]:
+        """Split one submission's material into (parts, archive blob keys, source labels)."""
+        parts: List[dict] = []
+        archives: List[str] = []
+        sources: List[str] = []
+
+        for field in _TEXT_FIELDS:
+            if isinstance(sub.get(field), str) and sub[field].strip():
+                parts.append({"kind": "text", "content": sub[field]})
+                sources.append(field)
+        for field in _CODE_FIELDS:
+            if isinstance(sub.get(field), str) and sub[field].strip():
+                parts.append({"kind": "code", "content": sub[field]})
+                sources.append(field)
+
+        for entry in uploads:
+            data = entry.get("data") or {}
+            archive = await self._archive_key(str(data.get("file_url") or ""))
+            if archive:
+                archives.append(archive)
+                sources.append(f"stage:{entry.get('stage_id')}:{data.get('filename') or 'upload'}")
+            for key, value in data.items():
+                if key in _CODE_FIELDS and isinstance(value, str) and value.strip():
+                    parts.append({"kind": "code", "content": value})
+                    sources.append(f"stage:{entry.get('stage_id')}:{key}")
+
+        seen_code: Set[str] = set()
+        for attempt in attempts:
+            for answer in attempt.get("coding_answers") or []:
+                code = (answer.get("code") or "").strip()
+                if code and code not in seen_code:
+                    seen_code.add(code)
+                    parts.append({"kind": "code", "content": code})
+                    sources.append(f"quiz:{attempt.get('quiz_id')}:q{answer.get('q_index')}")
+        return parts, archives, sources
+
+    async def _related(self, event_id: str, subs: List[dict]) -> Tuple[Dict[str, List[dict]], Dict[str, List[dict]]]:
+        """Stage uploads and quiz attempts for a batch of submissions, two queries in total."""
+        team_ids = sorted({str(s["team_id"]) for s in subs if s.get("team_id")})
+        user_ids = sorted({str(s.get("user_id") or s.get("participant_id")) for s in subs
+                           if not s.get("team_id") and (s.get("user_id") or s.get("participant_id"))})
+        owners: List[dict] = []
+        if team_ids:
+            owners.append({"team_id": {"$in": team_ids}})
+        if user_ids:
+            owners.append({"user_id": {"$in": user_ids}})
+
+        uploads: Dict[str, List[dict]] = {}
+        attempts: Dict[str, List[dict]] = {}
+        if not owners:
+            return uploads, attempts
+
+        query = {"event_id": event_id, "$or": owners}
+        async for entry in submission_data_col.find(query, {"team_id": 1, "user_id": 1, "stage_id": 1, "data": 1}):
+            owner = f"team:{entry['team_id']}" if entry.get("team_id") else f"user:{entry.get('user_id')}"
+            uploads.setdefault(owner, []).append(entry)
+        async for p in participants_col.find(query, {"team_id": 1, "user_id": 1, "quiz_attempts": 1}):
+            for owner in (f"team:{p['team_id']}" if p.get("team_id") else None, f"user:{p.get('user_id')}"):
+                if owner:
+                    attempts.setdefault(owner, []).extend(p.get("quiz_attempts") or [])
+        return uploads, attempts
+
+    @staticmethod
+    def _owner_key(sub: dict) -> str:
+        if sub.get("team_id"):
+            return f"team:{sub['team_id']}"
+        return f"user:{sub.get('user_id') or sub.get('participant_id')}"
+
+    async def _fingerprint(self, subs: List[dict]) -> Dict[str, dict]:
+        """Fingerprint submissions of one event in the process pool and upsert them into the LSH index."""
+        if not subs:
+            return {}
+        event_id = str(subs[0].get("event_id") or "")
+        uploads, attempts = await self._related(event_id, subs)
+        loop = asyncio.get_running_loop()
+        pool = _get_pool()
+
+        jobs = []
+        async with AsyncExitStack() as files:
+            for sub in subs:
+                owner = self._owner_key(sub)
+                parts, archive_keys, sources = await self._collect(sub, uploads.get(owner, []), attempts.get(owner, []))
+                # Only file paths cross into the pool; archives are never pickled
+                paths = []
+                for key in archive_keys:
+                    try:
+                        paths.append(await files.enter_async_context(blob_store.local_path(key)))
+                    except FileNotFoundError:
+                        continue
+                future = loop.run_in_executor(pool, plagiarism_engine.fingerprint_document, parts, paths)
+                jobs.append((sub, sources, future))
+            results = await asyncio.gather(*(future for _sub, _sources, future in jobs))
+
+        now = datetime.utcnow()
+        docs: Dict[str, dict] = {}
+        ops = []
+        for (sub, sources, _future), result in zip(jobs, results):
+            sub_id = str(sub["_id"])
+            doc = {
+                "event_id": event_id,
+                "fingerprints": result["fingerprints"],
+                # Band index is part of the key so equal rows in different bands don't collide
+                "bands": [f"{i}:{key}" for i, key in enumerate(result["bands"])],
+                "token_count": result["token_count"],
+                "sources": sources,
+                "updated_at": now,
+            }
+            docs[sub_id] = doc
+            ops.append(UpdateOne({"_id": sub_id}, {"$set": doc}, upsert=True))
+        if ops:
+            await plagiarism_fingerprints_col.bulk_write(ops, ordered=False)
+        return docs
+
+    # --- Scoring ---
+
+    async def _record(self, event_id: str, results: List[Tuple[str, str, Dict[str, float]]]):
+        now = datetime.utcnow()
+        ops = []
+        for a, b, sim in results:
+            pair_id, first, second = _pair_id(a, b)
+            ops.append(UpdateOne(
+                {"_id": pair_id},
+                {"$set": {"event_id": event_id, "a": first, "b": second, **sim, "checked_at": now}},
+                upsert=True,
+            ))
+        for i in range(0, len(ops), PLAGIARISM_COMPARE_CHUNK):
+            await plagiarism_pairs_col.bulk_write(ops[i:i + PLAGIARISM_COMPARE_CHUNK], ordered=False)
+
+    @staticmethod
+    def _summarize(matches: List[dict]) -> Tuple[float, str]:
+        if not matches:
+            return 0.0, "Analysis complete. No significant overlap with other submissions in this event."
+        top = matches[0]
+        score = round(top["containment"] * 100, 2)
+        level = "High" if top["containment"] >= PLAGIARISM_HIGH_THRESHOLD else "Moderate"
+        return score, (
+            f"{level} similarity: {score}% of the smaller submission's fingerprints match submission "
+            f"{top['submission_id']} ({len(matches)} submission(s) above {int(PLAGIARISM_MATCH_THRESHOLD * 100)}%)."
+        )
+
+    async def _write_submission_reports(self, event_id: str, sub_ids: List[str]):
+        """Refresh plagiarism_score/report/matches on each submission from the stored pairs."""
+        matches: Dict[str, List[dict]] = {s: [] for s in sub_ids}
+        query = {
+            "event_id": event_id,
+            "containment": {"$gte": PLAGIARISM_MATCH_THRESHOLD},
+            "$or": [{"a": {"$in": sub_ids}}, {"b": {"$in": sub_ids}}],
+        }
+        async for pair in plagiarism_pairs_col.find(query):
+            for own, other in ((pair["a"], pair["b"]), (pair["b"], pair["a"])):
+                if own in matches:
+                    matches[own].append({
+                        "submission_id": other,
+                        "containment": pair["containment"],
+                        "jaccard": pair["jaccard"],
+                        "shared": pair["shared"],
+                    })
+
+        now = datetime.utcnow()
+        ops = []
+        for sub_id, found in matches.items():
+            if not ObjectId.is_valid(sub_id):
+                continue
+            found.sort(key=lambda m: m["containment"], reverse=True)
+            found = found[:PLAGIARISM_MAX_MATCHES]
+            score, report = self._summarize(found)
+            ops.append(UpdateOne({"_id": ObjectId(sub_id)}, {"$set": {
+                "plagiarism_score": score,
+                "plagiarism_report": report,
+                "plagiarism_matches": found,
+                "plagiarism_checked_at": now,
+                "updated_at": now,
+            }}))
+        for i in range(0, len(ops), PLAGIARISM_COMPARE_CHUNK):
+            await submissions_col.bulk_write(ops[i:i + PLAGIARISM_COMPARE_CHUNK], ordered=False)
+
+    async def check_submission(self, sub_id: str) -> dict:
+        """Fingerprint one submission and compare it against its LSH candidates in the same event."""
+        sub = await submissions_col.find_one({"_id": ObjectId(sub_id)})
+        if not sub:
+            raise LookupError("Submission not found")
+        event_id = str(sub.get("event_id") or "")
+        doc = (await self._fingerprint([sub]))[sub_id]
+
+        results = []
+        if doc["bands"]:
+            cursor = plagiarism_fingerprints_col.find(
+                {"event_id": event_id, "bands": {"$in": doc["bands"]}, "_id": {"$ne": sub_id}},
+                {"fingerprints": 1},
+            )
+            async for other in cursor:
+                results.append((sub_id, other["_id"], plagiarism_engine.compare(doc["fingerprints"], other["fingerprints"])))
+        if results:
+            await self._record(event_id, results)
+        await self._write_submission_reports(event_id, [sub_id])
+
+        updated = await submissions_col.find_one(
+            {"_id": ObjectId(sub_id)}, {"plagiarism_score": 1, "plagiarism_report": 1, "plagiarism_matches": 1}
+        )
+        return {
+            "score": updated.get("plagiarism_score", 0.0),
+            "report": updated.get("plagiarism_report", ""),
+            "matches": updated.get("plagiarism_matches", []),
+            "candidates": len(results),
+            "sources": doc["sources"],
+        }
+
+    # --- Event-wide batch runs ---
+
+    async def start_event_run(self, event_id: str, requested_by: str) -> dict:
+        running = await plagiarism_runs_col.find_one({"event_id": event_id, "status": "running"})
+        if running:
+            return running
+        run_id = str(uuid.uuid4())
+        run = {
+            "_id": run_id,
+            "event_id": event_id,
+            "requested_by": requested_by,
+            "status": "running",
+            "total": await submissions_col.count_documents({"event_id": event_id}),
+            "fingerprinted": 0,
+            "candidate_pairs": 0,
+            "flagged_pairs": 0,
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+        }
+        await plagiarism_runs_col.insert_one(run)
+        task = asyncio.create_task(self._run_event(run_id, event_id))
+        self._tasks[run_id] = task
+        task.add_done_callback(lambda _t: self._tasks.pop(run_id, None))
+        return run
+
+    async def _run_event(self, run_id: str, event_id: str):
+        try:
+            subs = await submissions_col.find({"event_id": event_id}).to_list(None)
+            docs: Dict[str, dict] = {}
+            for i in range(0, len(subs), PLAGIARISM_BATCH_SIZE):
+                docs.update(await self._fingerprint(subs[i:i + PLAGIARISM_BATCH_SIZE]))
+                await plagiarism_runs_col.update_one(
+                    {"_id": run_id}, {"$set": {"fingerprinted": len(docs), "updated_at": datetime.utcnow()}}
+                )
+
+            # LSH: submissions sharing any band bucket become candidate pairs
+            buckets: Dict[str, List[str]] = {}
+            for sub_id, doc in docs.items():
+                for band in doc["bands"]:
+                    buckets.setdefault(band, []).append(sub_id)
+            candidates: Set[Tuple[str, str]] = set()
+            for members in buckets.values():
+                if len(members) > 1:
+                    members.sort()
+                    for x in range(len(members)):
+                        for y in range(x + 1, len(members)):
+                            candidates.add((members[x], members[y]))
+
+            fingerprints = {sub_id: doc["fingerprints"] for sub_id, doc in docs.items()}
+            ordered = sorted(candidates)
+            loop = asyncio.get_running_loop()
+            futures = []
+            for i in range(0, len(ordered), PLAGIARISM_COMPARE_CHUNK):
+                chunk = ordered[i:i + PLAGIARISM_COMPARE_CHUNK]
+                needed = {s for pair in chunk for s in pair}
+                futures.append(loop.run_in_executor(
+                    _get_pool(), plagiarism_engine.compare_candidates, chunk, {s: fingerprints[s] for s in needed}
+                ))
+            results = [r for chunk in await asyncio.gather(*futures) for r in chunk]
+
+            # Pairs from an earlier run that are no longer candidates are stale
+            await plagiarism_pairs_col.delete_many({"event_id": event_id})
+            await self._record(event_id, results)
+            await self._write_submission_reports(event_id, list(docs))
+
+            flagged = sum(1 for _a, _b, sim in results if sim["containment"] >= PLAGIARISM_MATCH_THRESHOLD)
+            await plagiarism_runs_col.update_one({"_id": run_id}, {"$set": {
+                "status": "completed",
+                "candidate_pairs": len(results),
+                "flagged_pairs": flagged,
+                "completed_at": datetime.utcnow(),
+                "updated_at": datetime.utcnow(),
+            }})
+            logger.info(f"Plagiarism run {run_id} for event {event_id}: {len(docs)} submissions, "
+                        f"{len(results)} candidate pairs, {flagged} flagged")
+        except Exception as e:
+            logger.error(f"Plagiarism run {run_id} failed: {e}")
+            await plagiarism_runs_col.update_one(
+                {"_id": run_id}, {"$set": {"status": "failed", "error": str(e), "updated_at": datetime.utcnow()}}
+            )
+
+    async def get_run(self, run_id: str) -> Optional[dict]:
+        return await plagiarism_runs_col.find_one({"_id": run_id})
+
+    async def event_report(self, event_id: str, min_similarity: float = PLAGIARISM_MATCH_THRESHOLD, limit: int = 100) -> List[dict]:
+        cursor = plagiarism_pairs_col.find(
+            {"event_id": event_id, "containment": {"$gte": min_similarity}}, {"_id": 0, "event_id": 0}
+        ).sort("containment", -1).limit(limit)
+        return await cursor.to_list(limit)
+
+
+plagiarism_service = PlagiarismService()
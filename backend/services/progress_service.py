@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+
+from db import modules_col, progress_col
+from services.badge_service import badge_service
+
+logger = logging.getLogger("progress_service")
+
+MODULE_CACHE_TTL = int(os.getenv("MODULE_CACHE_TTL", 300))
+MODULE_CACHE_MAX_COURSES = int(os.getenv("MODULE_CACHE_MAX_COURSES", 500))
+QUIZ_PASS_SCORE = 60
+
+
+def _module_summary(module: dict) -> dict:
+    lessons = module.get("lessons") or []
+    types = {l.get("type") for l in lessons if isinstance(l, dict)}
+    return {
+        "_id": module["_id"],
+        "course_id": module.get("course_id"),
+        "order_index": module.get("order_index", 1),
+        # No lessons array: legacy modules require every step
+        "has_video": not lessons or "video" in types,
+        "has_theory": not lessons or bool(types & {"text", "theory"}),
+        "has_quiz": not lessons or "quiz" in types,
+        "next_id": None,
+    }
+
+
+def _requirements_met(module: dict, prog: dict) -> bool:
+    try:
+        quiz_score = float(prog.get("quiz_score") or 0)
+    except (TypeError, ValueError):
+        quiz_score = 0.0
+    return bool(
+        (not module["has_video"] or prog.get("video_completed"))
+        and (not module["has_theory"] or prog.get("theory_completed"))
+        and (not module["has_quiz"] or quiz_score >= QUIZ_PASS_SCORE)
+    )
+
+
+def _requirements_expr(module: dict) -> dict:
+    """The same check as _requirements_met, evaluated server-side inside the update."""
+    checks = []
+    if module["has_video"]:
+        checks.append("$video_completed")
+    if module["has_theory"]:
+        checks.append("$theory_completed")
+    if module["has_quiz"]:
+        checks.append({"$gte": [
+            {"$convert": {"input": "$quiz_score", "to": "double", "onError": 0, "onNull": 0}},
+            QUIZ_PASS_SCORE,
+        ]})
+    return {"$and": checks} if checks else True
+
+
+class ProgressService:
+    """
+    Module progress state machine behind /api/progress/update.
+
+    Module definitions are cached per course as small summaries (lesson type
+    flags plus the id of the next module by order_index), so the hot path never
+    reads modules_col. A progress event is one find_one_and_update with an
+    aggregation-pipeline update: it applies the client's fields, re-evaluates
+    the module's requirements against the stored document and flips status to
+    "completed" (stamping completed_at) in the same write. Only the event that
+    actually completes the module pays a second round trip, a bulk_write that
+    unlocks the next module.
+    """
+
+    def __init__(self, ttl: int = MODULE_CACHE_TTL):
+        self.ttl = ttl
+        self._courses: Dict[str, dict] = {}
+        self._module_course: Dict[str, str] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    # --- Module definition cache ---
+
+    async def _load_course(self, course_id: str) -> dict:
+        modules = {}
+        async for m in modules_col.find({"course_id": course_id}, {"course_id": 1, "order_index": 1, "lessons.type": 1}):
+            modules[m["_id"]] = _module_summary(m)
+        by_order = {m["order_index"]: m["_id"] for m in modules.values()}
+        for m in modules.values():
+            m["next_id"] = by_order.get(m["order_index"] + 1)
+        return {"modules": modules, "loaded_at": time.monotonic()}
+
+    async def course_modules(self, course_id: str) -> Dict[str, dict]:
+        entry = self._courses.get(course_id)
+        if entry is not None and time.monotonic() - entry["loaded_at"] < self.ttl:
+            return entry["modules"]
+        async with self._locks.setdefault(course_id, asyncio.Lock()):
+            entry = self._courses.get(course_id)
+            if entry is None or time.monotonic() - entry["loaded_at"] >= self.ttl:
+                entry = await self._load_course(course_id)
+                if len(self._courses) >= MODULE_CACHE_MAX_COURSES and course_id not in self._courses:
+                    oldest = min(self._courses, key=lambda c: self._courses[c]["loaded_at"])
+                    self.invalidate_course(oldest)
+                self._courses[course_id] = entry
+                for module_id in entry["modules"]:
+                    self._module_course[module_id] = course_id
+        return entry["modules"]
+
+    async def get_module(self, module_id: str, course_id: Optional[str] = None) -> Optional[dict]:
+        course_id = self._module_course.get(module_id) or course_id
+        if course_id:
+            module = (await self.course_modules(course_id)).get(module_id)
+            if module is not None:
+                return module
+        # Unknown module or a stale course hint: resolve its course once
+        doc = await modules_col.find_one({"_id": module_id}, {"course_id": 1})
+        if not doc or not doc.get("course_id") or doc["course_id"] == course_id and course_id in self._courses:
+            return None
+        return (await self.course_modules(doc["course_id"])).get(module_id)
+
+    def invalidate_course(self, course_id: str):
+        entry = self._courses.pop(course_id, None)
+        for module_id in (entry or {}).get("modules", {}):
+            self._module_course.pop(module_id, None)
+
+    # --- Progress events ---
+
+    async def update_module(self, user_id: str, module_id: str, course_id: Optional[str], updates: dict) -> dict:
+        now = datetime.utcnow().isoformat()
+        key = {"user_id": user_id, "module_id": module_id}
+        fields = {**updates, "course_id": course_id, "updated_at": now}
+
+        module = await self.get_module(module_id, course_id)
+        if module is None:
+            await progress_col.update_one(key, {"$set": fields}, upsert=True)
+            return {"status": "updated", "info": "Module definition missing, progress saved"}
+
+        met = _requirements_expr(module)
+        prog = await progress_col.find_one_and_update(
+            key,
+            [
+                # Client values are literals, never expressions or field paths
+                {"$set": {k: {"$literal": v} for k, v in fields.items()}},
+                {"$set": {
+                    "status": {"$cond": [met, "completed", "$status"]},
+                    "completed_at": {"$cond": [
+                        {"$and": [met, {"$not": [{"$ifNull": ["$completed_at", False]}]}]}, now, "$completed_at",
+                    ]},
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+        if not _requirements_met(module, prog or {}):
+            # Nothing was completed, so badges can only be catching up; evaluate off the response path
+            badge_service.schedule(user_id)
+            return {"status": "updated", "requirements_met": False, "new_badges": []}
+
+        just_completed = prog.get("completed_at") == now
+        next_id = module["next_id"]
+        if just_completed and next_id:
+            # Never downgrade a next module the learner has already completed
+            await progress_col.bulk_write([
+                UpdateOne(
+                    {"user_id": user_id, "module_id": next_id},
+                    [{"$set": {
+                        "status": {"$cond": [{"$eq": ["$status", "completed"]}, "$status", "unlocked"]},
+                        "course_id": course_id or module["course_id"],
+                    }}],
+                    upsert=True,
+                ),
+            ], ordered=False)
+
+        if just_completed:
+            new_badges = await badge_service.evaluate(user_id)
+        else:
+            badge_service.schedule(user_id)
+            new_badges = []
+
+        if next_id:
+            return {"status": "module_completed", "unlocked_next": True, "next_id": next_id, "new_badges": new_badges}
+        return {"status": "course_completed", "info": "All modules finished", "new_badges": new_badges}
+
+
+progress_service = ProgressService()
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from db import job_leases_col, modules_col, quizzes_col, theories_col
+from services.llm_cache import cached_completion
+
+logger = logging.getLogger("quiz_generation_service")
+
+QUIZ_PREGEN_CONCURRENCY = int(os.getenv("QUIZ_PREGEN_CONCURRENCY", 3))
+QUIZ_SOURCE_AI = "ai_generated"
+# Only one worker in the cluster runs pre-generation; a crashed holder's claim lapses after this
+QUIZ_PREGEN_LEASE_SECONDS = int(os.getenv("QUIZ_PREGEN_LEASE_SECONDS", 1800))
+PREGEN_LEASE_ID = "quiz_pregeneration:run"
+
+
+def _fix_id(doc):
+    if doc and "_id" in doc:
+        doc["_id"] = str(doc["_id"])
+    return doc
+
+
+async def generate_ai_quiz(module_id: str, theory_content: str):
+    prompt = f"""
+    Create a high-quality 5-question multiple choice quiz based on this technical content.
+
+    Content:
+    {theory_content}
+
+    JSON Output Format:
+    {{
+        "questions": [
+            {{
+                "question": "Clear technical question?",
+                "options": ["Option A", "Option B", "Option C", "Option D"],
+                "correct_answers": [0],
+                "explanation": "Why the answer is correct."
+            }}
+        ]
+    }}
+
+    Rules:
+    - 4 options per question.
+    - Exactly one correct answer (index 0-3).
+    - Provide a technical explanation.
+    - Return ONLY the JSON.
+    """
+    try:
+        raw_quiz = await cached_completion(
+            [{"role": "user", "content": prompt}],
+            model="llama-3.3-70b-versatile",
+            response_format={"type": "json_object"},
+            validate=json.loads
+        )
+        quiz_data = json.loads(raw_quiz)
+        quiz_data.pop("_id", None)
+        quiz_data.pop("module_id", None)
+        quiz_data["source"] = QUIZ_SOURCE_AI
+
+        # Idempotent: whichever writer lands first wins, everyone re-reads that document.
+        # The partial unique index on (module_id, source=ai_generated) covers other workers.
+        try:
+            await quizzes_col.update_one(
+                {"module_id": module_id},
+                {"$setOnInsert": quiz_data},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            pass
+        return _fix_id(await quizzes_col.find_one({"module_id": module_id}))
+    except Exception as e:
+        print(f"Error generating AI Quiz: {e}")
+        return None
+
+
+class QuizGenerationService:
+    """
+    Single-flight wrapper around generate_ai_quiz.
+    Concurrent requests for the same module share one in-flight task, so a
+    cohort opening a new module triggers one LLM call and one write.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    async def get_or_generate(self, module_id: str, theory_content: str) -> Optional[dict]:
+        task = self._inflight.get(module_id)
+        if task is None:
+            task = asyncio.create_task(generate_ai_quiz(module_id, theory_content))
+            self._inflight[module_id] = task
+            task.add_done_callback(lambda _t: self._inflight.pop(module_id, None))
+        # Shield so a disconnecting client does not cancel generation for the others waiting on it
+        return await asyncio.shield(task)
+
+    async def _claim_pregeneration(self) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            await job_leases_col.find_one_and_update(
+                {"_id": PREGEN_LEASE_ID, "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]},
+                {"$set": {"owner": self.owner, "lease_until": now + timedelta(seconds=QUIZ_PREGEN_LEASE_SECONDS)}},
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            # Another worker holds a live claim
+            return False
+
+    async def _release_pregeneration(self):
+        await job_leases_col.update_one(
+            {"_id": PREGEN_LEASE_ID, "owner": self.owner}, {"$set": {"lease_until": None}}
+        )
+
+    async def pregenerate_missing(self, concurrency: int = QUIZ_PREGEN_CONCURRENCY) -> int:
+        """
+        Background job: generate quizzes for every module that has theory content but no quiz.
+        Safe to call from every worker: a lease in job_leases lets only one of them run
+        at a time, so the cluster makes one LLM call per missing module.
+        Returns the number of quizzes created.
+        """
+        if not await self._claim_pregeneration():
+            logger.info("Quiz pre-generation already running on another worker, skipping")
+            return 0
+        try:
+            return await self._pregenerate(concurrency)
+        finally:
+            await self._release_pregeneration()
+
+    async def _pregenerate(self, concurrency: int) -> int:
+        existing = set(await quizzes_col.distinct("module_id"))
+        missing = []
+        async for module in modules_col.find({}, {"_id": 1}):
+            module_id = str(module["_id"])
+            if module_id not in existing:
+                missing.append(module_id)
+
+        if not missing:
+            return 0
+
+        theories = await theories_col.find(
+            {"module_id": {"$in": missing}, "markdown_content": {"$nin": [None, ""]}},
+            {"module_id": 1, "markdown_content": 1}
+        ).to_list(None)
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _generate(theory):
+            async with semaphore:
+                return await self.get_or_generate(theory["module_id"], theory["markdown_content"])
+
+        results = await asyncio.gather(*[_generate(t) for t in theories], return_exceptions=True)
+        created = sum(1 for r in results if r and not isinstance(r, Exception))
+        logger.info(f"Quiz pre-generation finished: {created}/{len(theories)} modules filled")
+        return created
+
+
+quiz_generation_service = QuizGenerationService()
@@ -1,115 +1,178 @@
 from datetime import datetime, timedelta, timezone
-from db import events_col, judges_col, submissions_col, notifications_col
-from bson import ObjectId
-from services.email_service import send_notification_email
-import asyncio
+from typing import List, Optional
+from db import events_col, submissions_col, notifications_col
+from services.email_outbox import email_outbox
 import logging
 
 logger = logging.getLogger("reminder_service")
 
+REMINDER_WINDOW_HOURS = 48
+
+
+def parse_deadline(value) -> Optional[datetime]:
+    """BSON-ready UTC datetime from a stored deadline (datetime or ISO string)."""
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, str) and value.strip():
+        try:
+            parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    return None
+
+
+def with_deadline_at(event_data: dict) -> dict:
+    """Keep the indexed submission_deadline_at in step with a written submission_deadline."""
+    if "submission_deadline" in event_data:
+        event_data["submission_deadline_at"] = parse_deadline(event_data.get("submission_deadline"))
+    return event_data
+
+
+def _pending_pairs_pipeline(event_ids: List[str]) -> List[dict]:
+    """(event, judge) -> unscored project titles, plus the judge's user_id, computed server-side."""
+    return [
+        {"$match": {"event_id": {"$in": event_ids}, "status": "Under Review"}},
+        {"$unwind": "$assigned_judge_emails"},
+        {"$set": {"_sid": {"$toString": "$_id"}}},
+        {"$lookup": {
+            "from": "scores",
+            "localField": "_sid",
+            "foreignField": "submission_id",
+            "let": {"email": "$assigned_judge_emails"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$judge_email", "$$email"]}}},
+                {"$limit": 1},
+                {"$project": {"_id": 1}},
+            ],
+            "as": "_scored",
+        }},
+        {"$match": {"_scored": {"$size": 0}}},
+        {"$group": {
+            "_id": {"event_id": "$event_id", "email": "$assigned_judge_emails"},
+            "projects": {"$push": {"$ifNull": ["$project_title", "Untitled Project"]}},
+        }},
+        {"$lookup": {
+            "from": "judges",
+            "localField": "_id.email",
+            "foreignField": "email",
+            "let": {"event_id": "$_id.event_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$event_id", "$$event_id"]}}},
+                {"$limit": 1},
+                {"$project": {"_id": 0, "user_id": 1}},
+            ],
+            "as": "_judge",
+        }},
+        {"$project": {
+            "_id": 0,
+            "event_id": "$_id.event_id",
+            "email": "$_id.email",
+            "projects": 1,
+            "judge_found": {"$gt": [{"$size": "$_judge"}, 0]},
+            "judge_user_id": {"$first": "$_judge.user_id"},
+        }},
+    ]
+
+
 class ReminderService:
+    @staticmethod
+    async def backfill_deadlines() -> int:
+        """Startup hook: derive submission_deadline_at for events written before it existed."""
+        result = await events_col.update_many(
+            {"submission_deadline": {"$exists": True}, "submission_deadline_at": {"$exists": False}},
+            [{"$set": {"submission_deadline_at": {"$cond": [
+                {"$eq": [{"$type": "$submission_deadline"}, "date"]},
+                "$submission_deadline",
+                {"$dateFromString": {"dateString": {"$toString": "$submission_deadline"}, "onError": None, "onNull": None}},
+            ]}}}],
+        )
+        if result.modified_count:
+            logger.info(f"Normalized submission_deadline_at on {result.modified_count} events")
+        return result.modified_count
+
     @staticmethod
     async def send_judge_reminders():
         """
         Scans for upcoming deadlines and pings judges with pending assignments.
-        Runs periodically via scheduler.
+        Runs periodically via the job scheduler.
         """
         logger.info("Scanning for upcoming judging deadlines...")
         
-        # 1. Find active events with deadlines in the next 24-48 hours
+        # 1. Find events with deadlines in the next 48 hours (indexed range on submission_deadline_at)
         now = datetime.now(timezone.utc)
-        soon = now + timedelta(hours=48)
+        soon = now + timedelta(hours=REMINDER_WINDOW_HOURS)
         
-        active_events = []
-        async for event in events_col.find({
-            "submission_deadline": {"$exists": True}
-        }):
-            try:
-                deadline = datetime.fromisoformat(event["submission_deadline"].replace('Z', '+00:00'))
-                if now < deadline <= soon:
-                    active_events.append(event)
-            except:
-                continue
+        events = {
+            str(event["_id"]): event
+            async for event in events_col.find(
+                {"submission_deadline_at": {"$gt": now, "$lte": soon}},
+                {"title": 1, "name": 1, "submission_deadline": 1},
+            )
+        }
                 
-        if not active_events:
+        if not events:
             logger.info("No urgent judging deadlines found.")
             return
 
-        for event in active_events:
-            event_id = str(event["_id"])
+        # 2-3. Unscored (judge, submission) pairs for every event at once, grouped per judge
+        pending = await submissions_col.aggregate(_pending_pairs_pipeline(list(events))).to_list(None)
+
+        # 4. In-app notifications in one insert_many, emails in one outbox batch
+        notifications, emails = [], []
+        for row in pending:
+            event = events[row["event_id"]]
+            event_id = row["event_id"]
             event_name = event.get("title", event.get("name", "Hackathon"))
-            
-            # 2. Get all submissions for this event that are 'Under Review'
-            pending_submissions = []
-            async for sub in submissions_col.find({
-                "event_id": event_id,
-                "status": "Under Review"
-            }):
-                pending_submissions.append(sub)
-                
-            if not pending_submissions:
-                continue
+            email, projects = row["email"], row["projects"]
+            logger.info(f"Sending reminder to judge: {email} for {len(projects)} projects")
                 
-            # 3. Identify unique judges who have pending work
-            judges_to_remind = {} # email -> [submission_titles]
-            
-            for sub in pending_submissions:
-                emails = sub.get("assigned_judge_emails", [])
-                # If judge hasn't scored yet (check if scores exist for this judge/sub combo)
-                from db import scores_col
-                for email in emails:
-                    score_exists = await scores_col.find_one({
-                        "submission_id": str(sub["_id"]),
-                        "judge_email": email
-                    })
-                    if not score_exists:
-                        if email not in judges_to_remind:
-                            judges_to_remind[email] = []
-                        judges_to_remind[email].append(sub.get("project_title", "Untitled Project"))
-
-            # 4. Send emails and in-app notifications
-            for email, projects in judges_to_remind.items():
-                logger.info(f"Sending reminder to judge: {email} for {len(projects)} projects")
-                
-                # In-app notification
-                judge_user = await judges_col.find_one({"email": email, "event_id": event_id})
-                if judge_user:
-                    await notifications_col.insert_one({
-                        "user_id": judge_user.get("user_id"), # If they are registered users
-                        "email": email,
-                        "type": "judge_reminder",
-                        "title": "Judging Deadline Approaching",
-                        "message": f'You have {len(projects)} pending evaluations for "{event_name}". Deadline: {event["submission_deadline"]}',
-                        "is_read": False,
-                        "created_at": datetime.now(timezone.utc).isoformat(),
-                        "meta": {"event_id": event_id, "project_count": len(projects)}
-                    })
-
-                # Email
-                subject = f"Urgent: Judging Deadline for {event_name}"
-                body = f"""
-                <html>
-                    <body style="font-family: sans-serif; line-height: 1.6; color: #333;">
-                        <div style="max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #eee; border-radius: 10px;">
-                            <h2 style="color: #6C3BFF;">Judging Protocol Reminder</h2>
-                            <p>Hello Evaluator,</p>
-                            <p>This is an automated reminder that the judging deadline for <strong>{event_name}</strong> is approaching.</p>
-                            <p>Our records show you have <strong>{len(projects)}</strong> pending assessments:</p>
-                            <ul>
-                                {"".join([f"<li>{p}</li>" for p in projects[:5]])}
-                                {f"<li>...and {len(projects)-5} more</li>" if len(projects) > 5 else ""}
-                            </ul>
-                            <p>Please log in to your <strong>Judge Portal</strong> to complete your evaluations.</p>
-                            <div style="margin-top: 30px; padding: 20px; background: #f9f9f9; border-radius: 8px;">
-                                <strong>Deadline:</strong> {event["submission_deadline"]}
-                            </div>
-                            <p style="font-size: 12px; color: #999; margin-top: 40px;">
-                                This is a synchronized system notification from Studlyf Engineering.
-                            </p>
+            if row.get("judge_found"):
+                notifications.append({
+                    "user_id": row.get("judge_user_id"), # If they are registered users
+                    "email": email,
+                    "type": "judge_reminder",
+                    "title": "Judging Deadline Approaching",
+                    "message": f'You have {len(projects)} pending evaluations for "{event_name}". Deadline: {event["submission_deadline"]}',
+                    "is_read": False,
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "meta": {"event_id": event_id, "project_count": len(projects)}
+                })
+
+            # Email
+            subject = f"Urgent: Judging Deadline for {event_name}"
+            body = f"""
+            <html>
+                <body style="font-family: sans-serif; line-height: 1.6; color: #333;">
+                    <div style="max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #eee; border-radius: 10px;">
+                        <h2 style="color: #6C3BFF;">Judging Protocol Reminder</h2>
+                        <p>Hello Evaluator,</p>
+                        <p>This is an automated reminder that the judging deadline for <strong>{event_name}</strong> is approaching.</p>
+                        <p>Our records show you have <strong>{len(projects)}</strong> pending assessments:</p>
+                        <ul>
+                            {"".join([f"<li>{p}</li>" for p in projects[:5]])}
+                            {f"<li>...and {len(projects)-5} more</li>" if len(projects) > 5 else ""}
+                        </ul>
+                        <p>Please log in to your <strong>Judge Portal</strong> to complete your evaluations.</p>
+                        <div style="margin-top: 30px; padding: 20px; background: #f9f9f9; border-radius: 8px;">
+                            <strong>Deadline:</strong> {event["submission_deadline"]}
                         </div>
-                    </body>
-                </html>
-                """
-                asyncio.create_task(send_notification_email(email, subject, body))
+                        <p style="font-size: 12px; color: #999; margin-top: 40px;">
+                            This is a synchronized system notification from Studlyf Engineering.
+                        </p>
+                    </div>
+                </body>
+            </html>
+            """
+            emails.append({"to": email, "subject": subject, "html": body})
+
+        if notifications:
+            await notifications_col.insert_many(notifications, ordered=False)
+        if emails:
+            try:
+                await email_outbox.enqueue_many(emails)
+            except Exception as e:
+                logger.error(f"Failed to enqueue judge reminder emails: {e}")
+        return len(pending)
 
 reminder_service = ReminderService()
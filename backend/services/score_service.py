@@ -1,4 +1,5 @@
 from db import scores_col, submissions_col
+from services.leaderboard_service import leaderboard_service
 from bson import ObjectId
 from datetime import datetime, timezone
 
@@ -19,10 +20,12 @@ async def submit_score(submission_id: str, judge_id: str, scores: dict, comments
     result = await scores_col.insert_one(score_doc)
     
     # Update submission with the score
-    await submissions_col.update_one(
+    submission = await submissions_col.find_one_and_update(
         {"_id": ObjectId(submission_id)},
         {"$set": {"score": avg_score, "status": "Reviewed"}}
     )
+    if submission:
+        await leaderboard_service.record_score(submission, score_doc)
     
     score_doc["_id"] = str(result.inserted_id)
     return score_doc
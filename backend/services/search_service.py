@@ -0,0 +1,369 @@
+import asyncio
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure, PyMongoError
+
+from db import db as database, search_index_col, search_meta_col
+
+logger = logging.getLogger("search_service")
+
+SEARCH_MAX_PREFIX = 15
+SEARCH_MAX_TOKENS = 8
+SEARCH_REINDEX_SECONDS = int(os.getenv("SEARCH_REINDEX_SECONDS", 600))
+SEARCH_TOKEN_SAVE_SECONDS = float(os.getenv("SEARCH_TOKEN_SAVE_SECONDS", 5))
+SEARCH_BATCH_SIZE = 500
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Server has no change streams at all (standalone / not a replica set)
+CHANGE_STREAMS_UNSUPPORTED = {20, 40573}
+# The saved position is unusable (oplog rolled past it, invalid or fatal token): rebuild and start over
+CHANGE_STREAM_POSITION_LOST = {260, 280, 286}
+
+# kind -> where the entity lives and which fields feed the index
+SEARCH_SOURCES: Dict[str, Dict[str, Any]] = {
+    "event": {
+        "collection": "events",
+        "title": ["title"],
+        "body": ["category", "description", "type"],
+        "scope": "institution_id",
+        "label": "Event",
+        "link": "/events/{id}",
+    },
+    "team": {
+        "collection": "teams",
+        "title": ["team_name", "name"],
+        "body": ["event_title"],
+        # Teams carry no institution_id; it is resolved through their event.
+        "scope": "event_id",
+        "scope_via_event": True,
+        "label": "Team",
+        "link": "/teams/{id}",
+    },
+    "sdl_project": {
+        "collection": "sdl_projects",
+        "title": ["title"],
+        "body": ["problem_statement", "tags", "project_type"],
+        "scope": None,
+        "label": "Project",
+        "link": "/sdl/projects/{id}",
+    },
+    "course": {
+        "collection": "courses",
+        "title": ["title"],
+        "body": ["description", "role_tag", "skills", "difficulty"],
+        "scope": None,
+        "label": "Course",
+        "link": "/courses/{id}",
+    },
+    "opportunity": {
+        "collection": "opportunities",
+        "title": ["title"],
+        "body": ["organization", "type", "description", "location"],
+        "scope": "createdBy",
+        "label": "Opportunity",
+        "link": "/opportunities/{id}",
+    },
+}
+_KIND_BY_COLLECTION = {source["collection"]: kind for kind, source in SEARCH_SOURCES.items()}
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t]
+
+
+def edge_ngrams(tokens: Iterable[str]) -> List[str]:
+    prefixes = set()
+    for token in tokens:
+        for i in range(1, min(len(token), SEARCH_MAX_PREFIX) + 1):
+            prefixes.add(token[:i])
+    return sorted(prefixes)
+
+
+def _flatten(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return " ".join(_flatten(v) for v in value)
+    return str(value)
+
+
+def build_entry(kind: str, doc: dict, scope: Optional[str] = None) -> Optional[dict]:
+    """Project a source document into its search_index row."""
+    source = SEARCH_SOURCES[kind]
+    title = next((str(doc[f]) for f in source["title"] if doc.get(f)), "")
+    if not title:
+        return None
+    ref_id = str(doc["_id"])
+    body = " ".join(_flatten(doc.get(f)) for f in source["body"])
+    entry = {
+        "_id": f"{kind}:{ref_id}",
+        "kind": kind,
+        "ref_id": ref_id,
+        "title": title,
+        "body": body[:5000],
+        "prefixes": edge_ngrams(tokenize(title)),
+        "link": source["link"].format(id=ref_id),
+    }
+    if source["scope"]:
+        entry["scope"] = scope if scope is not None else str(doc.get(source["scope"]) or "")
+    return entry
+
+
+async def _resolve_scope(kind: str, doc: dict, cache: Optional[Dict[str, str]] = None) -> Optional[str]:
+    source = SEARCH_SOURCES[kind]
+    if not source.get("scope_via_event"):
+        return None
+    event_id = str(doc.get("event_id") or "")
+    if cache is not None and event_id in cache:
+        return cache[event_id]
+    scope = ""
+    if ObjectId.is_valid(event_id):
+        event = await database["events"].find_one({"_id": ObjectId(event_id)}, {"institution_id": 1})
+        scope = str((event or {}).get("institution_id") or "")
+    if cache is not None:
+        cache[event_id] = scope
+    return scope
+
+
+class SearchService:
+    """
+    Search over events, teams, SDL projects, courses and opportunities.
+    Every entity is projected into one `search_index` row carrying a weighted
+    text index (title, body) for ranked matches and an edge n-gram `prefixes`
+    array for autocomplete. User input is tokenised, so it never reaches the
+    regex engine or the $text operator syntax.
+
+    The index is kept current from a change stream on the source collections.
+    Its resume token is persisted in `search_meta` every few seconds and on
+    shutdown. Without a usable token (first start, or the oplog rolled past
+    it) the index is rebuilt and the stream starts from the cluster time taken
+    before the rebuild, so no write is missed. Only deployments without change
+    streams fall back to a periodic rebuild.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._token = None
+        self._saved_token = None
+
+    # --- Index maintenance ---
+
+    async def index_document(self, kind: str, doc: dict):
+        entry = build_entry(kind, doc, await _resolve_scope(kind, doc))
+        if entry is None:
+            await self.remove(kind, str(doc.get("_id")))
+            return
+        entry["synced_at"] = time.time()
+        await search_index_col.replace_one({"_id": entry["_id"]}, entry, upsert=True)
+
+    async def remove(self, kind: str, ref_id: str):
+        await search_index_col.delete_one({"_id": f"{kind}:{ref_id}"})
+
+    async def rebuild(self, kinds: Optional[List[str]] = None) -> Dict[str, int]:
+        """Full re-projection of the source collections; drops rows whose source is gone."""
+        counts: Dict[str, int] = {}
+        for kind in kinds or list(SEARCH_SOURCES):
+            source = SEARCH_SOURCES[kind]
+            started = time.time()
+            projection = {f: 1 for f in source["title"] + source["body"]}
+            if source["scope"]:
+                projection[source["scope"]] = 1
+            ops: List[UpdateOne] = []
+            count = 0
+            scopes: Dict[str, str] = {}
+            async for doc in database[source["collection"]].find({}, projection).batch_size(SEARCH_BATCH_SIZE):
+                entry = build_entry(kind, doc, await _resolve_scope(kind, doc, scopes))
+                if entry is None:
+                    continue
+                entry["synced_at"] = started
+                ops.append(UpdateOne({"_id": entry["_id"]}, {"$set": entry}, upsert=True))
+                count += 1
+                if len(ops) >= SEARCH_BATCH_SIZE:
+                    await search_index_col.bulk_write(ops, ordered=False)
+                    ops = []
+            if ops:
+                await search_index_col.bulk_write(ops, ordered=False)
+            await search_index_col.delete_many({"kind": kind, "synced_at": {"$lt": started}})
+            counts[kind] = count
+        logger.info(f"Search index rebuilt: {counts}")
+        return counts
+
+    async def _apply_change(self, change: dict):
+        kind = _KIND_BY_COLLECTION.get(change.get("ns", {}).get("coll"))
+        if kind is None:
+            return
+        ref_id = str(change["documentKey"]["_id"])
+        if change["operationType"] == "delete":
+            await self.remove(kind, ref_id)
+        elif change.get("fullDocument"):
+            await self.index_document(kind, change["fullDocument"])
+
+    async def _watch(self, start_at=None):
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": list(_KIND_BY_COLLECTION)},
+            "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+        }}]
+        async with database.db.watch(
+            pipeline,
+            full_document="updateLookup",
+            resume_after=self._token,
+            start_at_operation_time=None if self._token is not None else start_at,
+            max_await_time_ms=1000,
+        ) as stream:
+            logger.info("Search index following change stream")
+            last_save = time.monotonic()
+            while stream.alive:
+                change = await stream.try_next()
+                if change is not None:
+                    try:
+                        await self._apply_change(change)
+                    except Exception as e:
+                        logger.warning(f"Search index update failed: {e}")
+                # Advances on idle batches too (post-batch resume token)
+                self._token = stream.resume_token
+                if time.monotonic() - last_save >= SEARCH_TOKEN_SAVE_SECONDS:
+                    await self._save_token()
+                    last_save = time.monotonic()
+
+    async def _save_token(self):
+        token = self._token
+        if token is not None and token != self._saved_token:
+            await search_meta_col.update_one(
+                {"_id": "change_stream"}, {"$set": {"resume_token": token}}, upsert=True
+            )
+            self._saved_token = token
+
+    async def _catch_up(self):
+        """Rebuild until it succeeds; returns the cluster time taken before it (None on standalone)."""
+        while True:
+            try:
+                start_at = (await database.db.command("hello")).get("operationTime")
+                await self.rebuild()
+                return start_at
+            except Exception as e:
+                logger.error(f"Search rebuild failed: {e}; retrying in 30s")
+                await asyncio.sleep(30)
+
+    async def _poll(self):
+        logger.info(f"Rebuilding search index every {SEARCH_REINDEX_SECONDS}s")
+        await search_meta_col.delete_one({"_id": "change_stream"})
+        while True:
+            await asyncio.sleep(SEARCH_REINDEX_SECONDS)
+            try:
+                await self.rebuild()
+            except Exception as err:
+                logger.warning(f"Search rebuild failed: {err}")
+
+    async def _run(self):
+        meta = await search_meta_col.find_one({"_id": "change_stream"}) or {}
+        self._token = self._saved_token = meta.get("resume_token")
+        # Without a saved position, writes made while no worker was following are unknown
+        start_at = None if self._token is not None else await self._catch_up()
+        while True:
+            try:
+                await self._watch(start_at)
+            except OperationFailure as e:
+                if e.code in CHANGE_STREAMS_UNSUPPORTED:
+                    logger.info(f"Change streams unavailable ({e.code})")
+                    await self._poll()
+                elif e.code in CHANGE_STREAM_POSITION_LOST or e.has_error_label("NonResumableChangeStreamError"):
+                    logger.warning(f"Search change stream position lost ({e.code}); rebuilding")
+                    await search_meta_col.delete_one({"_id": "change_stream"})
+                    self._token = self._saved_token = None
+                    start_at = await self._catch_up()
+                else:
+                    logger.warning(f"Search change stream failed: {e}; resuming")
+                    await asyncio.sleep(5)
+            except PyMongoError as e:
+                logger.warning(f"Search change stream interrupted: {e}; resuming")
+                await asyncio.sleep(5)
+
+    async def start(self):
+        if database.db is None or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+            try:
+                await self._save_token()
+            except PyMongoError as e:
+                logger.warning(f"Could not save search resume token: {e}")
+
+    # --- Queries ---
+
+    @staticmethod
+    def _filters(kinds: Optional[List[str]], scope: Optional[str]) -> dict:
+        query: Dict[str, Any] = {}
+        if kinds:
+            query["kind"] = {"$in": kinds}
+        if scope is not None:
+            query["scope"] = scope
+        return query
+
+    async def search(
+        self,
+        q: str,
+        kinds: Optional[List[str]] = None,
+        scope: Optional[str] = None,
+        limit: int = 20,
+    ) -> List[dict]:
+        """Ranked full-text matches, topped up with prefix matches for partially typed words."""
+        tokens = tokenize(q)[:SEARCH_MAX_TOKENS]
+        if not tokens:
+            return []
+        base = self._filters(kinds, scope)
+        projection = {"title": 1, "kind": 1, "ref_id": 1, "link": 1}
+
+        results = await search_index_col.find(
+            {**base, "$text": {"$search": " ".join(tokens)}},
+            {**projection, "score": {"$meta": "textScore"}},
+        ).sort([("score", {"$meta": "textScore"})]).limit(limit).to_list(limit)
+
+        if len(results) < limit:
+            seen = {r["_id"] for r in results}
+            for row in await self.suggest(q, kinds, scope, limit):
+                if row["_id"] not in seen:
+                    results.append(row)
+                    if len(results) >= limit:
+                        break
+        return results
+
+    async def suggest(
+        self,
+        q: str,
+        kinds: Optional[List[str]] = None,
+        scope: Optional[str] = None,
+        limit: int = 10,
+    ) -> List[dict]:
+        """Autocomplete: every typed word must prefix a word of the title."""
+        tokens = [t[:SEARCH_MAX_PREFIX] for t in tokenize(q)[:SEARCH_MAX_TOKENS]]
+        if not tokens:
+            return []
+        rows = await search_index_col.find(
+            {**self._filters(kinds, scope), "prefixes": {"$all": tokens}},
+            {"title": 1, "kind": 1, "ref_id": 1, "link": 1},
+        ).limit(limit * 3).to_list(limit * 3)
+        needle = " ".join(tokens)
+        rows.sort(key=lambda r: (not r["title"].lower().startswith(needle), len(r["title"])))
+        return rows[:limit]
+
+    async def ranked_ids(self, kind: str, q: str, limit: int = 200) -> List[str]:
+        """Source-collection ids for `kind`, best match first (for routes that apply their own filters)."""
+        return [r["ref_id"] for r in await self.search(q, kinds=[kind], limit=limit)]
+
+
+search_service = SearchService()
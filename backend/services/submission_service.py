@@ -1,4 +1,5 @@
 from db import submissions_col
+from services.institution_stats_service import institution_stats_service
 from bson import ObjectId
 from datetime import datetime, timezone
 
@@ -6,6 +7,7 @@ async def create_submission(data: dict):
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     data["status"] = data.get("status", "Submitted")
     result = await submissions_col.insert_one(data)
+    await institution_stats_service.increment_for_event(data.get("event_id"), total_submissions=1)
     data["_id"] = str(result.inserted_id)
     return data
 
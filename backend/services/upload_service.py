@@ -0,0 +1,220 @@
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+
+from db import blobs_col
+from services.blob_store import blob_store, normalize_key
+
+logger = logging.getLogger("upload_service")
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Hard ceiling for any multipart request body, enforced while it streams in
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", 100 * 1024 * 1024))
+FILES_URL_PREFIX = "/api/files/"
+BLOB_PUBLIC_PREFIX = "blobs"
+# Unreferenced blobs are kept this long before collection, so an upload deduplicating
+# against one that is just being released never ends up pointing at a deleted object
+BLOB_GC_GRACE_SECONDS = int(os.getenv("BLOB_GC_GRACE_SECONDS", 24 * 3600))
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+_SAFE_EXT_RE = re.compile(r"^\.[A-Za-z0-9]{1,10}$")
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class RequestBodyTooLarge(HTTPException):
+    # An HTTPException so FastAPI's body parsing re-raises it instead of turning it into a 400
+    def __init__(self):
+        super().__init__(status_code=413, detail="Request body too large")
+
+
+async def _chunks_with_limit(upload: UploadFile, max_bytes: int, digest) -> AsyncIterator[bytes]:
+    total = 0
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return
+        total += len(chunk)
+        if total > max_bytes:
+            raise UploadTooLarge()
+        digest.update(chunk)
+        yield chunk
+
+
+async def store_upload(upload: UploadFile, max_bytes: int, content_type: Optional[str] = None) -> dict:
+    """
+    Stream an UploadFile into the blob store in fixed-size chunks.
+    The body is hashed as it streams; the blob is stored under its sha256, so
+    identical uploads share one object. Raises 413 as soon as max_bytes is passed.
+    """
+    ext = os.path.splitext(upload.filename or "")[1].lower()
+    if not _SAFE_EXT_RE.match(ext):
+        ext = ""
+    content_type = content_type or upload.content_type or mimetypes.guess_type(upload.filename or "")[0] or "application/octet-stream"
+
+    digest = hashlib.sha256()
+    tmp_key = f"tmp/{uuid.uuid4().hex}"
+    try:
+        size = await blob_store.put_stream(tmp_key, _chunks_with_limit(upload, max_bytes, digest), content_type)
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {max_bytes // (1024 * 1024)}MB")
+
+    sha256 = digest.hexdigest()
+    key = f"blobs/{sha256[:2]}/{sha256}{ext}"
+    created = await blob_store.promote(tmp_key, key)
+    await blobs_col.update_one(
+        {"_id": key},
+        {
+            "$setOnInsert": {"sha256": sha256, "size": size, "content_type": content_type, "created_at": datetime.utcnow()},
+            "$inc": {"refs": 1},
+            "$unset": {"orphaned_at": ""},
+        },
+        upsert=True,
+    )
+    return {
+        "key": key,
+        "url": f"{FILES_URL_PREFIX}{key}",
+        "sha256": sha256,
+        "size": size,
+        "content_type": content_type,
+        "filename": upload.filename,
+        "deduplicated": not created,
+    }
+
+
+def key_from_url(url: Optional[str]) -> Optional[str]:
+    """Blob key behind a /api/files/ URL, or None for anything else (external links, legacy paths)."""
+    if not url or not url.startswith(FILES_URL_PREFIX):
+        return None
+    try:
+        return normalize_key(url[len(FILES_URL_PREFIX):], under=BLOB_PUBLIC_PREFIX)
+    except ValueError:
+        return None
+
+
+async def release_upload(key: Optional[str]):
+    """
+    Drop one reference to a stored blob (the record pointing at it was replaced or deleted).
+    A blob whose count reaches zero is stamped orphaned_at and removed by collect_orphaned_blobs.
+    """
+    if not key:
+        return
+    await blobs_col.update_one(
+        {"_id": key, "refs": {"$gt": 0}},
+        [
+            {"$set": {"refs": {"$subtract": ["$refs", 1]}}},
+            {"$set": {"orphaned_at": {"$cond": [{"$lte": ["$refs", 0]}, "$$NOW", "$$REMOVE"]}}},
+        ],
+    )
+
+
+async def collect_orphaned_blobs(grace_seconds: int = BLOB_GC_GRACE_SECONDS) -> int:
+    """Periodic job: delete blobs unreferenced for longer than the grace period; returns how many."""
+    cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+    removed = 0
+    async for doc in blobs_col.find({"refs": {"$lte": 0}, "orphaned_at": {"$lt": cutoff}}, {"_id": 1}):
+        # Metadata first, and only if still unreferenced: a concurrent upload revives it instead
+        result = await blobs_col.delete_one({"_id": doc["_id"], "refs": {"$lte": 0}})
+        if result.deleted_count:
+            await blob_store.delete(doc["_id"])
+            removed += 1
+    return removed
+
+
+async def range_response(key: str, range_header: Optional[str]) -> StreamingResponse:
+    """Serve a stored blob, honouring a single `Range: bytes=a-b` request with 206."""
+    meta = await blobs_col.find_one({"_id": key}, {"size": 1, "content_type": 1})
+    stat = await blob_store.stat(key)
+    if stat is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    size = stat[0]
+    content_type = (meta or {}).get("content_type") or stat[1] or mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+    start, end, status = 0, size - 1, 200
+    if range_header:
+        match = _RANGE_RE.match(range_header.strip())
+        if not match or not (match.group(1) or match.group(2)):
+            raise HTTPException(status_code=416, detail="Invalid range", headers={"Content-Range": f"bytes */{size}"})
+        if match.group(1):
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+        else:
+            # Suffix range: last N bytes
+            start = max(size - int(match.group(2)), 0)
+        if start > end or start >= size:
+            raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+        status = 206
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Length": str(end - start + 1),
+        "Cache-Control": "public, max-age=31536000, immutable",
+    }
+    if status == 206:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(blob_store.read_range(key, start, end), status_code=status, media_type=content_type, headers=headers)
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware capping multipart request bodies while they stream in,
+    before the form parser spools them to disk.
+    """
+
+    def __init__(self, app, max_bytes: int = UPLOAD_MAX_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        if not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            return await self.app(scope, receive, send)
+
+        declared = headers.get(b"content-length")
+        if declared and declared.isdigit() and int(declared) > self.max_bytes:
+            return await self._reject(send)
+
+        received = 0
+        started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise RequestBodyTooLarge()
+            return message
+
+        async def tracking_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except RequestBodyTooLarge:
+            if not started:
+                await self._reject(send)
+
+    async def _reject(self, send):
+        body = b'{"detail":"Request body too large"}'
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
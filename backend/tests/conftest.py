@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import backend modules the same way main.py does (from db import ..., from services...)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
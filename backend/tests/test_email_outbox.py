@@ -0,0 +1,182 @@
+"""
+Outbox -> SMTP delivery against a local aiosmtpd server.
+
+Mongo is replaced by mongomock_motor; delivery goes through the real
+EmailTransport and aiosmtplib pool. Needs the test-only packages aiosmtpd and
+mongomock-motor (skipped otherwise). Run from backend/: python -m pytest tests
+"""
+import asyncio
+import socket
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+aiosmtpd_smtp = pytest.importorskip("aiosmtpd.smtp")
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from services import email_outbox as outbox_module  # noqa: E402
+from services.email_outbox import EmailOutbox, STATUS_FAILED, STATUS_PENDING, STATUS_SENDING, STATUS_SENT  # noqa: E402
+from services.email_service import EmailTransport  # noqa: E402
+
+
+class RecordingHandler:
+    """Accepts messages unless `reject` is set, in which case DATA gets a transient 451."""
+
+    def __init__(self):
+        self.messages = []
+        self.reject = False
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.reject:
+            return "451 Try again later"
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+def _accept_any(server, session, envelope, mechanism, auth_data):
+    return aiosmtpd_smtp.AuthResult(success=True)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    handler = RecordingHandler()
+    port = _free_port()
+    controller = aiosmtpd_controller.Controller(
+        handler, hostname="127.0.0.1", port=port,
+        authenticator=_accept_any, auth_require_tls=False,
+    )
+    controller.start()
+    for key in ("BREVO_API_KEY", "RESEND_API_KEY"):
+        monkeypatch.delenv(key, raising=False)
+    monkeypatch.setenv("SMTP_SERVER", "127.0.0.1")
+    monkeypatch.setenv("SMTP_PORT", str(port))
+    monkeypatch.setenv("SMTP_STARTTLS", "false")
+    monkeypatch.setenv("SMTP_USER", "outbox@example.com")
+    monkeypatch.setenv("SMTP_PASSWORD", "secret")
+    yield handler
+    controller.stop()
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    collection = mongomock_motor.AsyncMongoMockClient()["test"]["email_outbox"]
+    transport = EmailTransport()
+    for bucket in transport.rate_limits.values():
+        bucket.rate, bucket.capacity, bucket.tokens = 1000.0, 1000, 1000.0
+    monkeypatch.setattr(outbox_module, "email_outbox_col", collection)
+    monkeypatch.setattr(outbox_module, "email_transport", transport)
+    return EmailOutbox(workers=1), collection, transport
+
+
+async def _run_once(box: EmailOutbox) -> dict:
+    job = await box._claim("test-worker")
+    assert job is not None
+    await box._process(job)
+    return job
+
+
+def test_enqueued_email_is_delivered_over_smtp(smtp_server, outbox):
+    box, collection, transport = outbox
+
+    async def scenario():
+        job_id = await box.enqueue("learner@example.com", "Welcome", "<p>Hello</p>")
+        await _run_once(box)
+        doc = await collection.find_one({"_id": job_id})
+        idle = transport._smtp_pool._idle.qsize()
+        await transport.aclose()
+        return doc, idle
+
+    doc, idle = asyncio.run(scenario())
+    assert doc["status"] == STATUS_SENT
+    assert doc["provider"] == "smtp"
+    assert "worker" not in doc and "locked_until" not in doc
+    assert [m.rcpt_tos for m in smtp_server.messages] == [["learner@example.com"]]
+    assert b"Welcome" in smtp_server.messages[0].content
+    # The authenticated connection went back to the pool for the next send
+    assert idle == 1
+
+
+def test_transient_failure_is_retried_with_backoff(smtp_server, outbox, monkeypatch):
+    box, collection, transport = outbox
+    monkeypatch.setattr(outbox_module, "EMAIL_BACKOFF_BASE_SECONDS", 30)
+    smtp_server.reject = True
+
+    async def scenario():
+        job_id = await box.enqueue("learner@example.com", "Retry me", "<p>Hello</p>")
+        before = datetime.now(timezone.utc)
+        await _run_once(box)
+        doc = await collection.find_one({"_id": job_id})
+        idle = transport._smtp_pool._idle.qsize()
+
+        # Once the backoff has elapsed the next claim delivers it
+        smtp_server.reject = False
+        await collection.update_one({"_id": job_id}, {"$set": {"next_attempt_at": datetime.now(timezone.utc)}})
+        await _run_once(box)
+        delivered = await collection.find_one({"_id": job_id})
+        await transport.aclose()
+        return before, doc, idle, delivered
+
+    before, doc, idle, delivered = asyncio.run(scenario())
+    assert doc["status"] == STATUS_PENDING
+    assert doc["attempts"] == 1
+    assert "451" in doc["last_error"]
+    next_attempt = doc["next_attempt_at"].replace(tzinfo=timezone.utc)
+    assert next_attempt >= before + timedelta(seconds=15)
+    # A connection that failed mid-send is closed, not pooled
+    assert idle == 0
+    assert delivered["status"] == STATUS_SENT
+    assert delivered["attempts"] == 2
+    assert len(smtp_server.messages) == 1
+
+
+def test_exhausted_job_is_dead_lettered(smtp_server, outbox, monkeypatch):
+    box, collection, transport = outbox
+    monkeypatch.setattr(outbox_module, "EMAIL_MAX_ATTEMPTS", 3)
+    smtp_server.reject = True
+
+    async def scenario():
+        job_id = await box.enqueue("learner@example.com", "Never lands", "<p>Hello</p>")
+        for _ in range(3):
+            await collection.update_one({"_id": job_id}, {"$set": {"next_attempt_at": datetime.now(timezone.utc)}})
+            await _run_once(box)
+        doc = await collection.find_one({"_id": job_id})
+        reclaimed = await box._claim("test-worker")
+        await transport.aclose()
+        return doc, reclaimed
+
+    doc, reclaimed = asyncio.run(scenario())
+    assert doc["status"] == STATUS_FAILED
+    assert doc["attempts"] == 3
+    assert "failed_at" in doc
+    assert reclaimed is None
+    assert box.counters["failed"] == 1
+    assert box.counters["retried"] == 2
+
+
+def test_lapsed_lease_does_not_overwrite_new_owner(smtp_server, outbox):
+    box, collection, transport = outbox
+
+    async def scenario():
+        job_id = await box.enqueue("learner@example.com", "Slow send", "<p>Hello</p>")
+        job = await box._claim("slow-worker")
+        # The lease lapses and another worker reclaims the job before the slow one finishes
+        await collection.update_one(
+            {"_id": job_id},
+            {"$set": {"worker": "fast-worker", "locked_until": datetime.now(timezone.utc) + timedelta(minutes=2)}},
+        )
+        await box._process(job)
+        doc = await collection.find_one({"_id": job_id})
+        await transport.aclose()
+        return doc
+
+    doc = asyncio.run(scenario())
+    assert doc["status"] == STATUS_SENDING
+    assert doc["worker"] == "fast-worker"
+    assert box.counters["lease_lost"] == 1
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File, Depends
 from typing import List, Dict, Any
-from datetime import datetime
 from bson import ObjectId
-from db import participants_col, submissions_col, leaderboard_col, events_col, institutions_col
+from db import participants_col, submissions_col, events_col
+from auth_institution import get_auth_user
+from services.leaderboard_service import leaderboard_service
 
 router = APIRouter(prefix="/api/upgrades", tags=["Pro Upgrades"])
 
@@ -68,15 +69,30 @@ async def get_blind_submissions(event_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/plagiarism-check/{submission_id}")
+async def require_reviewer(user: dict = Depends(get_auth_user)) -> dict:
+    """Same gate as /api/submissions/{id}/check-plagiarism: Admins and Judges only."""
+    if user.get("role") not in ("Admin", "Judge"):
+        raise HTTPException(status_code=403, detail="Permission denied")
+    return user
+
+@router.post("/plagiarism-check/{submission_id}", dependencies=[Depends(require_reviewer)])
 async def check_plagiarism(submission_id: str):
-    return {"status": "success", "similarity_score": 12, "flag": "LOW_RISK"}
+    from services.plagiarism_service import plagiarism_service, PLAGIARISM_HIGH_THRESHOLD, PLAGIARISM_MATCH_THRESHOLD
+    if not ObjectId.is_valid(submission_id):
+        raise HTTPException(status_code=400, detail="Invalid submission id")
+    try:
+        result = await plagiarism_service.check_submission(submission_id)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Submission not found")
+    score = result["score"]
+    flag = "HIGH_RISK" if score >= PLAGIARISM_HIGH_THRESHOLD * 100 else "MEDIUM_RISK" if score >= PLAGIARISM_MATCH_THRESHOLD * 100 else "LOW_RISK"
+    return {"status": "success", "similarity_score": score, "flag": flag, "matches": result["matches"]}
 
 # ─── AKSHAY: LEADERBOARD TICKER ───
 @router.get("/leaderboard-ticker/{event_id}")
 async def get_live_ticker(event_id: str):
     try:
-        top = await leaderboard_col.find({"event_id": event_id}).sort("rank", 1).limit(5).to_list(None)
+        top = await leaderboard_service.get_rankings(event_id, limit=5)
         ticker_text = " | ".join([f"#{e['rank']} {e.get('team_name', 'User')} ({e['total_score']} pts)" for e in top])
         return {"ticker": ticker_text}
     except Exception:
@@ -85,15 +101,13 @@ async def get_live_ticker(event_id: str):
 # ─── NAGASIVA: BACKBONE UPGRADES ───
 @router.post("/update-stats/{institution_id}")
 async def trigger_stats_update(institution_id: str):
+    from services.institution_stats_service import institution_stats_service
     try:
-        total_events = await events_col.count_documents({"institution_id": institution_id})
-        total_participants = await participants_col.count_documents({"institution_id": institution_id})
-        stats = {
-            "total_events": total_events,
-            "total_participants": total_participants,
-            "last_updated": datetime.utcnow().isoformat()
-        }
-        await institutions_col.update_one({"_id": institution_id}, {"$set": {"cached_stats": stats}})
+        stats = await institution_stats_service.reconcile(institution_id)
+        if stats is None:
+            raise HTTPException(status_code=500, detail="Stats reconciliation failed")
         return {"status": "success", "stats": stats}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))